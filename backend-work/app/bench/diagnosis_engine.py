@@ -0,0 +1,100 @@
+"""
+Naive-Bayes diagnosis engine vs the legacy decision tree, on Testing.csv.
+
+Scores both models from the built bundle on the full Testing rows and on
+partial rows (k random present symptoms, as patients usually report them):
+top-1 / top-3 accuracy, expected calibration error, and how many cases
+clear DIAGNOSIS_CONFIDENCE (the share that skips the LLM in /chat/) and
+how accurate those are. Latency is per single-row call, in microseconds.
+
+    python -m app.bench.diagnosis_engine [--sizes 2 3 4] [--repeats 5] [--out engine.json]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from app import config
+from app.model_bundle import load_model, partial_rows, read_symptom_matrix
+
+TESTING_CSV_PATH = os.path.join(config.DATA_DIR, "Testing.csv")
+
+
+def load_testing(model):
+    columns, X, prognosis = read_symptom_matrix(TESTING_CSV_PATH)
+    X = X[:, [columns.index(column) for column in model.columns]]
+    index = {str(name): i for i, name in enumerate(model.classes)}
+    y = np.asarray([index[name] for name in prognosis])
+    return X, y
+
+
+def score(proba: np.ndarray, y: np.ndarray, threshold: float, bins: int = 10) -> dict:
+    ranked = np.argsort(-proba, axis=1, kind="stable")
+    confidence = proba.max(axis=1)
+    correct = ranked[:, 0] == y
+
+    edges = np.linspace(0, 1, bins + 1)
+    ece = 0.0
+    for low, high in zip(edges[:-1], edges[1:]):
+        in_bin = (confidence > low) & (confidence <= high)
+        if in_bin.any():
+            ece += in_bin.mean() * abs(correct[in_bin].mean() - confidence[in_bin].mean())
+
+    confident = confidence >= threshold
+    return {
+        "top1": round(float(correct.mean()), 3),
+        "top3": round(float((ranked[:, :3] == y[:, None]).any(axis=1).mean()), 3),
+        "ece": round(float(ece), 3),
+        "confident_share": round(float(confident.mean()), 3),
+        "confident_top1": round(float(correct[confident].mean()), 3) if confident.any() else None,
+    }
+
+
+def latency_us(predict, X: np.ndarray, calls: int = 2000) -> float:
+    rows = [X[i % len(X)] for i in range(calls)]
+    start = time.perf_counter()
+    for row in rows:
+        predict(row)
+    return round((time.perf_counter() - start) / calls * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[2, 3, 4], help="Symptoms per partial row")
+    parser.add_argument("--repeats", type=int, default=5, help="Partial rows drawn per Testing row")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    model = load_model()
+    X, y = load_testing(model)
+    threshold = config.DIAGNOSIS_CONFIDENCE
+
+    cases = {"full": (X, y)}
+    for size in args.sizes:
+        cases[f"partial_{size}"] = partial_rows(X, y, size=size, repeats=args.repeats, seed=size)
+
+    report = {"threshold": threshold, "accuracy": {}, "latency_us": {}}
+    for name, (X_case, y_case) in cases.items():
+        report["accuracy"][name] = {
+            "tree": score(model.tree_proba(X_case), y_case, threshold),
+            "engine": score(model.predict_proba(X_case), y_case, threshold),
+        }
+        print(f"{name:<10} tree   {json.dumps(report['accuracy'][name]['tree'])}")
+        print(f"{name:<10} engine {json.dumps(report['accuracy'][name]['engine'])}")
+
+    report["latency_us"] = {
+        "tree.predict_proba": latency_us(model.tree_proba, X),
+        "engine.predict_proba": latency_us(model.predict_proba, X),
+        "engine.top_k": latency_us(lambda row: model.top_k(row, k=3), X),
+    }
+    print("latency_us", json.dumps(report["latency_us"]))
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Cost of EventLog.record() on the request path, and the writer's throughput
+and drop behaviour, offline.
+
+Records --events consultation events at --rate per second, in bursts of
+--burst, into a buffer of --capacity with a real SQLite / NDJSON sink in a
+temporary directory. Then it runs again with a sink slowed down by --slow-ms
+per batch, to show the drop policy at work.
+
+    python -m app.bench.event_log [--events 20000] [--rate 5000] [--backend sqlite]
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from app.event_log import EventLog, build_sink
+
+EVENT = {
+    "user_id": "u1",
+    "input": "I have had a headache and high fever since yesterday",
+    "language": "English",
+    "symptoms": ["headache", "high_fever"],
+    "disease": "Malaria",
+    "label_source": "model",
+    "urgency": "routine",
+    "severity": 3,
+    "confidence": 0.91,
+    "mode": "local",
+    "latency_ms": 0.8,
+    "timings_ms": {"triage": 0.1, "local": 0.4},
+}
+
+
+class SlowSink:
+    """Wraps a sink so every batch takes at least `slow_ms`."""
+
+    def __init__(self, sink, slow_ms: float):
+        self.sink = sink
+        self.slow_ms = slow_ms
+
+    def write(self, batch):
+        time.sleep(self.slow_ms / 1000)
+        self.sink.write(batch)
+
+
+async def run(sink, args) -> dict:
+    log = EventLog(sink, capacity=args.capacity, batch_size=args.batch, flush_ms=args.flush_ms, drop_policy=args.drop_policy)
+    log.start()
+    record_ns = 0
+    start = time.perf_counter()
+    for _ in range(args.events // args.burst):
+        burst_start = time.perf_counter_ns()
+        for _ in range(args.burst):
+            log.record("bench", **EVENT)
+        record_ns += time.perf_counter_ns() - burst_start
+        await asyncio.sleep(args.burst / args.rate)
+    await log.stop()
+    elapsed = time.perf_counter() - start
+    stats = log.stats()
+    return {
+        "record_ns": round(record_ns / stats["recorded"]) if stats["recorded"] else None,
+        "events_per_s": round(stats["written"] / elapsed),
+        "written": stats["written"],
+        "dropped": stats["dropped"],
+        "batches": stats["batches"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=5000, help="Events recorded per second")
+    parser.add_argument("--burst", type=int, default=50, help="Events recorded between yields to the loop")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "ndjson"])
+    parser.add_argument("--capacity", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--flush-ms", type=float, default=500)
+    parser.add_argument("--drop-policy", default="drop_oldest", choices=["drop_oldest", "drop_newest"])
+    parser.add_argument("--slow-ms", type=float, default=200, help="Extra time per batch for the overloaded run")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for label, slow_ms in (("normal", 0), ("slow sink", args.slow_ms)):
+            sink = build_sink(args.backend, f"{directory}/{label.replace(' ', '_')}")
+            result = {"sink": label, **asyncio.run(run(SlowSink(sink, slow_ms) if slow_ms else sink, args))}
+            sink.close()
+            results.append(result)
+            print(json.dumps(result))
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
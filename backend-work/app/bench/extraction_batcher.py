@@ -0,0 +1,114 @@
+"""
+Micro-batched vs unbatched symptom extraction, offline.
+
+Fires N extraction requests (arriving over --arrival-ms) at a fake model
+and reports throughput, p50/p95 latency per request and the number of
+model calls for each configuration, plus the latency of one request on its
+own (what the batching window adds at low traffic). The fake model's
+latency grows with the number of items in a prompt (--per-item-ms), so a
+big batch is not free.
+
+    python -m app.bench.extraction_batcher [--requests 400] [--latency-ms 300] [--per-item-ms 15]
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+
+from app import config
+from app.bench.symptom_matcher import DEFAULT_SAMPLES
+from app.extraction_batcher import ExtractionBatcher
+from app.llm import FakeBackend, LLMGateway
+from app.llm_scheduler import LLMScheduler, ModelOverloaded
+
+MODEL = "gemini-2.0-flash"
+
+
+class SizedFakeBackend(FakeBackend):
+    """Fake model whose latency is latency_ms plus per_item_ms per numbered message."""
+
+    def __init__(self, latency_ms: float, per_item_ms: float):
+        super().__init__(latency_ms=0)
+        self.base_ms = latency_ms
+        self.per_item_ms = per_item_ms
+
+    async def generate(self, model: str, contents, generation_config=None) -> str:
+        items = max(1, len(re.findall(r"^\s*\d+\. ", str(contents), re.MULTILINE)))
+        self.latency_ms = self.base_ms + self.per_item_ms * items
+        return await super().generate(model, contents, generation_config)
+
+
+async def run(texts, window_ms: float, max_batch: int, args) -> dict:
+    backend = SizedFakeBackend(args.latency_ms, args.per_item_ms)
+    # No quota and no queue cap: the bench measures batching, not admission control
+    scheduler = LLMScheduler(args.max_concurrency, requests_per_minute=0, tokens_per_minute=0, queue_max=args.requests + 1)
+    batcher = ExtractionBatcher(LLMGateway(backend, scheduler=scheduler), window_ms, max_batch)
+    latencies = []
+    shed = 0
+
+    async def one(i, text):
+        nonlocal shed
+        await asyncio.sleep(args.arrival_ms / 1000 * i / args.requests)
+        start = time.perf_counter()
+        try:
+            await batcher.extract(text, MODEL)
+        except ModelOverloaded:
+            shed += 1  # the scheduler's queue estimate said it would miss its deadline
+            return
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, texts[i % len(texts)] + f" (#{i})") for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    # Added latency when there is nothing to batch with: one request on its own
+    start = time.perf_counter()
+    await batcher.extract(texts[0], MODEL)
+    solo_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    latencies.sort()
+    percentile = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 1)
+    return {
+        "window_ms": window_ms,
+        "max_batch": max_batch,
+        "model_calls": backend.calls,
+        "shed": shed,
+        "rps": round(args.requests / elapsed, 1),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "solo_ms": solo_ms,
+        "mean_batch_size": batcher.stats()["mean_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake model latency per call")
+    parser.add_argument("--per-item-ms", type=float, default=15, help="Extra latency per message in a prompt")
+    parser.add_argument("--arrival-ms", type=float, default=200, help="Requests arrive spread over this long")
+    parser.add_argument("--max-concurrency", type=int, default=config.LLM_MAX_CONCURRENCY)
+    parser.add_argument("--windows", nargs="+", type=float, default=[2, 5, 10])
+    parser.add_argument("--max-batch", nargs="+", type=int, default=[8, 16, 32])
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    with open(DEFAULT_SAMPLES) as file:
+        texts = [json.loads(line)["text"] for line in file if line.strip()]
+
+    configs = [(0, 1)] + [(window, size) for window in args.windows for size in args.max_batch]
+    results = []
+    for window_ms, max_batch in configs:
+        result = asyncio.run(run(texts, window_ms, max_batch, args))
+        results.append(result)
+        label = "unbatched" if window_ms == 0 else f"window={window_ms}ms max={max_batch}"
+        print(f"{label:<24} {json.dumps(result)}")
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
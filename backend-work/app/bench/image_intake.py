@@ -0,0 +1,112 @@
+"""
+Latency and peak memory of the /predict/image intake per image size class.
+
+Each class runs in a fresh process so ru_maxrss reflects only that class
+(the delta is measured after the upload bytes are already in memory).
+"naive" decodes at full resolution before resizing, "intake" is
+app.image_intake.downscale (draft-mode decode + thumbnail).
+
+    python -m app.bench.image_intake [--repeat 10] [--out bench_image.json]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+SIZE_CLASSES = {
+    "small": (800, 600),
+    "medium": (1920, 1080),
+    "large": (4032, 3024),
+    "xlarge": (8000, 6000),
+}
+
+
+def make_jpeg(size) -> bytes:
+    """Noisy photo-like JPEG, so the encoded size is realistic."""
+    from PIL import Image
+
+    image = Image.effect_noise(size, 64).convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def naive(data: bytes, max_side: int):
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    image = image.resize((max_side, max_side * image.height // image.width), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue(), "image/jpeg"
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run(mode: str, path: str, repeat: int, queue):
+    from app import config
+    from app.image_intake import downscale
+
+    with open(path, "rb") as file:
+        data = file.read()
+    fn = downscale if mode == "intake" else (lambda d: naive(d, config.IMAGE_MAX_SIDE))
+    before = _peak_rss_mb()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output, _ = fn(data)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    queue.put({
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "peak_rss_delta_mb": round(_peak_rss_mb() - before, 1),
+        "output_bytes": len(output),
+    })
+
+
+def measure(mode: str, path: str, repeat: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run, args=(mode, path, repeat, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--out", default=None, help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, size in SIZE_CLASSES.items():
+            data = make_jpeg(size)
+            path = os.path.join(tmp, f"{name}.jpg")
+            with open(path, "wb") as file:
+                file.write(data)
+            report[name] = {
+                "resolution": f"{size[0]}x{size[1]}",
+                "upload_bytes": len(data),
+                "naive": measure("naive", path, args.repeat),
+                "intake": measure("intake", path, args.repeat),
+            }
+            print(name, json.dumps(report[name]))
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
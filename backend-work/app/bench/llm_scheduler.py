@@ -0,0 +1,112 @@
+"""
+Model call admission under a rate-limited model, offline.
+
+Sends a mixed load of emergency / chat / image / translation calls for
+--seconds at --rps to a fake model that answers 429 beyond --model-rpm
+requests in any 60 s, and compares three gateways:
+
+- none:     concurrency limit only, every call goes straight to the model
+- reactive: no quota, but a 429 pauses dispatching for its retry delay
+- quota:    requests-per-minute bucket at --quota-share of the model limit
+
+For each class it reports calls answered, shed by the scheduler (by reason),
+failed with an upstream 429, the p50/p95 time to an answer and the p95 time
+to a refusal (shed or 429).
+
+    python -m app.bench.llm_scheduler [--seconds 20] [--rps 6] [--model-rpm 60]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app import config
+from app.llm import FakeBackend, LLMGateway
+from app.llm_scheduler import PRIORITIES, LLMScheduler, ModelOverloaded, priority
+
+MODEL = "gemini-2.0-flash"
+
+# Share of the offered calls per class
+MIX = {"emergency": 0.05, "chat": 0.6, "image": 0.15, "translation": 0.2}
+
+
+class NoPauseScheduler(LLMScheduler):
+    """Counts upstream 429s but keeps dispatching, like a bare semaphore."""
+
+    def rate_limited(self, error):
+        self.upstream_rate_limited += 1
+        return 1
+
+
+async def run(label: str, scheduler: LLMScheduler, args) -> dict:
+    backend = FakeBackend(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 2, rpm_limit=args.model_rpm)
+    gateway = LLMGateway(backend, scheduler=scheduler)
+    outcomes = {name: {"ok": 0, "shed": {}, "upstream_429": 0, "latencies": [], "refusals": []} for name in PRIORITIES}
+    rng = random.Random(args.seed)
+
+    async def one(i: int, name: str):
+        priority.set(name)
+        outcome = outcomes[name]
+        start = time.perf_counter()
+        try:
+            await gateway.generate(f"request {i}", model=MODEL, site="bench", cache=False)
+            outcome["ok"] += 1
+            outcome["latencies"].append((time.perf_counter() - start) * 1000)
+        except ModelOverloaded as e:
+            if e.reason == "upstream_429":
+                outcome["upstream_429"] += 1
+            else:
+                outcome["shed"][e.reason] = outcome["shed"].get(e.reason, 0) + 1
+            outcome["refusals"].append((time.perf_counter() - start) * 1000)
+
+    tasks = []
+    names, weights = zip(*MIX.items())
+    for i in range(int(args.seconds * args.rps)):
+        tasks.append(asyncio.create_task(one(i, rng.choices(names, weights)[0])))
+        await asyncio.sleep(rng.expovariate(args.rps))
+    await asyncio.gather(*tasks)
+
+    result = {"gateway": label, "model_calls": backend.calls, "model_429s": backend.rejected}
+    percentile = lambda values, q: round(values[min(len(values) - 1, int(q * len(values)))]) if values else None
+    for name, outcome in outcomes.items():
+        latencies, refusals = sorted(outcome.pop("latencies")), sorted(outcome.pop("refusals"))
+        result[name] = {
+            **outcome,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "refusal_p95_ms": percentile(refusals, 0.95),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=20, help="How long calls keep arriving")
+    parser.add_argument("--rps", type=float, default=6, help="Offered calls per second (Poisson arrivals)")
+    parser.add_argument("--model-rpm", type=int, default=60, help="Fake model limit, requests in any 60 s")
+    parser.add_argument("--quota-share", type=float, default=0.9, help="Scheduler quota as a share of --model-rpm")
+    parser.add_argument("--latency-ms", type=float, default=400, help="Fake model latency per call")
+    parser.add_argument("--max-concurrency", type=int, default=config.LLM_MAX_CONCURRENCY)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    gateways = {
+        "none": lambda: NoPauseScheduler(args.max_concurrency, requests_per_minute=0, tokens_per_minute=0),
+        "reactive": lambda: LLMScheduler(args.max_concurrency, requests_per_minute=0, tokens_per_minute=0),
+        "quota": lambda: LLMScheduler(args.max_concurrency, requests_per_minute=args.model_rpm * args.quota_share, tokens_per_minute=0),
+    }
+    results = []
+    for label, build in gateways.items():
+        result = asyncio.run(run(label, build(), args))
+        results.append(result)
+        print(json.dumps(result))
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
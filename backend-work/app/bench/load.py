@@ -0,0 +1,219 @@
+"""
+Offline load test of app.main:app with the fake model backend.
+
+Boots the real app under uvicorn in a subprocess (LLM_BACKEND=fake, no
+network or API quota), drives each endpoint at increasing concurrency and
+reports p50/p95/p99 latency, requests per second, errors and server RSS.
+Results are written as JSON; pass an earlier file as --baseline to print
+the change in p95 and RPS.
+
+    python -m app.bench.load
+    python -m app.bench.load --latency-ms 300 --concurrency 1 8 32 --out after.json --baseline app/artifacts/bench_load.json
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app import config
+from app.bench.symptom_matcher import DEFAULT_SAMPLES
+
+DEFAULT_OUT = os.path.join(config.APP_DIR, "artifacts", "bench_load.json")
+ENDPOINTS = ["/chat/", "/chat", "/predict/symptoms", "/predict/image", "/disease-prediction"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid: int):
+    """Resident set size of a process from /proc (Linux only), else None."""
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _image(n: int) -> bytes:
+    """A small JPEG unique to `n`, so /predict/image never hits the dedupe cache."""
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new("RGB", (640, 480), (n % 256, n // 256 % 256, n // 65536 % 256)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_MS": str(args.latency_ms),
+        "FAKE_LLM_JITTER_MS": str(args.jitter_ms),
+        "LLM_CACHE_ENABLED": "1" if args.cache else "0",
+        "IMAGE_RESULT_CACHE_ENTRIES": str(config.IMAGE_RESULT_CACHE_ENTRIES) if args.cache else "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Server did not start within 60s")
+
+
+# ----------------------------
+# Load
+# ----------------------------
+def request_factory(endpoint: str, texts):
+    """Returns a function producing httpx request kwargs for the n-th call."""
+    if endpoint == "/chat/":
+        return lambda n: {"json": {"user_input": texts[n % len(texts)], "user_id": f"load-{n}"}}
+    if endpoint == "/chat":
+        return lambda n: {"json": {"user_input": texts[n % len(texts)]}}
+    if endpoint == "/predict/symptoms":
+        return lambda n: {"json": {"symptoms": texts[n % len(texts)]}}
+    if endpoint == "/predict/image":
+        # One image per request over the whole run, across concurrency levels too
+        sequence = itertools.count()
+        return lambda n: {"files": {"file": ("photo.jpg", _image(next(sequence)), "image/jpeg")}}
+    if endpoint == "/disease-prediction":
+        return lambda n: {"json": {"query": texts[n % len(texts)]}}
+    raise ValueError(endpoint)
+
+
+async def drive(client: httpx.AsyncClient, url: str, make_request, concurrency: int, total: int) -> dict:
+    counter = itertools.count()
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while (n := next(counter)) < total:
+            request = make_request(n)
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, **request)
+                errors += response.status_code >= 400
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    percentile = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2)
+    return {
+        "requests": total,
+        "errors": errors,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "rps": round(total / elapsed, 1),
+    }
+
+
+async def run(args, base_url: str, server_pid: int) -> dict:
+    with open(DEFAULT_SAMPLES) as file:
+        texts = [json.loads(line)["text"] for line in file if line.strip()]
+
+    results = {}
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        for endpoint in args.endpoints:
+            make_request = request_factory(endpoint, texts)
+            await drive(client, endpoint, make_request, 1, args.warmup)
+            results[endpoint] = {}
+            for concurrency in args.concurrency:
+                total = max(args.requests, concurrency * 4)
+                result = await drive(client, endpoint, make_request, concurrency, total)
+                result["rss_mb"] = _rss_mb(server_pid)
+                results[endpoint][str(concurrency)] = result
+                print(f"{endpoint:<20} c={concurrency:<4} {json.dumps(result)}")
+    return results
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path) as file:
+        baseline = json.load(file)["results"]
+    print(f"\nChange vs {baseline_path} (p95, rps):")
+    for endpoint, levels in results.items():
+        for concurrency, result in levels.items():
+            before = baseline.get(endpoint, {}).get(concurrency)
+            if not before:
+                continue
+            p95 = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+            rps = (result["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0.0
+            print(f"{endpoint:<20} c={concurrency:<4} p95 {p95:+.1f}%  rps {rps:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Fake model latency")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--cache", action="store_true", help="Keep the LLM response and image result caches on")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--baseline", default=None, help="Earlier --out file to compare against")
+    args = parser.parse_args()
+
+    port = _free_port()
+    server = start_server(args, port)
+    try:
+        results = asyncio.run(run(args, f"http://127.0.0.1:{port}", server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "fake_latency_ms": args.latency_ms,
+            "fake_jitter_ms": args.jitter_ms,
+            "llm_cache": args.cache,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.out}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Hedged vs unhedged model calls against a fake model with a slow tail, offline.
+
+The primary model answers in --latency-ms (plus jitter) but --tail-share of
+its calls take --tail-ms; the fallback tier is a little faster and rarely
+slow. Runs --requests calls (--concurrency at a time) with hedging off and
+on, and reports p50 / p95 / p99 latency, hedges sent and won, and the extra
+model calls hedging cost.
+
+    python -m app.bench.model_tiers [--requests 2000] [--tail-share 0.05] [--budget 0.1]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.llm import FakeBackend, LLMGateway
+from app.llm_scheduler import LLMScheduler
+from app.model_tiers import ModelTiers
+
+PRIMARY = "gemini-2.0-flash"
+FALLBACK = "gemini-2.0-flash-lite"
+
+
+class TailFakeBackend(FakeBackend):
+    """Fake model whose latency depends on the model asked, with a heavy tail."""
+
+    def __init__(self, profiles: dict, seed: int = 0):
+        super().__init__()
+        self.profiles = profiles  # model -> (latency_ms, tail_share, tail_ms)
+        self.calls_by_model = {}
+        self._rng = random.Random(seed)
+
+    async def generate(self, model: str, contents, generation_config=None) -> str:
+        latency_ms, tail_share, tail_ms = self.profiles[model]
+        self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+        slow = self._rng.random() < tail_share
+        await asyncio.sleep((tail_ms if slow else latency_ms * self._rng.uniform(0.8, 1.2)) / 1000)
+        return await super().generate(model, contents, generation_config)
+
+
+async def run(hedging: bool, args) -> dict:
+    backend = TailFakeBackend({
+        PRIMARY: (args.latency_ms, args.tail_share, args.tail_ms),
+        FALLBACK: (args.latency_ms * 0.8, args.tail_share / 5, args.tail_ms),
+    }, args.seed)
+    tiers = ModelTiers({"": ("", FALLBACK if hedging else "")}, budget=args.budget)
+    scheduler = LLMScheduler(args.concurrency * 2, requests_per_minute=0, tokens_per_minute=0)
+    gateway = LLMGateway(backend, scheduler=scheduler, tiers=tiers)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await gateway.generate(f"request {i}", model=PRIMARY, site="bench", cache=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+
+    latencies.sort()
+    percentile = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 1)
+    stats = tiers.stats()
+    return {
+        "hedging": hedging,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "model_calls": sum(backend.calls_by_model.values()),
+        "extra_calls": round(sum(backend.calls_by_model.values()) / args.requests - 1, 3),
+        "hedged": stats["hedged"],
+        "denied": stats["denied"],
+        "hedge_wins": stats["models"].get(FALLBACK, {}).get("hedge_wins", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=100, help="Typical primary latency")
+    parser.add_argument("--tail-share", type=float, default=0.05, help="Share of primary calls that are slow")
+    parser.add_argument("--tail-ms", type=float, default=1500, help="Latency of a slow call")
+    parser.add_argument("--budget", type=float, default=0.1, help="Hedges allowed per call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = []
+    for hedging in (False, True):
+        result = asyncio.run(run(hedging, args))
+        results.append(result)
+        print(json.dumps(result))
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
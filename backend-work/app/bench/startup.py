@@ -0,0 +1,118 @@
+"""
+Startup cost of app.main:app.
+
+1. Import-time profile (python -X importtime): total import time of app.main
+   and the slowest modules it pulls in, plus the heavy dependencies that are
+   kept off that path and only load on first use or during warm-up.
+2. Boot timing per STARTUP_MODE: time until the server answers, until
+   /ready is 200, and the time until the first /predict and /chat/ calls
+   succeed (lazy mode answers 503 until the model has loaded).
+
+    python -m app.bench.startup [--modes eager background lazy] [--out startup.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app.bench.load import _free_port
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+DEFERRED = ["google.genai", "numpy", "httpx", "PIL.Image", "pandas", "sklearn"]
+
+
+def import_profile(module: str = "app.main", top: int = 15) -> dict:
+    env = {**os.environ, "LLM_BACKEND": "fake"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(2)) / 1000, len(match.group(3)) // 2))
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    # importtime lists children before their parent: collect the direct
+    # children seen since the previous top-level module
+    children, direct = [], []
+    for name, ms, depth in rows:
+        if depth == 1:
+            children.append((name, ms))
+        elif depth == 0:
+            if name == module:
+                total_ms, direct = ms, children
+            children = []
+    top_level = sorted(direct, key=lambda row: -row[1])
+    return {
+        "total_ms": round(total_ms, 1),
+        "slowest_ms": {name: round(ms, 1) for name, ms in top_level[:top]},
+        "deferred_imported": {name: name in loaded for name in DEFERRED},
+    }
+
+
+def boot(mode: str) -> dict:
+    port = _free_port()
+    env = {**os.environ, "LLM_BACKEND": "fake", "STARTUP_MODE": mode}
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    result = {}
+    try:
+        while True:
+            try:
+                httpx.get(f"{base}/", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.01)
+        result["serving_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        while httpx.get(f"{base}/ready", timeout=5).status_code != 200:
+            time.sleep(0.01)
+        result["ready_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["warmup"] = httpx.get(f"{base}/ready").json()["timings_ms"]
+
+        for name, path, body in [
+            ("first_predict_ms", "/predict", {"symptoms": ["headache", "high_fever"]}),
+            ("first_chat_ms", "/chat/", {"user_input": "I have headache and high fever", "user_id": "boot"}),
+        ]:
+            # In lazy mode the model loads on first use: until then the answer is 503
+            request_start = time.perf_counter()
+            while (response := httpx.post(f"{base}{path}", json=body, timeout=30)).status_code == 503:
+                time.sleep(0.05)
+            response.raise_for_status()
+            result[name] = round((time.perf_counter() - request_start) * 1000, 1)
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["eager", "background", "lazy"])
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    report = {"imports": import_profile(), "boot": {}}
+    print(json.dumps(report["imports"], indent=2))
+    for mode in args.modes:
+        report["boot"][mode] = boot(mode)
+        print(mode, json.dumps(report["boot"][mode]))
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
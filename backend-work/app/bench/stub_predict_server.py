@@ -0,0 +1,43 @@
+"""
+Local stand-in for the external ML prediction API behind PREDICT_API_URL.
+
+Answers POST /predict with the in-process model, optionally after a delay or
+with injected 503s, so the forward path can be exercised offline:
+
+    STUB_LATENCY_MS=50 STUB_FAILURE_RATE=0.2 uvicorn app.bench.stub_predict_server:app --port 8001
+    PREDICT_API_URL=http://127.0.0.1:8001/predict uvicorn app.main:app --port 10000
+"""
+import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.model_bundle import load_model
+from app.router.prediction import predict_batch
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve only once the model is loaded, like a warmed-up prediction service
+    await asyncio.to_thread(load_model)
+    yield
+
+
+app = FastAPI(title="Stub prediction API", lifespan=lifespan)
+
+app.state.latency_ms = float(os.getenv("STUB_LATENCY_MS", "0"))
+app.state.failure_rate = float(os.getenv("STUB_FAILURE_RATE", "0"))
+app.state.calls = 0
+
+
+@app.post("/predict")
+async def predict(data: dict):
+    app.state.calls += 1
+    if app.state.latency_ms:
+        await asyncio.sleep(app.state.latency_ms / 1000)
+    if random.random() < app.state.failure_rate:
+        return JSONResponse(status_code=503, content={"detail": "injected failure"})
+    return predict_batch([data.get("symptoms", [])])[0]
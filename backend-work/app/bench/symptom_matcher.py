@@ -0,0 +1,74 @@
+"""
+Precision / recall / latency of the local symptom matcher against labelled
+sets of complaints.
+
+- symptom_samples.jsonl: written alongside SYNONYMS, so it only shows the
+  phrasings the synonyms were built for (a regression check).
+- symptom_heldout.jsonl: written separately and never used to tune the
+  synonyms; its numbers are the ones to quote. Don't add synonyms from its
+  misses, or it stops being held out.
+
+    python -m app.bench.symptom_matcher [--samples app/bench/symptom_heldout.jsonl ...]
+"""
+import argparse
+import json
+import os
+import time
+
+from app.symptom_matcher import get_matcher
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(__file__), "symptom_samples.jsonl")
+HELDOUT_SAMPLES = os.path.join(os.path.dirname(__file__), "symptom_heldout.jsonl")
+
+
+def evaluate(matcher, samples, repeat: int) -> dict:
+    true_positive = false_positive = false_negative = unresolved = 0
+    for sample in samples:
+        result = matcher.match(sample["text"])
+        predicted, expected = set(result.symptoms), set(sample["symptoms"])
+        true_positive += len(predicted & expected)
+        false_positive += len(predicted - expected)
+        false_negative += len(expected - predicted)
+        unresolved += not result.resolved
+        if predicted != expected:
+            print(f"MISS {sample['text']!r}: got {sorted(predicted)}, expected {sorted(expected)}")
+
+    timings = []
+    for _ in range(repeat):
+        for sample in samples:
+            start = time.perf_counter()
+            matcher.match(sample["text"])
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    precision = true_positive / max(true_positive + false_positive, 1)
+    recall = true_positive / max(true_positive + false_negative, 1)
+    return {
+        "samples": len(samples),
+        "precision": round(precision, 3),
+        "recall": round(recall, 3),
+        "llm_fallback_rate": round(unresolved / len(samples), 3),
+        "p50_ms": round(timings[len(timings) // 2], 4),
+        "p99_ms": round(timings[int(len(timings) * 0.99)], 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", nargs="+", default=[DEFAULT_SAMPLES, HELDOUT_SAMPLES])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    matcher = get_matcher()
+    report = {"build_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    for path in args.samples:
+        with open(path) as file:
+            samples = [json.loads(line) for line in file if line.strip()]
+        report[os.path.splitext(os.path.basename(path))[0]] = evaluate(matcher, samples, args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
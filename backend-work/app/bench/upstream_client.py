@@ -0,0 +1,124 @@
+"""
+Exercises the pooled upstream client against the local stub prediction server:
+latency with and without connection reuse, recovery from injected 503s, and the
+circuit breaker opening when the upstream is down. Exits non-zero on a failed check.
+
+    python -m app.bench.upstream_client [--requests 200] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+import httpx
+import uvicorn
+
+from app.bench import stub_predict_server
+from app.http_client import CircuitBreaker, CircuitOpen, UpstreamClient, UpstreamError
+
+PAYLOAD = {"symptoms": ["headache", "high fever", "vomiting"]}
+
+
+def start_stub() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(stub_predict_server.app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/predict"
+
+
+async def run(send, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await send()
+            except UpstreamError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "errors": errors,
+    }
+
+
+async def main_async(args) -> bool:
+    url = start_stub()
+    stub = stub_predict_server.app.state
+    ok = True
+
+    # New connection per call, as with the old requests.post()
+    async def unpooled():
+        async with httpx.AsyncClient() as client:
+            (await client.post(url, json=PAYLOAD)).raise_for_status()
+
+    print("unpooled", await run(unpooled, args.requests, args.concurrency))
+
+    client = UpstreamClient("stub", backoff_ms=10)
+    print("pooled  ", await run(lambda: client.post_json(url, PAYLOAD), args.requests, args.concurrency))
+
+    # Without an idempotency key a 5xx may have been applied, so it is not retried
+    stub.failure_rate = 0.3
+    retries_before = client.counters["retries"]
+    unkeyed = await run(lambda: client.post_json(url, PAYLOAD), args.requests, args.concurrency)
+    print("flaky, no key", unkeyed, "retries:", client.counters["retries"] - retries_before)
+    ok &= client.counters["retries"] == retries_before and unkeyed["errors"] > 0
+
+    flaky = await run(lambda: client.post_json(url, PAYLOAD, idempotency_key=str(uuid.uuid4())), args.requests, args.concurrency)
+    print("flaky   ", flaky, "retries:", client.counters["retries"] - retries_before)
+    ok &= flaky["errors"] < args.requests * 0.1
+
+    stub.failure_rate = 1.0
+    down = UpstreamClient("stub_down", retries=1, backoff_ms=1, breaker=CircuitBreaker(threshold=3, reset_seconds=0.2))
+    calls_before = stub.calls
+    outcomes = []
+    for _ in range(10):
+        try:
+            await down.post_json(url, PAYLOAD, idempotency_key=str(uuid.uuid4()))
+        except CircuitOpen:
+            outcomes.append("short_circuited")
+        except UpstreamError:
+            outcomes.append("failed")
+    print("down    ", outcomes, "upstream calls:", stub.calls - calls_before)
+    ok &= outcomes.count("failed") == 3 and down.breaker.state == "open"
+
+    stub.failure_rate = 0.0
+    await asyncio.sleep(0.25)
+    await down.post_json(url, PAYLOAD)
+    print("recovered, breaker", down.breaker.state)
+    ok &= down.breaker.state == "closed"
+
+    print(client.stats())
+    await client.aclose()
+    await down.aclose()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    ok = asyncio.run(main_async(args))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Pre-translated catalog of the bot's fixed messages.
+
+Templates live in MasterData/message_catalog.json, keyed by message and
+language, and are filled in locally with str.format. Missing translations
+(and the per-language symptom names used inside templates) are compiled
+into the same file once with the LLM; without --languages every language
+already in the catalog is completed:
+
+    python -m app.catalog build --languages Gujarati Punjabi Kannada
+"""
+import argparse
+import asyncio
+import json
+import os
+import string
+from functools import lru_cache
+from typing import Optional
+
+from app import config
+from app.language import PROMPT_NAMES, prompt_name
+
+CATALOG_PATH = os.path.join(config.MASTER_DATA_DIR, "message_catalog.json")
+
+
+class MessageCatalog:
+    def __init__(self, data: dict):
+        self.source_language = data.get("source_language", "English")
+        self.messages = data.get("messages", {})
+        self.symptoms = data.get("symptoms", {})
+        # Case-insensitive language lookup ("hindi" from the LLM -> "Hindi")
+        self._languages = {
+            language.casefold(): language
+            for translations in self.messages.values()
+            for language in translations
+        }
+        # The names prompts use ("Hindi (Latin script)") resolve to the catalog key too
+        for short, name in PROMPT_NAMES.items():
+            if short.casefold() in self._languages:
+                self._languages.setdefault(name.casefold(), self._languages[short.casefold()])
+
+    @property
+    def languages(self) -> list:
+        return list(dict.fromkeys(self._languages.values()))
+
+    def _language(self, language: str) -> Optional[str]:
+        return self._languages.get((language or "").strip().casefold())
+
+    def source(self, key: str, **params) -> str:
+        """The message in the source language (English)."""
+        return self.messages[key][self.source_language].format(**params)
+
+    def render(self, key: str, language: str, **params) -> Optional[str]:
+        """The message in `language`, or None when it has not been compiled."""
+        language = self._language(language)
+        template = self.messages.get(key, {}).get(language) if language else None
+        if template is None:
+            return None
+        return template.format(**params)
+
+    def symptom_name(self, column: str, language: str) -> str:
+        language = self._language(language)
+        names = self.symptoms.get(language, {}) if language else {}
+        return names.get(column) or column.replace("_", " ").strip()
+
+    def symptom_list(self, columns, language: str) -> str:
+        return ", ".join(self.symptom_name(column, language) for column in columns)
+
+    def missing_symptom_names(self, columns, language: str) -> list:
+        """Columns a compiled, non-source language has no name for (they would show in English)."""
+        language = self._language(language)
+        if language is None or language == self.source_language:
+            return []
+        names = self.symptoms.get(language, {})
+        return [column for column in columns if column not in names]
+
+
+@lru_cache(maxsize=1)
+def get_catalog() -> MessageCatalog:
+    """Loads the compiled catalog once per process."""
+    with open(CATALOG_PATH, encoding="utf-8") as file:
+        return MessageCatalog(json.load(file))
+
+
+# ----------------------------
+# Build
+# ----------------------------
+def _placeholders(template: str) -> set:
+    return {name for _, name, _, _ in string.Formatter().parse(template) if name}
+
+
+async def _translate(text: str, language: str) -> str:
+    from app.llm import gateway
+
+    prompt = (
+        f"Translate the following text to {prompt_name(language)}. Keep anything in curly braces, "
+        f"such as {{symptoms}}, and the word 'yes' unchanged. Return only the translation.\n\n{text}"
+    )
+    return (await gateway.generate(prompt, model=config.CATALOG_MODEL, site="catalog.build")).strip()
+
+
+async def _translate_symptoms(columns, language: str) -> dict:
+    from app.llm import gateway
+
+    names = {column: column.replace("_", " ").strip() for column in columns}
+    prompt = (
+        f"Translate each value of this JSON object into {prompt_name(language)} as a short medical "
+        f"symptom name. Keep the keys unchanged and return only JSON.\n\n{json.dumps(names)}"
+    )
+    from app.json_extract import JSONExtractionError, extract_json
+
+    reply = await gateway.generate(prompt, model=config.CATALOG_MODEL, site="catalog.build")
+    try:
+        translated = extract_json(reply, expect="object")
+    except JSONExtractionError:
+        return {}
+    if not isinstance(translated, dict):
+        return {}
+    return {column: str(name) for column, name in translated.items() if column in names}
+
+
+async def build(languages, symptom_columns) -> dict:
+    with open(CATALOG_PATH, encoding="utf-8") as file:
+        data = json.load(file)
+    source = data.get("source_language", "English")
+
+    for key, translations in data["messages"].items():
+        for language in languages:
+            if language in translations:
+                continue
+            translated = await _translate(translations[source], language)
+            if _placeholders(translated) != _placeholders(translations[source]):
+                print(f"Skipping {key}/{language}: placeholders were not preserved")
+                continue
+            translations[language] = translated
+
+    for language in languages:
+        names = data["symptoms"].setdefault(language, {}) if language != source else {}
+        missing = [column for column in symptom_columns if column not in names]
+        if language != source and missing:
+            names.update(await _translate_symptoms(missing, language))
+
+    with open(CATALOG_PATH, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+        file.write("\n")
+    return data
+
+
+def main():
+    from app.symptom_matcher import load_columns
+
+    parser = argparse.ArgumentParser(description="Compile missing catalog translations with the LLM.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--languages", nargs="+", help="Defaults to every language in the catalog")
+    args = parser.parse_args()
+
+    asyncio.run(build(args.languages or get_catalog().languages, load_columns()))
+    print(f"Catalog written to {CATALOG_PATH}")
+
+
+if __name__ == "__main__":
+    main()
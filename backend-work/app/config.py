@@ -0,0 +1,191 @@
+# config.py (shared settings for the backend)
+import os
+from dotenv import load_dotenv
+
+# Load environment variables once for every module
+load_dotenv()
+
+# ----------------------------
+# Paths
+# ----------------------------
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(APP_DIR, "Data")
+MASTER_DATA_DIR = os.path.join(APP_DIR, "MasterData")
+
+# ----------------------------
+# Gemini / LLM gateway
+# ----------------------------
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# "gemini" talks to the real API, "fake" uses the deterministic local model
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# Max model calls in flight per worker process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# Latency of the fake backend, used by tests and load benchmarks
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "0"))
+# Requests per minute the fake backend accepts before answering 429 (0 = no limit)
+FAKE_LLM_RPM = int(os.getenv("FAKE_LLM_RPM", "0"))
+
+# Quota the scheduler keeps every model call within (per worker process);
+# defaults are Gemini 2.0 Flash tier 1
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "2000"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "4000000"))
+# Completion tokens assumed per call until the real usage is known
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "300"))
+# Waiting calls per priority class; beyond this new calls are shed with 503
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "256"))
+# Pause after a 429 from the model that carries no retry delay
+LLM_RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("LLM_RATE_LIMIT_BACKOFF_SECONDS", "10"))
+# Longest a single model call may take
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+# Model tiers per call site, "site=primary>fallback,..." on the longest
+# matching site prefix, e.g. "chatbot=gemini-2.0-flash>gemini-2.0-flash-lite";
+# empty primary = the router's model, empty fallback = no hedging
+LLM_MODEL_TIERS = os.getenv("LLM_MODEL_TIERS", "")
+# Calls still running at the primary's observed p95 (but at least
+# LLM_HEDGE_MIN_DELAY_MS) are duplicated to the fallback; hedges and
+# failovers together stay under LLM_HEDGE_BUDGET extra calls per call
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "200"))
+
+# Symptom-extraction prompts arriving within this window (from any router)
+# are sent as one numbered prompt of at most EXTRACTION_BATCH_MAX items;
+# a window of 0 sends every prompt on its own
+EXTRACTION_BATCH_WINDOW_MS = float(os.getenv("EXTRACTION_BATCH_WINDOW_MS", "5"))
+EXTRACTION_BATCH_MAX = int(os.getenv("EXTRACTION_BATCH_MAX", "16"))
+
+# ----------------------------
+# /chat/ pipeline
+# ----------------------------
+# "fused" asks for language, symptoms and diagnosis in one call,
+# "staged" runs detect_language -> extract_symptoms -> generate_diagnosis
+CHAT_PIPELINE_MODE = os.getenv("CHAT_PIPELINE_MODE", "fused")
+
+# Below this confidence the local language detector asks the LLM instead
+LANGDETECT_MIN_CONFIDENCE = float(os.getenv("LANGDETECT_MIN_CONFIDENCE", "0.8"))
+
+# ----------------------------
+# Disease model bundle
+# ----------------------------
+# Built offline with `python -m app.model_bundle build`
+MODEL_BUNDLE_DIR = os.getenv("MODEL_BUNDLE_DIR", os.path.join(APP_DIR, "artifacts", "disease_model"))
+
+# /chat/ answers from the local engine (no LLM call) when its top-1
+# probability reaches this; 1.1 disables the local path
+DIAGNOSIS_CONFIDENCE = float(os.getenv("DIAGNOSIS_CONFIDENCE", "0.85"))
+
+# ----------------------------
+# chatbot1 sessions
+# ----------------------------
+# "memory" is per worker, "sqlite" is shared by all workers on the host
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(32 * 1024 * 1024)))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(APP_DIR, "artifacts", "sessions.db"))
+# Start the diagnosis (and its translation) as soon as the user is asked to
+# confirm their symptoms, so "yes" is answered from the finished result
+SPECULATIVE_DIAGNOSIS = os.getenv("SPECULATIVE_DIAGNOSIS", "1") == "1"
+# Precomputes kept per worker; the oldest are dropped past this
+SPECULATION_MAX_PENDING = int(os.getenv("SPECULATION_MAX_PENDING", "1000"))
+
+# ----------------------------
+# LLM response cache
+# ----------------------------
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+# Optional on-disk tier shared by workers; empty disables it
+LLM_CACHE_DISK_PATH = os.getenv("LLM_CACHE_DISK_PATH", "")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+
+# Model used by `python -m app.catalog build` to compile message translations
+CATALOG_MODEL = os.getenv("CATALOG_MODEL", "gemini-2.0-flash")
+
+# ----------------------------
+# /predict/image intake
+# ----------------------------
+# Uploads over this size are rejected with 413 while they are being read
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+IMAGE_READ_CHUNK_BYTES = int(os.getenv("IMAGE_READ_CHUNK_BYTES", str(64 * 1024)))
+# Longest side sent to the model, and the JPEG quality it is re-encoded at
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# Threads decoding / resizing images (Pillow releases the GIL while it works)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Results remembered by content hash of the original upload
+IMAGE_RESULT_CACHE_ENTRIES = int(os.getenv("IMAGE_RESULT_CACHE_ENTRIES", "1000"))
+
+# ----------------------------
+# Outbound HTTP (PREDICT_API_URL forward)
+# ----------------------------
+# Unset: /disease-prediction predicts in process instead of over HTTP
+PREDICT_API_URL = os.getenv("PREDICT_API_URL")
+UPSTREAM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT_SECONDS", "2"))
+UPSTREAM_READ_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_READ_TIMEOUT_SECONDS", "5"))
+# Keep-alive pool per worker process
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "50"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+# Retries on connection errors, timeouts and 5xx, with full-jitter exponential backoff
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF_MS = float(os.getenv("UPSTREAM_BACKOFF_MS", "100"))
+# Consecutive failures that open the circuit, and how long it stays open
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))
+UPSTREAM_BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30"))
+
+# ----------------------------
+# Triage
+# ----------------------------
+# /chat/ scores urgency from Symptom_severity.csv weights before any model
+# call and answers emergencies at once; the LLM diagnosis follows in the
+# background and is polled on GET /chat/enrichment/{id}
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "1") == "1"
+# Sum of symptom weights (1-7 each) from which a case is urgent / an emergency;
+# red-flag symptoms (chest pain, coma, ...) are an emergency on their own
+TRIAGE_URGENT_SCORE = int(os.getenv("TRIAGE_URGENT_SCORE", "12"))
+TRIAGE_EMERGENCY_SCORE = int(os.getenv("TRIAGE_EMERGENCY_SCORE", "30"))
+# How long, and how many, background enrichment results are kept for polling
+TRIAGE_RESULT_TTL_SECONDS = float(os.getenv("TRIAGE_RESULT_TTL_SECONDS", "600"))
+TRIAGE_MAX_RESULTS = int(os.getenv("TRIAGE_MAX_RESULTS", "1000"))
+
+# ----------------------------
+# Startup
+# ----------------------------
+# "background" warms models / SDKs after the server starts accepting traffic
+# (GET /ready reports when done), "eager" warms before serving, "lazy" loads
+# everything on first use
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background")
+# Failed warm-up steps are retried after this many seconds, doubling up to the max
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "300"))
+
+# ----------------------------
+# Consultation event log
+# ----------------------------
+# Consultations are queued in memory and written in batches by a background
+# task; "sqlite" is one WAL-mode file, "ndjson" a directory of rotated segments
+EVENT_LOG_ENABLED = os.getenv("EVENT_LOG_ENABLED", "1") == "1"
+EVENT_LOG_BACKEND = os.getenv("EVENT_LOG_BACKEND", "sqlite")
+EVENT_LOG_PATH = os.getenv(
+    "EVENT_LOG_PATH",
+    os.path.join(APP_DIR, "artifacts", "events.db" if EVENT_LOG_BACKEND == "sqlite" else "events"),
+)
+# Events buffered before the drop policy applies: "drop_oldest" or "drop_newest"
+EVENT_LOG_CAPACITY = int(os.getenv("EVENT_LOG_CAPACITY", "10000"))
+EVENT_LOG_DROP_POLICY = os.getenv("EVENT_LOG_DROP_POLICY", "drop_oldest")
+# A batch is written every EVENT_LOG_FLUSH_MS, or once this many events wait
+EVENT_LOG_BATCH = int(os.getenv("EVENT_LOG_BATCH", "256"))
+EVENT_LOG_FLUSH_MS = float(os.getenv("EVENT_LOG_FLUSH_MS", "500"))
+# NDJSON segments are rotated past this size
+EVENT_LOG_SEGMENT_BYTES = int(os.getenv("EVENT_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+# What is kept of the user's text (health data): "hash" (keyed HMAC-SHA256, so
+# repeats can still be grouped), "redact" (emails / phone numbers / long digit
+# runs masked), "raw" or "none"
+EVENT_LOG_INPUT = os.getenv("EVENT_LOG_INPUT", "hash")
+# Key of the input hash; set it per deployment so hashes can't be matched against guesses
+EVENT_LOG_HASH_KEY = os.getenv("EVENT_LOG_HASH_KEY", "")
+# Events older than this are deleted by the writer (0 keeps them forever)
+EVENT_LOG_RETENTION_DAYS = float(os.getenv("EVENT_LOG_RETENTION_DAYS", "90"))
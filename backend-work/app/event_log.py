@@ -0,0 +1,386 @@
+# event_log.py (append-only consultation log, written in batches off the request path)
+"""
+Every consultation (input, symptoms, predicted disease, urgency, language,
+latencies) is appended to an in-memory ring buffer by EventLog.record(),
+which never blocks or does I/O. A background task drains the buffer every
+EVENT_LOG_FLUSH_MS, or as soon as EVENT_LOG_BATCH events are waiting, and
+writes each batch in a worker thread. The sink is SQLite in WAL mode or
+rotated NDJSON segments.
+
+When the writer can't keep up, the buffer fills to EVENT_LOG_CAPACITY and the
+drop policy decides: "drop_oldest" keeps the newest events, "drop_newest"
+keeps what is already queued. Every drop is counted.
+
+The log exports to the Training.csv layout for retraining the disease model:
+
+    python -m app.event_log export --out app/Data/Consultations.csv
+
+Each disease carries its `label_source`: "model" for the disease model's own
+predictions (local engine, chatbot1, /disease-prediction), "llm" for LLM
+diagnoses and "confirmed" for labels a clinician confirmed. Export includes
+"confirmed" and "llm" labels by default and leaves "model" out, since
+retraining on them only reinforces what the model already predicts.
+
+The user's text is health data: EVENT_LOG_INPUT keeps it hashed (default),
+redacted, raw or not at all, applied in the writer thread before anything
+reaches disk. The writer also deletes events older than
+EVENT_LOG_RETENTION_DAYS.
+"""
+import argparse
+import asyncio
+import csv
+import glob
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from app import config, metrics
+from app.symptom_matcher import compact
+
+events = metrics.register(metrics.Counter(
+    "event_log_events_total", "Consultation events by outcome (dropped / written / failed / purged).", ("outcome",)
+))
+
+_REDACTIONS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"\+?\d[\d\s-]{6,}\d"), "<number>"),
+]
+
+
+def protect_input(text, mode: str = None):
+    """The user's text as EVENT_LOG_INPUT keeps it: hashed, redacted, raw or None."""
+    mode = mode or config.EVENT_LOG_INPUT
+    if text is None or mode == "none":
+        return None
+    if mode == "hash":
+        digest = hmac.new(config.EVENT_LOG_HASH_KEY.encode(), text.encode(), hashlib.sha256).hexdigest()
+        return f"hmac-sha256:{digest}"
+    if mode == "redact":
+        for pattern, placeholder in _REDACTIONS:
+            text = pattern.sub(placeholder, text)
+        return text
+    return text
+
+
+# ----------------------------
+# Sinks
+# ----------------------------
+class SQLiteSink:
+    """One row per event in a WAL-mode SQLite file; one transaction per batch."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS consultations ("
+            " id INTEGER PRIMARY KEY, ts REAL NOT NULL, source TEXT NOT NULL, disease TEXT, data TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS consultations_ts ON consultations (ts)")
+
+    def write(self, batch):
+        rows = [(event["ts"], event["source"], event.get("disease"), json.dumps(event, separators=(",", ":"))) for event in batch]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT INTO consultations (ts, source, disease, data) VALUES (?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+
+    def read(self):
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM consultations ORDER BY id").fetchall()
+        for (data,) in rows:
+            yield json.loads(data)
+
+    def purge(self, before: float) -> int:
+        """Deletes events logged before `before` (epoch seconds); returns how many."""
+        with self._lock:
+            return self._db.execute("DELETE FROM consultations WHERE ts < ?", (before,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class NDJSONSink:
+    """Compact JSON lines in segments rotated once they pass `segment_bytes`."""
+
+    def __init__(self, directory: str, segment_bytes: int = None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes if segment_bytes is not None else config.EVENT_LOG_SEGMENT_BYTES
+        self._file = None
+        self.segments = 0
+
+    def _segment(self):
+        if self._file is not None and self._file.tell() < self.segment_bytes:
+            return self._file
+        if self._file is not None:
+            self._file.close()
+        self.segments += 1
+        name = f"events-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.segments}.ndjson"
+        self._file = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+        return self._file
+
+    def write(self, batch):
+        file = self._segment()
+        file.write("".join(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n" for event in batch))
+        file.flush()
+
+    def read(self):
+        for path in sorted(glob.glob(os.path.join(self.directory, "events-*.ndjson"))):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def purge(self, before: float) -> int:
+        """Deletes closed segments last written before `before`; returns the events they held."""
+        current = self._file.name if self._file is not None else None
+        purged = 0
+        for path in glob.glob(os.path.join(self.directory, "events-*.ndjson")):
+            if path == current or os.path.getmtime(path) >= before:
+                continue
+            with open(path, encoding="utf-8") as file:
+                purged += sum(1 for line in file if line.strip())
+            os.remove(path)
+        return purged
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def build_sink(backend: str = None, path: str = None):
+    """Creates the sink selected by EVENT_LOG_BACKEND."""
+    backend = backend or config.EVENT_LOG_BACKEND
+    if backend == "sqlite":
+        return SQLiteSink(path or config.EVENT_LOG_PATH)
+    if backend == "ndjson":
+        return NDJSONSink(path or config.EVENT_LOG_PATH)
+    raise ValueError(f"Unknown EVENT_LOG_BACKEND: {backend}")
+
+
+# ----------------------------
+# Buffer and writer
+# ----------------------------
+class EventLog:
+    """Bounded buffer in front of a sink, drained by one background task."""
+
+    PURGE_EVERY_SECONDS = 3600
+
+    def __init__(self, sink=None, capacity: int = None, batch_size: int = None, flush_ms: float = None,
+                 drop_policy: str = None, retention_days: float = None):
+        self._sink = sink
+        self.capacity = capacity if capacity is not None else config.EVENT_LOG_CAPACITY
+        self.batch_size = batch_size if batch_size is not None else config.EVENT_LOG_BATCH
+        self.flush_seconds = (flush_ms if flush_ms is not None else config.EVENT_LOG_FLUSH_MS) / 1000
+        self.drop_policy = drop_policy or config.EVENT_LOG_DROP_POLICY
+        self.retention_days = retention_days if retention_days is not None else config.EVENT_LOG_RETENTION_DAYS
+        self._buffer = deque()
+        self._wakeup = None
+        self._task = None
+        self._purged_at = None
+        self.recorded = self.dropped = self.written = self.failed = self.batches = self.purged = 0
+
+    @property
+    def sink(self):
+        if self._sink is None:
+            self._sink = build_sink()
+        return self._sink
+
+    def record(self, source: str, **fields):
+        """Queues one event; O(1), no I/O, drops per the policy when full."""
+        if not config.EVENT_LOG_ENABLED:
+            return
+        event = {"ts": time.time(), "source": source, **fields}
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            events.inc(outcome="dropped")
+            if self.drop_policy == "drop_newest":
+                return
+            self._buffer.popleft()
+        self._buffer.append(event)
+        self.recorded += 1  # exported through stats(), kept off the shared counter's lock
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        """Starts the writer on the running loop (app startup)."""
+        if self._task is None and config.EVENT_LOG_ENABLED:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the writer and flushes what is left (app shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            await self._flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                await self._flush()
+            if self.retention_days and (self._purged_at is None or time.monotonic() - self._purged_at >= self.PURGE_EVERY_SECONDS):
+                await self._purge()
+
+    def _write(self, batch):
+        """Worker thread: protects the user's text, then writes; raw text is never persisted."""
+        for event in batch:
+            if "input" in event:
+                event["input"] = protect_input(event["input"])
+        self.sink.write(batch)
+
+    async def _purge(self):
+        """Deletes events past the retention period, at most once per PURGE_EVERY_SECONDS."""
+        self._purged_at = time.monotonic()
+        try:
+            purged = await asyncio.to_thread(self.sink.purge, time.time() - self.retention_days * 86400)
+        except Exception as e:
+            logging.error(f"Event log retention purge failed: {e}")
+            return
+        self.purged += purged
+        events.inc(purged, outcome="purged")
+
+    async def _flush(self):
+        batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        try:
+            with metrics.span("event_log.write"):
+                await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            # Not retried: a failing disk must not grow the buffer without bound
+            self.failed += len(batch)
+            events.inc(len(batch), outcome="failed")
+            logging.error(f"Event log write of {len(batch)} events failed: {e}")
+            return
+        self.written += len(batch)
+        self.batches += 1
+        events.inc(len(batch), outcome="written")
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "purged": self.purged,
+            "buffered": len(self._buffer),
+            "capacity": self.capacity,
+            "running": self._task is not None and not self._task.done(),
+        }
+
+
+event_log = EventLog()
+metrics.stats_collector("event_log", "Consultation event log: recorded, dropped, written and buffered events.", event_log.stats)
+
+
+# ----------------------------
+# Export
+# ----------------------------
+LABEL_SOURCES = ("confirmed", "llm", "model")
+# Labels exported by default: everything but the model's own predictions
+TRAINING_LABEL_SOURCES = ("confirmed", "llm")
+
+# Sources whose disease always comes from the disease model
+MODEL_LABEL_EVENT_SOURCES = ("chatbot1", "disease_prediction")
+
+
+def label_source(event: dict) -> str:
+    """The event's label_source; inferred for events logged before it was recorded."""
+    if event.get("label_source"):
+        return event["label_source"]
+    if event.get("confidence") is not None or event.get("source") in MODEL_LABEL_EVENT_SOURCES:
+        return "model"
+    return "llm"
+
+
+def training_rows(records, all_diseases: bool = False, sources=None, label_sources=TRAINING_LABEL_SOURCES):
+    """
+    (header, rows, skipped, filtered) in the Training.csv layout: one 0/1
+    column per symptom, then the prognosis. Events from other `sources` or
+    with a label outside `label_sources` are filtered; events without a known
+    symptom or disease are skipped. With `all_diseases` unknown diseases are
+    kept as logged.
+    """
+    from app.knowledge_base import TRAINING_CSV_PATH, get_knowledge_base
+
+    kb = get_knowledge_base()
+    with open(TRAINING_CSV_PATH, newline="") as file:
+        labels = {compact(row[-1]): row[-1] for row in csv.reader(file) if row}
+
+    header = [*kb.symptoms, "prognosis"]
+    rows, skipped, filtered = [], 0, 0
+    for event in records:
+        if (sources and event.get("source") not in sources) or label_source(event) not in label_sources:
+            filtered += 1
+            continue
+        columns = {kb.column(symptom) for symptom in event.get("symptoms") or []} - {None}
+        disease = event.get("disease")
+        label = labels.get(compact(disease)) if disease else None
+        if label is None and all_diseases and disease:
+            label = disease
+        if not columns or label is None:
+            skipped += 1
+            continue
+        rows.append([int(symptom in columns) for symptom in kb.symptoms] + [label])
+    return header, rows, skipped, filtered
+
+
+def export_training_csv(
+    out: str, sink=None, all_diseases: bool = False, sources=None, label_sources=TRAINING_LABEL_SOURCES
+) -> dict:
+    header, rows, skipped, filtered = training_rows((sink or build_sink()).read(), all_diseases, sources, label_sources)
+    with open(out, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return {"rows": len(rows), "skipped": skipped, "filtered": filtered}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the consultation event log.")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--out", required=True, help="CSV file in the Training.csv layout")
+    parser.add_argument("--backend", default=config.EVENT_LOG_BACKEND, choices=["sqlite", "ndjson"])
+    parser.add_argument("--path", default=config.EVENT_LOG_PATH)
+    parser.add_argument("--all-diseases", action="store_true", help="Keep diseases Training.csv doesn't know")
+    parser.add_argument("--source", nargs="+", default=None, help="Only events from these sources (chat, chatbot1, ...)")
+    parser.add_argument(
+        "--label-source", nargs="+", default=list(TRAINING_LABEL_SOURCES), choices=LABEL_SOURCES,
+        help="Label provenances to export; add 'model' to include the model's own predictions",
+    )
+    args = parser.parse_args()
+
+    result = export_training_csv(
+        args.out, build_sink(args.backend, args.path), args.all_diseases, args.source, args.label_source
+    )
+    print(
+        f"Wrote {result['rows']} rows to {args.out} "
+        f"({result['filtered']} events filtered, {result['skipped']} skipped)"
+    )
+
+
+if __name__ == "__main__":
+    main()
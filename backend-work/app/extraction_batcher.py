@@ -0,0 +1,205 @@
+# extraction_batcher.py (cross-request micro-batching of symptom extraction prompts)
+"""
+Symptom-extraction prompts from chatbot, chatbot1 and /disease-prediction
+are queued per model for EXTRACTION_BATCH_WINDOW_MS (or until
+EXTRACTION_BATCH_MAX are waiting) and sent as one numbered prompt. The JSON
+reply is split back into one symptom list per caller. Items the reply
+leaves out or garbles are retried on their own; a model error fails the
+whole batch, exactly as it would have failed each unbatched call.
+
+A batch runs in a fresh context at the highest scheduler priority among its
+callers, so it neither inherits nor leaks the first caller's context.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+from typing import List
+
+from app import config, metrics
+from app.json_extract import JSONExtractionError, extract_json, parse_model, validate
+from app.llm_scheduler import PRIORITIES, priority, priority_for
+from app.schema import SymptomList
+
+JSON_CONFIG = {"response_mime_type": "application/json"}
+
+
+def single_prompt(text: str) -> str:
+    return f"""
+    You are a professional doctor. A patient says: {json.dumps(text, ensure_ascii=False)}.
+    Extract and return a JSON list of the symptoms mentioned, using short
+    symptom names (e.g. "high fever", "joint pain"). If no symptoms are found, return [].
+    """
+
+
+def batch_prompt(texts: List[str]) -> str:
+    messages = "\n".join(f"{i}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts, 1))
+    return f"""
+    You are a professional doctor. Extract the symptoms mentioned in each numbered patient message below.
+    Use short symptom names (e.g. "high fever", "joint pain").
+    Return ONLY a JSON object mapping every message number to a JSON list of its symptoms,
+    e.g. {{"1": ["headache"], "2": []}}. Use [] for a message without symptoms.
+
+    Messages:
+    {messages}
+    """
+
+
+def parse_symptoms(reply: str) -> List[str]:
+    """Symptom names from a single-item reply; a reply without JSON means none."""
+    if not reply or ("[" not in reply and "{" not in reply):
+        return []
+    return parse_model(reply, SymptomList).root
+
+
+def split_reply(reply: str, count: int) -> list:
+    """One symptom list per numbered message, None where the reply has no usable item."""
+    try:
+        value = extract_json(reply)
+    except JSONExtractionError:
+        return [None] * count
+
+    if isinstance(value, dict) and len(value) == 1:
+        (key, inner), = value.items()
+        if not str(key).isdigit() and isinstance(inner, (dict, list)):
+            value = inner  # {"results": {...}} / {"results": [...]}
+    if isinstance(value, dict):
+        items = [value.get(str(i), value.get(i)) for i in range(1, count + 1)]
+    elif isinstance(value, list) and len(value) == count:
+        items = value
+    else:
+        return [None] * count
+
+    results = []
+    for item in items:
+        try:
+            results.append(None if item is None or isinstance(item, str) else validate(item, SymptomList).root)
+        except JSONExtractionError:
+            results.append(None)
+    return results
+
+
+class ExtractionBatcher:
+    """Collects concurrent extraction requests and answers them from shared model calls."""
+
+    def __init__(self, gateway=None, window_ms: float = None, max_batch: int = None):
+        self._gateway = gateway
+        self.window_ms = window_ms if window_ms is not None else config.EXTRACTION_BATCH_WINDOW_MS
+        self.max_batch = max_batch if max_batch is not None else config.EXTRACTION_BATCH_MAX
+        self._queues = {}  # model -> [(text, future)]
+        self._timers = {}
+        self._tasks = set()
+        self.requests = self.model_calls = self.batches = self.batched_items = 0
+        self.deduplicated = self.split_failures = self.fallback_items = 0
+
+    @property
+    def gateway(self):
+        if self._gateway is None:
+            from app.llm import gateway
+
+            self._gateway = gateway
+        return self._gateway
+
+    async def extract(self, text: str, model: str) -> List[str]:
+        """Symptom names mentioned in `text`; raises JSONExtractionError if the reply is unusable."""
+        self.requests += 1
+        if self.window_ms <= 0 or self.max_batch <= 1:
+            return await self._extract_one(text, model)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.setdefault(model, [])
+        queue.append((text, future, priority_for("symptom_extraction")))
+        if len(queue) >= self.max_batch:
+            self._flush(model)
+        elif len(queue) == 1:
+            self._timers[model] = loop.call_later(self.window_ms / 1000, self._flush, model, context=contextvars.Context())
+        return await future
+
+    def _flush(self, model: str):
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._queues.pop(model, [])
+        if batch:
+            name = min((entry[2] for entry in batch), key=lambda name: PRIORITIES[name][0])
+            task = contextvars.Context().run(asyncio.create_task, self._run(model, batch, name))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, model: str, batch, name: str):
+        priority.set(name)
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        self.deduplicated += len(batch) - len(texts)
+        try:
+            if len(texts) == 1:
+                results = {texts[0]: await self._settle(self._extract_one(texts[0], model))}
+            else:
+                results = await self._extract_many(texts, model)
+        except Exception as e:
+            results = {text: e for text in texts}
+
+        for text, future, _ in batch:
+            if future.done():
+                continue  # caller went away
+            result = results[text]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _extract_many(self, texts: List[str], model: str) -> dict:
+        self.batches += 1
+        self.batched_items += len(texts)
+        self.model_calls += 1
+        with metrics.span("extraction.batch"):
+            reply = await self.gateway.generate(
+                batch_prompt(texts), model=model, generation_config=JSON_CONFIG,
+                site="symptom_extraction.batch", cache=False,
+            )
+        items = split_reply(reply, len(texts))
+
+        missing = [text for text, item in zip(texts, items) if item is None]
+        if missing:
+            self.split_failures += 1
+            self.fallback_items += len(missing)
+            logging.warning(f"Batched extraction reply could not be split for {len(missing)}/{len(texts)} items")
+        retried = await asyncio.gather(*(self._settle(self._extract_one(text, model)) for text in missing))
+
+        results = {text: item for text, item in zip(texts, items) if item is not None}
+        results.update(zip(missing, retried))
+        return results
+
+    async def _extract_one(self, text: str, model: str) -> List[str]:
+        self.model_calls += 1
+        prompt = single_prompt(text)
+        reply = await self.gateway.generate(prompt, model=model, site="symptom_extraction")
+        try:
+            return parse_symptoms(reply)
+        except JSONExtractionError:
+            await self.gateway.evict(prompt, model)
+            raise
+
+    @staticmethod
+    async def _settle(coro):
+        """Result of `coro`, or the exception it raised (so one item can't fail the rest)."""
+        try:
+            return await coro
+        except Exception as e:
+            return e
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "model_calls": self.model_calls,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_items / self.batches, 2) if self.batches else None,
+            "deduplicated": self.deduplicated,
+            "split_failures": self.split_failures,
+            "fallback_items": self.fallback_items,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+        }
+
+
+extraction_batcher = ExtractionBatcher()
+metrics.stats_collector("symptom_extraction", "Symptom-extraction micro-batching: requests vs model calls.", extraction_batcher.stats)
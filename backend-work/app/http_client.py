@@ -0,0 +1,195 @@
+# http_client.py (pooled outbound HTTP for upstream services)
+import asyncio
+import logging
+import random
+import time
+
+from app import config, metrics
+from app.timing import StageStats
+
+
+class UpstreamError(Exception):
+    """The upstream call failed after all retries."""
+
+
+class CircuitOpen(UpstreamError):
+    """The circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. After `reset_seconds` one
+    trial call is let through (half-open); its outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self):
+        """Frees the half-open trial slot without an outcome (cancelled call)."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+
+class UpstreamClient:
+    """
+    Keep-alive httpx pool with timeouts, jittered retries and a circuit
+    breaker. start()/aclose() are called from the app lifespan; the pool is
+    also created lazily so the client works outside of it (scripts, tests).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect_timeout: float = config.UPSTREAM_CONNECT_TIMEOUT_SECONDS,
+        read_timeout: float = config.UPSTREAM_READ_TIMEOUT_SECONDS,
+        max_connections: int = config.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive: int = config.UPSTREAM_MAX_KEEPALIVE,
+        retries: int = config.UPSTREAM_RETRIES,
+        backoff_ms: float = config.UPSTREAM_BACKOFF_MS,
+        breaker: CircuitBreaker = None,
+        transport=None,
+    ):
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.retries = retries
+        self.backoff_ms = backoff_ms
+        self.breaker = breaker or CircuitBreaker(config.UPSTREAM_BREAKER_THRESHOLD, config.UPSTREAM_BREAKER_RESET_SECONDS)
+        self._transport = transport
+        self._client = None
+        self.latency = StageStats()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.counters = {"requests": 0, "retries": 0, "not_retried": 0, "failures": 0, "short_circuited": 0}
+
+    def start(self):
+        # httpx is imported here so it stays off the app's import path
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive),
+                transport=self._transport,
+            )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, base * 2^attempt] seconds."""
+        return random.uniform(0, self.backoff_ms * (2 ** attempt)) / 1000
+
+    async def post_json(self, url: str, payload, idempotency_key: str = None):
+        """
+        POSTs JSON and returns the first non-5xx httpx.Response. A POST may
+        not be idempotent, so without `idempotency_key` only failures before
+        the request was sent (connect errors, connect / pool timeouts) are
+        retried. With a key, sent as the Idempotency-Key header on every
+        attempt, read timeouts and 5xx answers are retried too.
+        """
+        import httpx
+
+        # The request never reached the upstream: retrying cannot apply it twice
+        not_sent = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise CircuitOpen(f"{self.name}: circuit open after {self.breaker.failures} failures")
+
+        self.start()
+        self.counters["requests"] += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt - 1))
+
+                start = time.perf_counter()
+                retryable = idempotency_key is not None
+                try:
+                    response = await self._client.post(url, json=payload, headers=headers)
+                except httpx.TransportError as e:
+                    outcome, error = "transport_error", e
+                    retryable = retryable or isinstance(e, not_sent)
+                else:
+                    outcome = "ok" if response.status_code < 500 else "server_error"
+                    error = None if outcome == "ok" else f"HTTP {response.status_code}"
+                self.latency.record(outcome, {}, (time.perf_counter() - start) * 1000)
+
+                if outcome == "ok":
+                    self.breaker.record_success()
+                    return response
+                logging.warning(f"{self.name} attempt {attempt + 1} failed: {error}")
+                if not retryable:
+                    self.counters["not_retried"] += 1
+                    raise UpstreamError(f"{self.name} failed and may have applied the request, not retried: {error}")
+
+            raise UpstreamError(f"{self.name} failed after {self.retries + 1} attempts: {error}")
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.counters["failures"] += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "breaker": {"state": self.breaker.state, "consecutive_failures": self.breaker.failures},
+            "pool": {
+                "open": self._client is not None,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "max_connections": self.max_connections,
+                "max_keepalive": self.max_keepalive,
+            },
+            "latency": {outcome: stages["total"] for outcome, stages in self.latency.snapshot().items()},
+        }
+
+
+# Forward of /disease-prediction to PREDICT_API_URL
+predict_client = UpstreamClient("predict_api")
+metrics.stats_collector("upstream_predict_api", "PREDICT_API_URL forward: requests, retries, breaker and pool usage.", predict_client.stats)
@@ -0,0 +1,161 @@
+# image_intake.py (bounded upload reading and downscaling for /predict/image)
+import asyncio
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app import config, metrics
+from app.llm_cache import LLMCache, MemoryTier
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class ImageTooLarge(Exception):
+    """The upload exceeded IMAGE_MAX_UPLOAD_BYTES."""
+
+
+class InvalidImage(Exception):
+    """The upload could not be decoded as an image."""
+
+
+class Upload:
+    """Raw upload bytes plus their SHA-256, used as the dedupe key."""
+
+    __slots__ = ("data", "sha256", "content_type")
+
+    def __init__(self, data: bytes, sha256: str, content_type: str):
+        self.data = data
+        self.sha256 = sha256
+        self.content_type = content_type
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+class UploadLimitMiddleware:
+    """
+    Pure ASGI middleware that caps request bodies on `paths` before Starlette
+    parses the multipart form (and spools the file to disk): a Content-Length
+    over the limit gets 413 without reading the body, and a body that grows
+    past it (chunked uploads) is cut off with 413 as soon as it does.
+    """
+
+    def __init__(self, app, paths, max_bytes: int = None):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_bytes = max_bytes or config.IMAGE_MAX_UPLOAD_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_bytes + MULTIPART_OVERHEAD
+        detail = f"Upload exceeds the {self.max_bytes} byte limit"
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing as they are
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(file, max_bytes: int = None, chunk_size: int = None) -> Upload:
+    """
+    Reads the parsed UploadFile chunk by chunk, hashing as it goes, with
+    ImageTooLarge past the limit. The body itself is capped earlier, by
+    UploadLimitMiddleware.
+    """
+    max_bytes = max_bytes or config.IMAGE_MAX_UPLOAD_BYTES
+    chunk_size = chunk_size or config.IMAGE_READ_CHUNK_BYTES
+
+    # Starlette knows the size of the spooled upload up front
+    if getattr(file, "size", None) is not None and file.size > max_bytes:
+        raise ImageTooLarge(f"Upload is {file.size} bytes, the limit is {max_bytes}")
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > max_bytes:
+            raise ImageTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+        digest.update(chunk)
+        buffer += chunk
+
+    return Upload(bytes(buffer), digest.hexdigest(), file.content_type or "")
+
+
+# ----------------------------
+# Downscaling
+# ----------------------------
+def downscale(data: bytes, max_side: int = None, quality: int = None):
+    """
+    Returns (bytes, mime_type) with the longest side at most `max_side`.
+    JPEGs are decoded at a reduced scale (draft mode), so a 12 MP photo never
+    lands in memory at full resolution.
+    """
+    max_side = max_side or config.IMAGE_MAX_SIDE
+    quality = quality or config.IMAGE_JPEG_QUALITY
+
+    with metrics.span("image.downscale"):
+        return _downscale(data, max_side, quality)
+
+
+def _downscale(data: bytes, max_side: int, quality: int):
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        source_format = image.format
+        if max(image.size) <= max_side and source_format in ("JPEG", "PNG", "WEBP"):
+            return data, Image.MIME[source_format]
+
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e)) from e
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        raise InvalidImage(str(e)) from e
+    return output.getvalue(), "image/jpeg"
+
+
+@lru_cache(maxsize=1)
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=config.IMAGE_WORKERS, thread_name_prefix="image")
+
+
+async def prepare(upload: Upload):
+    """Downscales an upload in the worker pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(), downscale, upload.data)
+
+
+# Model replies keyed by the hash of the original upload; repeated images
+# (and concurrent uploads of the same image) skip decoding and the model call
+result_cache = LLMCache(MemoryTier(config.IMAGE_RESULT_CACHE_ENTRIES))
+metrics.stats_collector("image_result_cache", "/predict/image dedupe hits / misses by content hash.", result_cache.stats)
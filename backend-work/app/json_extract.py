@@ -0,0 +1,206 @@
+# json_extract.py (structured-output parsing for model replies)
+import json
+import re
+
+from pydantic import BaseModel, ValidationError
+
+from app import metrics
+
+_OPENERS = {"object": "{", "array": "[", None: "{["}
+_CLOSERS = {"{": "}", "[": "]"}
+# Characters that matter to the scanner outside of strings
+_STRUCTURAL = re.compile(r"[{}\[\]\"']")
+_STRING_END = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_STRING_SEGMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', re.DOTALL)
+_SMART_QUOTES = str.maketrans({"\u201c": '"', "\u201d": '"', "\u2018": "'", "\u2019": "'"})
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_UNQUOTED_KEY = re.compile(r"([{,]\s*)([A-Za-z_][\w\-]*)(\s*:)")
+_PY_LITERALS = re.compile(r"\b(True|False|None)\b")
+_DANGLING = re.compile(r'(?:,\s*)?(?:"(?:\\.|[^"\\])*"\s*:?\s*)?,?\s*$', re.DOTALL)
+
+outcomes = metrics.register(metrics.Counter(
+    "json_extract_total", "Model replies parsed as JSON, by outcome (clean / repaired / failed).", ("outcome",)
+))
+
+
+class JSONExtractionError(ValueError):
+    """No usable JSON value could be recovered from the reply."""
+
+
+# ----------------------------
+# Repair
+# ----------------------------
+def repair(fragment: str) -> str:
+    """
+    Fixes the usual model mistakes outside of string literals: smart quotes,
+    single-quoted strings, trailing commas, unquoted keys and Python literals.
+    """
+    fragment = fragment.translate(_SMART_QUOTES)
+    parts, last = [], 0
+    for match in _STRING_SEGMENT.finditer(fragment):
+        parts.append(_repair_code(fragment[last:match.start()]))
+        literal = match.group(0)
+        if literal[0] == "'":
+            literal = json.dumps(literal[1:-1].replace("\\'", "'"), ensure_ascii=False)
+        parts.append(literal)
+        last = match.end()
+    parts.append(_repair_code(fragment[last:]))
+    return _TRAILING_COMMA.sub(r"\1", "".join(parts))
+
+
+def _repair_code(segment: str) -> str:
+    segment = _UNQUOTED_KEY.sub(r'\1"\2"\3', segment)
+    return _PY_LITERALS.sub(lambda m: {"True": "true", "False": "false", "None": "null"}[m.group(1)], segment)
+
+
+def _loads(fragment: str):
+    """(value, repaired) for a candidate fragment, or raises ValueError."""
+    try:
+        return json.loads(fragment), False
+    except json.JSONDecodeError:
+        return json.loads(repair(fragment)), True
+
+
+# ----------------------------
+# Incremental scanner
+# ----------------------------
+class JSONStreamParser:
+    """
+    Finds the first balanced JSON value in text that arrives in chunks.
+    Each chunk is scanned once, so the value is ready as soon as its closing
+    bracket arrives; close() also recovers a value cut off mid-stream.
+    """
+
+    def __init__(self, expect: str = None):
+        self.openers = _OPENERS[expect]
+        self.text = ""
+        self.done = False
+        self.value = None
+        self.repaired = False
+        self._pos = 0
+        self._start = None
+        self._stack = []
+        self._quote = None  # quote character of the open string, if any
+        self._last = None  # last non-space character outside strings, for telling quotes from apostrophes
+
+    def feed(self, chunk: str) -> bool:
+        """Adds a chunk; True once a complete value has been parsed."""
+        self.text += chunk
+        while not self.done and self._pos < len(self.text):
+            if self._start is None:
+                self._seek_opener()
+            elif self._quote is not None:
+                if not self._skip_string():
+                    break  # escape sequence split across chunks
+            else:
+                self._step()
+        return self.done
+
+    def _seek_opener(self):
+        positions = [self.text.find(opener, self._pos) for opener in self.openers]
+        positions = [position for position in positions if position >= 0]
+        if not positions:
+            self._pos = len(self.text)
+            return
+        self._start = min(positions)
+        self._stack = [self.text[self._start]]
+        self._last = self.text[self._start]
+        self._pos = self._start + 1
+
+    def _skip_string(self) -> bool:
+        end = _STRING_END[self._quote]
+        i = self._pos
+        while True:
+            match = end.search(self.text, i)
+            if match is None:
+                self._pos = len(self.text)
+                return True
+            i = match.start()
+            if self.text[i] == "\\":
+                if i + 1 == len(self.text):
+                    self._pos = i
+                    return False
+                i += 2
+                continue
+            self._last = self._quote
+            self._quote = None
+            self._pos = i + 1
+            return True
+
+    def _step(self):
+        match = _STRUCTURAL.search(self.text, self._pos)
+        end = match.start() if match is not None else len(self.text)
+        # Only the text skipped since the last structural character is looked at
+        gap = self.text[self._pos:end].rstrip()
+        if gap:
+            self._last = gap[-1]
+        if match is None:
+            self._pos = end
+            return
+        char = match.group(0)
+        self._pos = match.end()
+        previous, self._last = self._last, char
+        if char == '"' or (char == "'" and previous in ("[", "{", ",", ":")):
+            # A single quote only opens a string where a value may start (not "it's")
+            self._quote = char
+        elif char in "{[":
+            self._stack.append(char)
+        elif self._stack and _CLOSERS[self._stack[-1]] == char:
+            self._stack.pop()
+            if not self._stack:
+                self._try_complete(self.text[self._start:self._pos])
+
+    def _try_complete(self, fragment: str):
+        try:
+            self.value, self.repaired = _loads(fragment)
+            self.done = True
+        except ValueError:
+            # Not JSON after all (e.g. "[see below]"); look for the next opener
+            self._pos = self._start + 1
+            self._start = None
+            self._stack = []
+
+    def close(self):
+        """Value of the reply; closes a truncated value when possible."""
+        if not self.done and self._start is not None:
+            fragment = self.text[self._start:]
+            if self._quote is not None:
+                fragment += self._quote
+            closers = "".join(_CLOSERS[opener] for opener in reversed(self._stack))
+            for candidate in (fragment + closers, _DANGLING.sub("", fragment) + closers):
+                try:
+                    self.value, _ = _loads(candidate)
+                    self.done = self.repaired = True
+                    break
+                except ValueError:
+                    continue
+
+        if not self.done:
+            outcomes.inc(outcome="failed")
+            raise JSONExtractionError(f"No JSON value in model reply: {self.text[:200]!r}")
+        outcomes.inc(outcome="repaired" if self.repaired else "clean")
+        return self.value
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def extract_json(text: str, expect: str = None):
+    """First JSON value (`expect` = "object" / "array" to restrict it) in a reply."""
+    with metrics.span("json.parse"):
+        parser = JSONStreamParser(expect)
+        parser.feed(text or "")
+        return parser.close()
+
+
+def validate(value, schema):
+    """Validates a parsed value against a Pydantic model class."""
+    try:
+        return schema.model_validate(value)
+    except ValidationError as e:
+        raise JSONExtractionError(f"Reply does not match {schema.__name__}: {e}") from e
+
+
+def parse_model(text: str, schema: type[BaseModel]):
+    """Extracts the first JSON value from a reply and validates it against `schema`."""
+    return validate(extract_json(text), schema)
@@ -0,0 +1,242 @@
+# knowledge_base.py (symptom and disease reference data, loaded once and shared by all routers)
+"""
+One indexed view of the CSVs under Data/ and MasterData/:
+
+- symptom ids: positions in the Training.csv header, so they line up with
+  the disease model's columns; any spelling (column, display name,
+  MasterData variant) resolves through one dict lookup
+- disease -> symptom bitsets built from dataset.csv
+- a severity array (array("b")) indexed by symptom id, 0 = not rated
+- descriptions and precaution tuples indexed by disease id
+
+reload_knowledge_base() builds a fresh instance and swaps it in, so edited
+CSVs take effect without a restart; readers keep whichever instance they
+already hold.
+"""
+import csv
+import logging
+import os
+import sys
+import threading
+import time
+from array import array
+
+from app import config, metrics
+from app.symptom_matcher import compact, display_name
+
+DATASET_CSV_PATH = os.path.join(config.DATA_DIR, "dataset.csv")
+TRAINING_CSV_PATH = os.path.join(config.DATA_DIR, "Training.csv")
+DESCRIPTION_CSV_PATH = os.path.join(config.MASTER_DATA_DIR, "symptom_Description.csv")
+SEVERITY_CSV_PATH = os.path.join(config.MASTER_DATA_DIR, "Symptom_severity.csv")
+PRECAUTION_CSV_PATH = os.path.join(config.MASTER_DATA_DIR, "symptom_precaution.csv")
+
+# MasterData spelling -> dataset.csv / Training.csv prognosis
+DISEASE_ALIASES = {"Dimorphic hemorrhoids(piles)": "Dimorphic hemmorhoids(piles)"}
+
+
+class KnowledgeBase:
+    """Immutable, indexed symptom and disease data."""
+
+    def __init__(self, symptoms, diseases, disease_symptoms, severity, descriptions, precautions, aliases):
+        self.symptoms = tuple(sys.intern(symptom) for symptom in symptoms)
+        self.diseases = tuple(sys.intern(disease) for disease in diseases)
+        self.disease_symptoms = tuple(disease_symptoms)  # int bitset per disease id
+        self.severity = severity  # weight per symptom id
+        self.descriptions = tuple(descriptions)
+        self.precautions = tuple(precautions)
+        # MasterData spelling -> Training.csv column, where they differ
+        self.aliases = aliases
+        self.vocabulary = frozenset(display_name(symptom) for symptom in self.symptoms)
+        self.loaded_at = time.time()
+
+        self._symptom_ids = {}
+        for index, symptom in enumerate(self.symptoms):
+            for key in (symptom, display_name(symptom), compact(symptom)):
+                self._symptom_ids.setdefault(key, index)
+        for alias, symptom in aliases.items():
+            self._symptom_ids.setdefault(alias, self._symptom_ids[symptom])
+
+        self._disease_ids = {}
+        for index, disease in enumerate(self.diseases):
+            self._disease_ids.setdefault(disease, index)
+            self._disease_ids.setdefault(compact(disease), index)
+        for alias, disease in DISEASE_ALIASES.items():
+            if disease in self._disease_ids:
+                self._disease_ids.setdefault(alias, self._disease_ids[disease])
+
+    # ----------------------------
+    # Symptoms
+    # ----------------------------
+    def symptom_id(self, name: str):
+        """Id for any known spelling of a symptom, or None."""
+        index = self._symptom_ids.get(name)
+        return index if index is not None else self._symptom_ids.get(compact(name))
+
+    def column(self, name: str):
+        """Training.csv column for any known spelling of a symptom, or None."""
+        index = self.symptom_id(name)
+        return None if index is None else self.symptoms[index]
+
+    def severity_of(self, name: str):
+        """Severity weight (1-7) of a symptom, or None when unknown or unrated."""
+        index = self.symptom_id(name)
+        weight = 0 if index is None else self.severity[index]
+        return weight or None
+
+    def max_severity(self, names) -> int:
+        """Highest severity weight among the symptoms, 0 if none is rated."""
+        ids = [index for index in map(self.symptom_id, names) if index is not None]
+        return max((self.severity[index] for index in ids), default=0)
+
+    def mask(self, names) -> int:
+        """Bitset of the known symptoms in `names`."""
+        bits = 0
+        for index in map(self.symptom_id, names):
+            if index is not None:
+                bits |= 1 << index
+        return bits
+
+    # ----------------------------
+    # Diseases
+    # ----------------------------
+    def disease_id(self, name: str):
+        index = self._disease_ids.get(name)
+        return index if index is not None else self._disease_ids.get(compact(name))
+
+    def description(self, disease: str, default: str = ""):
+        index = self.disease_id(disease)
+        return (self.descriptions[index] if index is not None else "") or default
+
+    def precautions_of(self, disease: str) -> tuple:
+        index = self.disease_id(disease)
+        return self.precautions[index] if index is not None else ()
+
+    def symptoms_of(self, disease: str) -> list:
+        """Training.csv columns recorded for a disease in dataset.csv."""
+        index = self.disease_id(disease)
+        bits = self.disease_symptoms[index] if index is not None else 0
+        return [symptom for i, symptom in enumerate(self.symptoms) if bits >> i & 1]
+
+    def candidates(self, names) -> list:
+        """Diseases whose recorded symptoms include every known symptom in `names`."""
+        bits = self.mask(names)
+        if not bits:
+            return []
+        return [disease for disease, symptoms in zip(self.diseases, self.disease_symptoms) if symptoms & bits == bits]
+
+    def stats(self) -> dict:
+        return {
+            "symptoms": len(self.symptoms),
+            "diseases": len(self.diseases),
+            "rated_symptoms": sum(1 for weight in self.severity if weight),
+            "diseases_with_precautions": sum(1 for precautions in self.precautions if precautions),
+            "loaded_at": self.loaded_at,
+        }
+
+
+# ----------------------------
+# Load
+# ----------------------------
+def _rows(path: str):
+    if not os.path.exists(path):
+        logging.warning(f"Knowledge base source missing: {path}")
+        return []
+    with open(path, newline="") as file:
+        return [[cell.strip() for cell in row] for row in csv.reader(file) if row and row[0].strip()]
+
+
+def load() -> KnowledgeBase:
+    with open(TRAINING_CSV_PATH, newline="") as file:
+        # Training.csv repeats fluid_overload; one symptom id per column name
+        symptoms = list(dict.fromkeys(column for column in next(csv.reader(file)) if column != "prognosis"))
+    by_compact = {}
+    for symptom in symptoms:
+        by_compact.setdefault(compact(symptom), symptom)
+
+    def resolve(name):
+        return by_compact.get(compact(name))
+
+    diseases, disease_ids, bitsets = [], {}, []
+
+    def disease_index(name):
+        if name not in disease_ids:
+            disease_ids[name] = len(diseases)
+            diseases.append(name)
+            bitsets.append(0)
+        return disease_ids[name]
+
+    symptom_ids = {symptom: index for index, symptom in enumerate(symptoms)}
+    for disease, *names in _rows(DATASET_CSV_PATH):
+        index = disease_index(disease)
+        for name in filter(None, names):
+            symptom = resolve(name)
+            if symptom is not None:
+                bitsets[index] |= 1 << symptom_ids[symptom]
+
+    # Symptom_severity.csv spells a few columns differently ("spotting_urination"),
+    # so rows are matched on the compact form rather than the exact name
+    severity = array("b", bytes(len(symptoms)))
+    aliases = {}
+    for row in _rows(SEVERITY_CSV_PATH):
+        symptom = resolve(row[0])
+        if symptom is None or len(row) < 2 or not row[1].isdigit():
+            continue
+        severity[symptom_ids[symptom]] = max(severity[symptom_ids[symptom]], int(row[1]))
+        if row[0] != symptom:
+            aliases[row[0]] = symptom
+
+    descriptions = {DISEASE_ALIASES.get(row[0], row[0]): row[1] for row in _rows(DESCRIPTION_CSV_PATH) if len(row) >= 2}
+    precautions = {DISEASE_ALIASES.get(row[0], row[0]): tuple(filter(None, row[1:])) for row in _rows(PRECAUTION_CSV_PATH)}
+    for disease in [*descriptions, *precautions]:
+        disease_index(disease)
+
+    return KnowledgeBase(
+        symptoms=symptoms,
+        diseases=diseases,
+        disease_symptoms=bitsets,
+        severity=severity,
+        descriptions=[descriptions.get(disease, "") for disease in diseases],
+        precautions=[precautions.get(disease, ()) for disease in diseases],
+        aliases=aliases,
+    )
+
+
+_kb = None
+_kb_lock = threading.Lock()
+reloads = 0
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """Loads the knowledge base on first use."""
+    global _kb
+    if _kb is not None:
+        return _kb
+
+    with _kb_lock:
+        if _kb is None:
+            with metrics.span("knowledge_base.load"):
+                _kb = load()
+    return _kb
+
+
+def reload_knowledge_base() -> KnowledgeBase:
+    """Re-reads every source file and swaps the new instance in."""
+    global _kb, reloads
+    with metrics.span("knowledge_base.load"):
+        kb = load()
+    with _kb_lock:
+        _kb = kb
+        reloads += 1
+
+    from app.symptom_matcher import get_matcher
+
+    get_matcher.cache_clear()  # its vocabulary comes from the knowledge base
+    logging.info(f"Knowledge base reloaded: {kb.stats()}")
+    return kb
+
+
+def stats() -> dict:
+    return {"loaded": _kb is not None, "reloads": reloads, **(_kb.stats() if _kb is not None else {})}
+
+
+metrics.stats_collector("knowledge_base", "Knowledge base sizes and reload count.", stats)
@@ -0,0 +1,194 @@
+# language.py (offline language detection for chat turns)
+import math
+import re
+from collections import Counter
+from typing import NamedTuple
+
+from app import config, metrics
+
+# ----------------------------
+# Script heuristics
+# ----------------------------
+# Unicode blocks of the Indian scripts we serve. Devanagari and Bengali are
+# shared by several languages and are split further by marker words below.
+SCRIPT_RANGES = [
+    (0x0900, 0x097F, "Hindi"),
+    (0x0980, 0x09FF, "Bengali"),
+    (0x0A00, 0x0A7F, "Punjabi"),
+    (0x0A80, 0x0AFF, "Gujarati"),
+    (0x0B00, 0x0B7F, "Odia"),
+    (0x0B80, 0x0BFF, "Tamil"),
+    (0x0C00, 0x0C7F, "Telugu"),
+    (0x0C80, 0x0CFF, "Kannada"),
+    (0x0D00, 0x0D7F, "Malayalam"),
+    (0x0600, 0x06FF, "Urdu"),
+]
+
+MARATHI_MARKERS = {"आहे", "आहेत", "मला", "नाही", "माझे", "माझा", "माझी", "खूप", "होत", "आणि"}
+ASSAMESE_LETTERS = {"ৰ", "ৱ"}  # letters Bengali does not use
+
+# ----------------------------
+# Latin-script n-gram model
+# ----------------------------
+# Seed corpora of typical complaints, used to tell English apart from Hindi
+# typed in Latin script ("mujhe bukhar hai"). Code-mixed lines ("fever hai")
+# count as Hinglish. app/bench/language_samples.jsonl is the labelled check;
+# keep its sentences out of these.
+SEED_TEXT = {
+    "English": """
+        i have a fever and headache since yesterday. my stomach hurts and i feel
+        like vomiting. there is a pain in my chest when i breathe. i have been
+        coughing for three days with cold and a runny nose. my skin is itchy and
+        there is a rash on my arm. i feel tired and weak all the time. my child
+        has high fever and is not eating. i have joint pain in my knees and back.
+        my throat is sore and i can not swallow. i feel dizzy when i stand up.
+        what should i do about this problem. please help me with my symptoms.
+        the pain is severe at night and i can not sleep. i have loose motions
+        and my eyes are yellow. is it serious, should i see a doctor.
+        i have a burning sensation in my chest after eating. my nose is blocked
+        and i have a mild temperature. there are small red spots on my face and
+        neck. my legs are swollen in the evening. i have been feeling anxious and
+        my heart is racing. the baby has been crying all night with an earache.
+        i twisted my ankle and it is swollen. my periods are late and i have
+        cramps. i have lost weight and i am always thirsty. blood comes out when
+        i cough. my hands shake and i feel cold. the wound on my foot is not
+        healing. i have pain on the right side of my belly. my urine is dark and
+        it hurts to pass it. my grandfather is confused and cannot speak clearly.
+        how long will it take to get better. which medicine should i take for it.
+        it started two weeks ago and is getting worse every day.
+    """,
+    "Hinglish": """
+        mujhe kal se bukhar hai aur sar mein dard ho raha hai. mere pet mein dard
+        hai aur ulti jaisa lag raha hai. saans lene mein takleef hoti hai. teen din
+        se khansi aur zukam hai, naak beh rahi hai. meri skin par khujli ho rahi
+        hai aur haath par daane hain. bahut thakaan aur kamzori lagti hai. mere
+        bacche ko tez bukhar hai aur wo kuch kha nahi raha. ghutno aur kamar mein
+        dard hai. gala kharab hai aur nigalne mein dikkat hai. khade hone par chakkar
+        aate hain. kya karna chahiye, meri madad kijiye. raat ko dard zyada hota hai
+        aur neend nahi aati. dast ho rahe hain aur aankhein peeli hain. kya ye
+        gambhir hai, doctor ke paas jana chahiye.
+        khana khane ke baad seene mein jalan hoti hai. naak band hai aur halka
+        bukhar hai. chehre aur gardan par chhote laal daane hain. shaam ko pair
+        sooj jaate hain. ghabrahat hoti hai aur dil zor se dhadakta hai. bachcha
+        raat bhar kaan ke dard se ro raha hai. pair mud gaya aur takhne mein sujan
+        hai. periods late hain aur pet mein marod hai. wajan kam ho gaya hai aur
+        pyaas bahut lagti hai. khaansne par khoon aata hai. haath kaanpte hain aur
+        thand lagti hai. pair ka ghaav bhar nahi raha. pet ke daahine taraf dard
+        hai. peshab ka rang gehra hai aur jalan hoti hai. dadaji ulti seedhi
+        baatein kar rahe hain. theek hone mein kitna time lagega. kaunsi dawai
+        leni chahiye. do hafte pehle shuru hua tha aur roz badh raha hai. mujhe
+        fever hai aur body pain bhi hai. headache ho raha hai. cough aur cold hai.
+    """,
+}
+
+# Languages the detector returns under a short name that the model would not
+# read correctly in a prompt; the catalog keeps the short name as its key
+PROMPT_NAMES = {"Hinglish": "Hindi (Latin script)"}
+
+NGRAM_SIZE = 3
+MAX_CHARS = 200
+_LETTERS = re.compile(r"[^a-z]+")
+
+
+def _ngrams(text: str):
+    text = " " + _LETTERS.sub(" ", text.lower()).strip() + " "
+    return [text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)]
+
+
+def _build_profiles():
+    profiles = {}
+    vocabulary = set()
+    counts = {}
+    for language, text in SEED_TEXT.items():
+        counts[language] = Counter(_ngrams(text))
+        vocabulary.update(counts[language])
+    for language, counter in counts.items():
+        total = sum(counter.values()) + len(vocabulary) + 1
+        profiles[language] = (
+            {gram: math.log((count + 1) / total) for gram, count in counter.items()},
+            math.log(1 / total),
+        )
+    return profiles
+
+
+NGRAM_PROFILES = _build_profiles()
+
+
+# ----------------------------
+# Detection
+# ----------------------------
+class Detection(NamedTuple):
+    language: str
+    confidence: float
+    method: str  # "script" | "ngram" | "none"
+
+
+def _script_of(char: str):
+    code = ord(char)
+    for start, end, language in SCRIPT_RANGES:
+        if start <= code <= end:
+            return language
+    return None
+
+
+def _refine_script(language: str, text: str) -> str:
+    if language == "Hindi" and MARATHI_MARKERS.intersection(text.split()):
+        return "Marathi"
+    if language == "Bengali" and ASSAMESE_LETTERS.intersection(text):
+        return "Assamese"
+    return language
+
+
+def _detect_latin(text: str) -> Detection:
+    grams = _ngrams(text)
+    if len(grams) < 4:
+        return Detection("English", 0.0, "none")
+
+    scores = {}
+    for language, (logprobs, unseen) in NGRAM_PROFILES.items():
+        scores[language] = sum(logprobs.get(gram, unseen) for gram in grams) / len(grams)
+
+    best = max(scores, key=scores.get)
+    # Softmax over the mean log-likelihoods, sharpened by the amount of evidence
+    evidence = min(len(grams), 40)
+    exps = {language: math.exp((score - scores[best]) * evidence) for language, score in scores.items()}
+    return Detection(best, exps[best] / sum(exps.values()), "ngram")
+
+
+def detect(text: str) -> Detection:
+    """Names the language of `text` without any network call."""
+    with metrics.span("language.detect"):
+        return _detect(text)
+
+
+def _detect(text: str) -> Detection:
+    text = text[:MAX_CHARS]
+    letters = [char for char in text if char.isalpha()]
+    if not letters:
+        return Detection("English", 0.0, "none")
+
+    scripts = Counter(_script_of(char) for char in letters)
+    script, count = scripts.most_common(1)[0]
+    share = count / len(letters)
+
+    if script is not None:
+        return Detection(_refine_script(script, text), share, "script")
+
+    latin = _detect_latin(text)
+    return Detection(latin.language, latin.confidence * share, latin.method)
+
+
+def prompt_name(language: str) -> str:
+    """How to name `language` in a model prompt ("Hinglish" -> "Hindi (Latin script)")."""
+    return PROMPT_NAMES.get(language, language)
+
+
+async def resolve_language(text: str, escalate) -> str:
+    """
+    Uses the local detector and only awaits `escalate(text)` (an LLM call)
+    when its confidence is below LANGDETECT_MIN_CONFIDENCE.
+    """
+    detection = detect(text)
+    if detection.confidence >= config.LANGDETECT_MIN_CONFIDENCE:
+        return detection.language
+    return await escalate(text)
@@ -0,0 +1,271 @@
+# llm.py (shared async gateway for every model call)
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+
+from app import config, metrics
+from app.llm_cache import build_cache, cache_key
+from app.llm_scheduler import LLMScheduler
+from app.model_tiers import ModelTiers
+
+# ----------------------------
+# Backends
+# ----------------------------
+class LLMBackend:
+    """Interface implemented by every model backend."""
+
+    async def generate(self, model: str, contents, generation_config=None) -> str:
+        raise NotImplementedError
+
+    async def stream(self, model: str, contents, generation_config=None):
+        """Yields the reply in text chunks; by default as one chunk."""
+        yield await self.generate(model, contents, generation_config)
+
+
+class GeminiBackend(LLMBackend):
+    """Talks to Gemini through the async surface of the google-genai SDK."""
+
+    def __init__(self, api_key: str):
+        from google import genai
+
+        self._client = genai.Client(api_key=api_key)
+
+    async def generate(self, model: str, contents, generation_config=None) -> str:
+        response = await self._client.aio.models.generate_content(
+            model=model,
+            contents=_to_sdk_contents(contents),
+            config=generation_config,
+        )
+        usage = response.usage_metadata
+        if usage is not None:
+            metrics.record_tokens(model, usage.prompt_token_count, usage.candidates_token_count)
+        return response.text or ""
+
+    async def stream(self, model: str, contents, generation_config=None):
+        chunks = await self._client.aio.models.generate_content_stream(
+            model=model,
+            contents=_to_sdk_contents(contents),
+            config=generation_config,
+        )
+        usage = None
+        async for chunk in chunks:
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                yield chunk.text
+        if usage is not None:
+            metrics.record_tokens(model, usage.prompt_token_count, usage.candidates_token_count)
+
+
+def _to_sdk_contents(contents):
+    """Turns inline {"mime_type", "data"} parts into SDK Part objects."""
+    if not isinstance(contents, list):
+        return contents
+
+    from google.genai import types
+
+    parts = []
+    for item in contents:
+        if isinstance(item, dict) and "data" in item:
+            parts.append(types.Part.from_bytes(data=item["data"], mime_type=item["mime_type"]))
+        else:
+            parts.append(item)
+    return parts
+
+
+FAKE_DIAGNOSIS = {
+    "disease": "Common Cold",
+    "description": "A mild viral infection of the nose and throat.",
+    "severity": 2,
+    "precautions": ["Rest", "Drink warm fluids", "Monitor temperature"],
+    "urgency": "routine",
+}
+
+
+def canned_reply(model: str, contents) -> str:
+    """Deterministic reply for the prompt shapes used by the routers."""
+    if isinstance(contents, list):
+        return "The image shows mild skin irritation. Please consult a dermatologist."
+
+    prompt = str(contents)
+    if '"language"' in prompt and '"symptoms"' in prompt and '"diagnosis"' in prompt:
+        return json.dumps({"language": "English", "symptoms": ["headache", "high_fever"], "diagnosis": FAKE_DIAGNOSIS})
+    if prompt.startswith("Translate the following text"):
+        return prompt.split("\n\n", 1)[-1]
+    if "language" in prompt and "return only the language name" in prompt:
+        return "English"
+    if "each numbered patient message" in prompt:
+        count = len(re.findall(r"^\s*\d+\. ", prompt, re.MULTILINE))
+        return json.dumps({str(i): ["headache", "high_fever"] for i in range(1, count + 1)})
+    if "Extract" in prompt and "symptoms" in prompt:
+        return '["headache", "high_fever"]'
+    if '"disease"' in prompt:
+        return json.dumps(FAKE_DIAGNOSIS)
+    return "OK"
+
+
+class FakeRateLimitError(Exception):
+    """What the fake backend raises past its requests-per-minute limit (like Gemini's 429)."""
+
+    code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"429 RESOURCE_EXHAUSTED, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class FakeBackend(LLMBackend):
+    """Local stand-in for Gemini, used by tests and load benchmarks."""
+
+    def __init__(self, responder=None, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0, rpm_limit: int = 0):
+        self.responder = responder or canned_reply
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rpm_limit = rpm_limit
+        self.calls = 0
+        self.rejected = 0
+        self._recent = []  # start times of calls in the last minute
+        self._random = random.Random(seed)
+
+    def _enforce_rate_limit(self):
+        now = time.monotonic()
+        self._recent = [start for start in self._recent if now - start < 60]
+        if len(self._recent) >= self.rpm_limit:
+            self.rejected += 1
+            raise FakeRateLimitError(60 - (now - self._recent[0]))
+        self._recent.append(now)
+
+    async def generate(self, model: str, contents, generation_config=None) -> str:
+        if self.rpm_limit:
+            self._enforce_rate_limit()
+        self.calls += 1
+        delay_ms = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+        reply = self.responder(model, contents)
+        # Whitespace-token estimate, so token metrics have data offline
+        parts = contents if isinstance(contents, list) else [contents]
+        metrics.record_tokens(model, sum(len(part.split()) for part in parts if isinstance(part, str)), len(reply.split()))
+        return reply
+
+    async def stream(self, model: str, contents, generation_config=None, chunk_size: int = 16):
+        text = await self.generate(model, contents, generation_config)
+        for start in range(0, len(text), chunk_size):
+            yield text[start:start + chunk_size]
+            await asyncio.sleep(0)
+
+
+def build_backend(name: str = None) -> LLMBackend:
+    """Creates the backend selected by LLM_BACKEND."""
+    name = name or config.LLM_BACKEND
+    if name == "fake":
+        return FakeBackend(
+            latency_ms=config.FAKE_LLM_LATENCY_MS,
+            jitter_ms=config.FAKE_LLM_JITTER_MS,
+            rpm_limit=config.FAKE_LLM_RPM,
+        )
+    if name == "gemini":
+        if not config.GEMINI_API_KEY:
+            raise ValueError("GEMINI_API_KEY is not set in environment variables")
+        return GeminiBackend(api_key=config.GEMINI_API_KEY)
+    raise ValueError(f"Unknown LLM_BACKEND: {name}")
+
+
+# ----------------------------
+# Gateway
+# ----------------------------
+class LLMGateway:
+    """
+    Single entry point for model calls. Calls never block the event loop and
+    are admitted by the scheduler: at most `max_concurrency` in flight per
+    process, within the requests / tokens per minute quota, by priority.
+    The model each site calls, and its hedge / fallback, come from `tiers`.
+    """
+
+    def __init__(self, backend: LLMBackend = None, max_concurrency: int = config.LLM_MAX_CONCURRENCY, cache=None, scheduler=None, tiers=None):
+        self._backend = backend
+        self.scheduler = scheduler or LLMScheduler(max_concurrency)
+        self.tiers = tiers or ModelTiers()
+        self.cache = cache
+
+    @property
+    def backend(self) -> LLMBackend:
+        if self._backend is None:
+            self._backend = build_backend()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: LLMBackend):
+        self._backend = backend
+
+    async def generate(self, contents, model: str, generation_config=None, site: str = "default", cache: bool = True) -> str:
+        """
+        Runs one completion and returns the reply text. `site` names the
+        calling code for per-site cache stats; `cache=False` always calls the model.
+        """
+        async def call_model(tier: str):
+            async with self.scheduler.slot(site, contents):
+                metrics.current_site.set(site)
+                try:
+                    with metrics.span(f"llm.{site}"):
+                        return await asyncio.wait_for(self.backend.generate(tier, contents, generation_config), config.LLM_TIMEOUT_SECONDS)
+                except Exception as e:
+                    logging.error(f"LLM call to {tier} failed: {e}")
+                    raise
+
+        async def call():
+            return await self.tiers.run(site, model, call_model)
+
+        if self.cache is None or not cache:
+            return await call()
+        return await self.cache.get_or_call(cache_key(model, contents, generation_config), call, site)
+
+    async def evict(self, contents, model: str, generation_config=None):
+        """Drops a cached reply the caller could not use (malformed or failing validation)."""
+        if self.cache is not None:
+            await self.cache.evict(cache_key(model, contents, generation_config))
+
+    async def stream(self, contents, model: str, generation_config=None, site: str = "default"):
+        """
+        Yields the reply in chunks as the model produces them. A cached reply
+        is yielded whole; a fresh one is cached once the stream completes.
+        """
+        key = cache_key(model, contents, generation_config) if self.cache is not None else None
+        if key is not None:
+            cached = await self.cache.lookup(key, site)
+            if cached is not None:
+                yield cached
+                return
+
+        # Streams stay on the primary tier: a hedge can't take over a stream already under way
+        tier, _ = self.tiers.resolve(site, model)
+        chunks = []
+        async with self.scheduler.slot(site, contents):
+            metrics.current_site.set(site)
+            try:
+                with metrics.span(f"llm.{site}"):
+                    async for chunk in self.backend.stream(tier, contents, generation_config):
+                        chunks.append(chunk)
+                        yield chunk
+            except Exception as e:
+                logging.error(f"LLM stream from {tier} failed: {e}")
+                raise
+
+        if key is not None:
+            await self.cache.store(key, "".join(chunks))
+
+
+gateway = LLMGateway(cache=build_cache())
+metrics.stats_collector("llm_cache", "LLM response cache hits / misses per call site.", lambda: gateway.cache.stats() if gateway.cache else {},
+                        dimensions={"sites": "site"})
+metrics.stats_collector("llm_scheduler", "Model call admission: in flight, queued, shed and quota left.", lambda: gateway.scheduler.stats(),
+                        dimensions={"queued": "priority", "shed": "reason"})
+metrics.stats_collector("llm_tiers", "Model tiers: hedges, failovers and per-model latency / win rate.", lambda: gateway.tiers.stats(),
+                        dimensions={"models": "model"})
+
+
+def set_backend(backend: LLMBackend):
+    """Swaps the backend of the shared gateway, e.g. for a FakeBackend in tests."""
+    gateway.backend = backend
@@ -0,0 +1,230 @@
+# llm_cache.py (response cache in front of the LLM gateway)
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from app import config
+
+
+def normalize_prompt(text: str) -> str:
+    """Whitespace-insensitive form of a prompt; case is kept (names, text to translate)."""
+    return " ".join(text.split())
+
+
+def cache_key(model: str, contents, generation_config=None) -> str:
+    """SHA-256 over model, normalized prompt parts and generation parameters."""
+    digest = hashlib.sha256()
+    digest.update(model.encode())
+    parts = contents if isinstance(contents, list) else [contents]
+    for part in parts:
+        if isinstance(part, dict) and "data" in part:
+            digest.update(part.get("mime_type", "").encode())
+            digest.update(hashlib.sha256(part["data"]).digest())
+        else:
+            digest.update(normalize_prompt(str(part)).encode())
+        digest.update(b"\x00")
+    if generation_config:
+        digest.update(json.dumps(generation_config, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+# ----------------------------
+# Tiers
+# ----------------------------
+class MemoryTier:
+    """Size-bounded LRU."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def evict(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskTier:
+    """
+    SQLite-backed tier with a TTL, shared by every worker on the host. Its
+    methods block; LLMCache runs them in a worker thread.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_seconds),
+            )
+
+    def evict(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        with self._lock:
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class LLMCache:
+    """
+    Memory LRU, then optional disk tier, then the model. Concurrent misses on
+    the same key share one in-flight call (single-flight). Disk reads and
+    writes run in a worker thread, off the event loop.
+    """
+
+    def __init__(self, memory: MemoryTier, disk: DiskTier = None):
+        self.memory = memory
+        self.disk = disk
+        self._inflight = {}
+        self._stats = defaultdict(lambda: {"memory_hits": 0, "disk_hits": 0, "coalesced": 0, "misses": 0})
+
+    async def lookup(self, key: str, site: str = "default"):
+        """Cached value from the memory or disk tier, or None (counted as a miss)."""
+        value = await self._lookup(key, site)
+        if value is None:
+            self._stats[site]["misses"] += 1
+        return value
+
+    async def store(self, key: str, value: str):
+        if value:
+            self.memory.set(key, value)
+            if self.disk is not None:
+                await asyncio.to_thread(self.disk.set, key, value)
+
+    async def _lookup(self, key: str, site: str):
+        stats = self._stats[site]
+
+        value = self.memory.get(key)
+        if value is not None:
+            stats["memory_hits"] += 1
+            return value
+
+        if self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                stats["disk_hits"] += 1
+                self.memory.set(key, value)
+                return value
+        return None
+
+    async def evict(self, key: str):
+        """Drops a cached reply, e.g. one the caller found malformed."""
+        self.memory.evict(key)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.evict, key)
+
+    async def get_or_call(self, key: str, call, site: str = "default") -> str:
+        stats = self._stats[site]
+
+        value = await self._lookup(key, site)
+        if value is not None:
+            return value
+
+        counted = False
+        while True:
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._start(key, call)
+                if not counted:
+                    stats["misses"] += 1
+            elif not counted:
+                stats["coalesced"] += 1
+            counted = True
+
+            # The call runs in its own task: a waiter that is cancelled leaves,
+            # the others keep waiting, and the call stops once nobody waits.
+            flight.waiters += 1
+            try:
+                return await asyncio.shield(flight.task)
+            except asyncio.CancelledError:
+                if flight.task.cancelled() and not asyncio.current_task().cancelling():
+                    continue  # the shared call was cancelled, not this waiter: run it again
+                raise
+            finally:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.task.done():
+                    flight.task.cancel()
+
+    def _start(self, key: str, call) -> "_Flight":
+        async def run():
+            value = await call()
+            await self.store(key, value)
+            return value
+
+        flight = _Flight(asyncio.create_task(run()))
+        self._inflight[key] = flight
+
+        def done(task):
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+            if not task.cancelled():
+                task.exception()  # mark retrieved when every waiter has left
+
+        flight.task.add_done_callback(done)
+        return flight
+
+    def stats(self) -> dict:
+        sites = {}
+        for site, counts in self._stats.items():
+            lookups = sum(counts.values())
+            hits = counts["memory_hits"] + counts["disk_hits"] + counts["coalesced"]
+            sites[site] = {**counts, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
+        return {"memory_entries": len(self.memory), "disk": self.disk is not None, "sites": sites}
+
+
+def build_cache():
+    """Creates the cache from LLM_CACHE_* settings, or None when disabled."""
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    disk = DiskTier(config.LLM_CACHE_DISK_PATH, config.LLM_CACHE_TTL_SECONDS) if config.LLM_CACHE_DISK_PATH else None
+    return LLMCache(MemoryTier(config.LLM_CACHE_MAX_ENTRIES), disk)
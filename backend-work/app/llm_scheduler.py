@@ -0,0 +1,405 @@
+# llm_scheduler.py (admission control and priority scheduling in front of every model call)
+"""
+Every gateway call takes a slot from LLMScheduler before it reaches the
+model. A slot needs:
+
+- a free concurrency slot (LLM_MAX_CONCURRENCY),
+- one request from the requests-per-minute token bucket,
+- the call's estimated tokens from the tokens-per-minute bucket (settled
+  against the real usage once the reply arrives).
+
+Waiting calls are served strictly by priority class (emergency > chat >
+image > translation), FIFO within a class. Calls are shed at admission
+instead of timing out late. A full class queue gives a 503. The wait is
+projected from the calls already queued ahead and stretched by the share of
+capacity the higher classes are currently taking, since their new arrivals
+will overtake this call: a call whose projected wait the quota cannot meet
+gives a 429, one the free slots cannot meet a 503. Queued calls are
+re-checked whenever the queue moves, as the projection can change.
+A 429 from the model pauses dispatching. ModelOverloaded carries the status
+and Retry-After, and main.py turns it into the HTTP response.
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from app import config, metrics
+
+# name -> (rank, longest wait in seconds before the call is shed)
+PRIORITIES = {
+    "emergency": (0, 15.0),
+    "chat": (1, 5.0),
+    "image": (2, 8.0),
+    "translation": (3, 30.0),
+}
+DEFAULT_PRIORITY = "chat"
+
+# Call-site prefix -> priority class; anything else is a chat turn
+SITE_PRIORITIES = {
+    "chatbot1.translate": "translation",
+    "catalog": "translation",
+    "ai_integration.image": "image",
+}
+
+# Overrides the site's class for calls made in this context (e.g. emergency enrichment)
+priority = ContextVar("llm_priority", default=None)
+
+queue_depth = metrics.register(metrics.Gauge(
+    "llm_queue_depth", "Model calls waiting for a scheduler slot, by priority class.", ("priority",)
+))
+queue_wait = metrics.register(metrics.Histogram(
+    "llm_queue_wait_seconds", "Time model calls waited for a scheduler slot, by priority class.", ("priority",)
+))
+shed = metrics.register(metrics.Counter(
+    "llm_shed_total", "Model calls rejected by the scheduler, by priority class and reason.", ("priority", "reason")
+))
+
+
+class ModelOverloaded(Exception):
+    """The call was shed; answer `status_code` with a Retry-After header."""
+
+    def __init__(self, reason: str, retry_after: float, status_code: int = 503):
+        super().__init__(f"Model calls overloaded ({reason}), retry after {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.status_code = status_code
+
+
+def priority_for(site: str) -> str:
+    override = priority.get()
+    if override is not None:
+        return override
+    for prefix, name in SITE_PRIORITIES.items():
+        if site.startswith(prefix):
+            return name
+    return DEFAULT_PRIORITY
+
+
+def estimate_tokens(contents) -> int:
+    """Prompt tokens (about 4 characters each, 258 per image) plus the expected completion."""
+    parts = contents if isinstance(contents, list) else [contents]
+    prompt = sum(len(part) // 4 if isinstance(part, str) else 258 for part in parts)
+    return prompt + config.LLM_EXPECTED_OUTPUT_TOKENS
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429
+
+
+def retry_delay(error: Exception):
+    """Seconds the model asked us to wait, if the error says."""
+    delay = getattr(error, "retry_after", None)
+    if delay is None:
+        match = re.search(r"retry(?:Delay| in| after)[\"':\s]*([\d.]+)\s*s", str(error), re.IGNORECASE)
+        delay = float(match.group(1)) if match else None
+    return delay
+
+
+# ----------------------------
+# Token bucket
+# ----------------------------
+class TokenBucket:
+    """
+    `rate_per_minute` tokens per minute, bursting up to BURST_SECONDS worth.
+    A small burst keeps any 60 s window within about 110% of the rate, so the
+    configured quota should sit a little under the model's own limit.
+    """
+
+    BURST_SECONDS = 6
+
+    def __init__(self, rate_per_minute: float, clock=time.monotonic):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1.0, self.rate * self.BURST_SECONDS)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        """Spends tokens; may go below zero when a call used more than estimated."""
+        if self.rate > 0:
+            self._refill()
+            self.tokens -= amount
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class EventRate:
+    """Events per second, an exponentially decaying average over `window` seconds."""
+
+    def __init__(self, window: float = 10.0, clock=time.monotonic):
+        self.window = window
+        self.value = 0.0
+        self._clock = clock
+        self._updated = clock()
+
+    def _decay(self):
+        now = self._clock()
+        self.value *= math.exp(-(now - self._updated) / self.window)
+        self._updated = now
+
+    def add(self, count: int = 1):
+        self._decay()
+        self.value += count / self.window
+
+    def get(self) -> float:
+        self._decay()
+        return self.value
+
+
+# ----------------------------
+# Scheduler
+# ----------------------------
+class _Waiter:
+    __slots__ = ("priority", "cost", "future", "enqueued", "deadline", "queued")
+
+    def __init__(self, priority: str, cost: int, future, max_wait: float):
+        self.priority = priority
+        self.cost = cost
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + max_wait
+        self.queued = True
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = None, requests_per_minute: float = None,
+                 tokens_per_minute: float = None, queue_max: int = None, clock=time.monotonic):
+        self.max_concurrency = max_concurrency or config.LLM_MAX_CONCURRENCY
+        self.requests = TokenBucket(requests_per_minute if requests_per_minute is not None else config.LLM_REQUESTS_PER_MINUTE, clock)
+        self.tokens = TokenBucket(tokens_per_minute if tokens_per_minute is not None else config.LLM_TOKENS_PER_MINUTE, clock)
+        self.queue_max = queue_max or config.LLM_QUEUE_MAX
+        self.in_flight = 0
+        self.paused_until = 0.0
+        # One FIFO per class, in rank order: walking them in turn is dispatch order
+        self._queues = {name: deque() for name in sorted(PRIORITIES, key=lambda name: PRIORITIES[name][0])}
+        self._depth = {name: 0 for name in PRIORITIES}  # live waiters per class
+        self._queued_tokens = {name: 0 for name in PRIORITIES}
+        self._dispatched = {name: EventRate(clock=clock) for name in PRIORITIES}
+        self._timer = None
+        self._mean_service = None  # seconds, EWMA of call duration once a call has finished
+        self._mean_cost = None  # tokens, EWMA of the estimate per dispatched call
+        self.admitted = self.upstream_rate_limited = 0
+        self.shed = {}
+
+    # ----------------------------
+    # Admission
+    # ----------------------------
+    def _overloaded(self, name: str, reason: str, retry_after: float, status_code: int) -> ModelOverloaded:
+        shed.inc(priority=name, reason=reason)
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        return ModelOverloaded(reason, retry_after, status_code)
+
+    def _shed(self, name: str, reason: str, retry_after: float, status_code: int):
+        raise self._overloaded(name, reason, retry_after, status_code)
+
+    def _slot_wait(self, ahead_requests: int) -> float:
+        if self._mean_service is None:
+            return 0.0  # nothing to estimate from yet; only the deadline applies
+        free = self.max_concurrency - self.in_flight
+        return max(0, ahead_requests + 1 - free) / self.max_concurrency * self._mean_service
+
+    def _quota_wait(self, cost: int, ahead_requests: int = 0, ahead_tokens: int = 0) -> float:
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.wait_time(ahead_requests + 1),
+            self.tokens.wait_time(ahead_tokens + cost),
+        )
+
+    def _ahead(self, rank: int):
+        """Live calls (and their tokens) queued in classes served before or with `rank`."""
+        names = [name for name in self._queues if PRIORITIES[name][0] <= rank]
+        return sum(self._depth[name] for name in names), sum(self._queued_tokens[name] for name in names)
+
+    def _capacity(self) -> float:
+        """Calls per second the model can take: the tightest of the quotas and the slots."""
+        limits = []
+        if self.requests.rate > 0:
+            limits.append(self.requests.rate)
+        if self.tokens.rate > 0 and self._mean_cost:
+            limits.append(self.tokens.rate / self._mean_cost)
+        if self._mean_service:
+            limits.append(self.max_concurrency / self._mean_service)
+        return min(limits, default=math.inf)
+
+    def _stretch(self, rank: int) -> float:
+        """
+        How much longer than its place in the queue a call of `rank` waits:
+        higher classes keep arriving and overtake it, so only the capacity
+        they leave serves it. Infinite once they take all of it.
+        """
+        capacity = self._capacity()
+        if math.isinf(capacity):
+            return 1.0
+        taken = sum(self._dispatched[name].get() for name in self._queues if PRIORITIES[name][0] < rank) / capacity
+        return 1 / (1 - taken) if taken < 1 else math.inf
+
+    def _refusal(self, name: str, cost: int, ahead_requests: int, ahead_tokens: int, stretch: float, left: float):
+        """The exception for a call whose projected wait exceeds `left` seconds, or None."""
+        project = lambda wait: wait * stretch if wait > 0 else 0.0
+        quota_wait = project(self._quota_wait(min(cost, self.tokens.capacity), ahead_requests, ahead_tokens))
+        if quota_wait > left:
+            return self._overloaded(name, "quota", min(quota_wait, PRIORITIES[name][1]), 429)
+        slot_wait = project(self._slot_wait(ahead_requests))
+        if slot_wait > left:
+            return self._overloaded(name, "overloaded", min(slot_wait, PRIORITIES[name][1]), 503)
+        return None
+
+    async def acquire(self, name: str, cost: int):
+        if name not in PRIORITIES:
+            name = DEFAULT_PRIORITY
+        rank, max_wait = PRIORITIES[name]
+        if self._depth[name] >= self.queue_max:
+            self._shed(name, "queue_full", self._mean_service or 1.0, 503)
+
+        ahead_requests, ahead_tokens = self._ahead(rank)
+        refusal = self._refusal(name, cost, ahead_requests, ahead_tokens, self._stretch(rank), max_wait)
+        if refusal is not None:
+            raise refusal
+
+        waiter = _Waiter(name, cost, asyncio.get_running_loop().create_future(), max_wait)
+        self._queues[name].append(waiter)
+        self._depth[name] += 1
+        self._queued_tokens[name] += cost
+        queue_depth.inc(priority=name)
+        self._dispatch()
+        try:
+            # _expire() normally sheds first; the timeout is the backstop
+            await asyncio.wait_for(waiter.future, timeout=max_wait)
+        except asyncio.TimeoutError:
+            self._shed(name, "deadline", self._mean_service or 1.0, 503)
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()  # granted just as the caller went away
+            raise
+        finally:
+            self._leave(waiter)
+        queue_wait.observe(time.monotonic() - waiter.enqueued, priority=name)
+
+    def _leave(self, waiter: _Waiter):
+        """Takes a waiter out of the live counts once (granted, shed, timed out or cancelled)."""
+        if waiter.queued:
+            waiter.queued = False
+            self._depth[waiter.priority] -= 1
+            self._queued_tokens[waiter.priority] -= waiter.cost
+            queue_depth.dec(priority=waiter.priority)
+
+    def _head(self):
+        for queue in self._queues.values():
+            while queue and queue[0].future.done():  # timed out, cancelled or shed
+                queue.popleft()
+            if queue:
+                return queue[0]
+        return None
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.in_flight < self.max_concurrency:
+            waiter = self._head()
+            if waiter is None:
+                break
+            wait = self._quota_wait(min(waiter.cost, self.tokens.capacity))  # a huge prompt still runs once the bucket is full
+            if wait > 0:
+                # Strict priority: lower classes do not overtake a waiting head
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                break
+            self._queues[waiter.priority].popleft()
+            self._leave(waiter)
+            self.requests.take(1)
+            self.tokens.take(waiter.cost)
+            self.in_flight += 1
+            self.admitted += 1
+            self._dispatched[waiter.priority].add()
+            self._mean_cost = waiter.cost if self._mean_cost is None else 0.9 * self._mean_cost + 0.1 * waiter.cost
+            waiter.future.set_result(None)
+        self._expire()
+
+    def _expire(self):
+        """Sheds queued calls whose projected wait no longer fits before their deadline."""
+        now = time.monotonic()
+        ahead_requests = ahead_tokens = 0
+        for name, queue in self._queues.items():
+            if not self._depth[name]:
+                continue
+            stretch = self._stretch(PRIORITIES[name][0])
+            for waiter in queue:
+                if waiter.future.done():
+                    continue
+                refusal = self._refusal(name, waiter.cost, ahead_requests, ahead_tokens, stretch, waiter.deadline - now)
+                if refusal is not None:
+                    self._leave(waiter)
+                    waiter.future.set_exception(refusal)
+                else:
+                    ahead_requests += 1
+                    ahead_tokens += waiter.cost
+
+    def release(self, duration: float = None):
+        self.in_flight -= 1
+        if duration is not None:
+            self._mean_service = duration if self._mean_service is None else 0.9 * self._mean_service + 0.1 * duration
+        self._dispatch()
+
+    def rate_limited(self, error: Exception):
+        """The model answered 429: stop dispatching for its retry delay."""
+        delay = retry_delay(error) or config.LLM_RATE_LIMIT_BACKOFF_SECONDS
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        self.requests.drain()
+        self.upstream_rate_limited += 1
+        logging.warning(f"Model rate limit hit; pausing model calls for {delay:.1f}s")
+        return delay
+
+    @asynccontextmanager
+    async def slot(self, site: str, contents):
+        """Holds a scheduler slot around one model call."""
+        name = priority_for(site)
+        cost = estimate_tokens(contents)
+        await self.acquire(name, cost)
+        usage = []
+        token = metrics.call_usage.set(usage)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limit(e):
+                delay = self.rate_limited(e)
+                shed.inc(priority=name, reason="upstream_429")
+                raise ModelOverloaded("upstream_429", delay, 429) from e
+            raise
+        finally:
+            metrics.call_usage.reset(token)
+            if usage:
+                self.tokens.take(sum(usage) - cost)
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": dict(self._depth),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "upstream_rate_limited": self.upstream_rate_limited,
+            "paused_for_seconds": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            "requests_available": round(self.requests.tokens, 1),
+            "tokens_available": round(self.tokens.tokens),
+            "mean_call_seconds": round(self._mean_service, 3) if self._mean_service is not None else None,
+        }
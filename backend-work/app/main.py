@@ -1,13 +1,46 @@
 # main.py (FastAPI Entry Point)
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from app.router import chatbot
 from app.router import ai_integration
 from fastapi import FastAPI
 from pydantic import BaseModel
 from app.router import disease_prediction
+from app.router import prediction
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app import config, image_intake, knowledge_base, metrics
+from app.warmup import Warmup
+from app.llm import gateway
+from app.llm_scheduler import ModelOverloaded
+from app.model_bundle import ModelNotReady
+from app.http_client import predict_client
+from app.event_log import event_log
+from app.streaming import sse, sse_response, stream_stats
+
+warmup = Warmup()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models, SDKs and the PREDICT_API_URL pool load per STARTUP_MODE, see /ready
+    task = None
+    if config.STARTUP_MODE == "eager":
+        await warmup.run()
+        task = asyncio.create_task(warmup.retry())
+    elif config.STARTUP_MODE == "background":
+        task = asyncio.create_task(warmup.run(retry=True))
+    else:
+        warmup.skip()
+    event_log.start()
+    yield
+    if task is not None:
+        task.cancel()
+    await event_log.stop()
+    await predict_client.aclose()
 
-app = FastAPI(title="AI Health Chatbot", version="1.0")
+app = FastAPI(title="AI Health Chatbot", version="1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,19 +50,98 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 413 for oversized images before the multipart body is parsed and spooled
+app.add_middleware(image_intake.UploadLimitMiddleware, paths=["/predict/image"])
+
+# Request count / latency per route template, served on /metrics (outermost, so it sees those 413s)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routers from other files
 app.include_router(chatbot.router)
 app.include_router(ai_integration.router)
 app.include_router(disease_prediction.router)
+app.include_router(prediction.router)
+
+@app.exception_handler(ModelOverloaded)
+async def model_overloaded(request, e: ModelOverloaded):
+    # Shed model calls fail fast with a hint of when to come back
+    return JSONResponse(status_code=e.status_code, content={"detail": str(e)}, headers={"Retry-After": str(e.retry_after)})
+
+@app.exception_handler(ModelNotReady)
+async def model_not_ready(request, e: ModelNotReady):
+    # The disease model loads (or retrains) in a worker thread, never on the event loop
+    return JSONResponse(status_code=503, content={"detail": str(e)}, headers={"Retry-After": str(e.retry_after)})
 
 class ChatRequest(BaseModel):
     user_input: str  # Must match the frontend key
 
+async def chat_events(response_text: str, chunk_size: int = 16):
+    for start in range(0, len(response_text), chunk_size):
+        yield sse("delta", {"text": response_text[start:start + chunk_size]})
+    yield sse("done", {"response": response_text})
+
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, stream: bool = False):
     response_text = f"Bot Response: {request.user_input}"  # Replace with your logic
+    if stream:
+        return sse_response(chat_events(response_text), "/chat")
     return {"response": response_text}
 
+@app.get("/stream/stats")
+async def streaming_stats():
+    """Time to first byte vs. total latency of the streaming endpoints."""
+    return stream_stats.snapshot()
+
+@app.get("/llm/cache/stats")
+async def llm_cache_stats():
+    """Per call-site hit rates of the LLM response cache."""
+    return gateway.cache.stats() if gateway.cache else {"enabled": False}
+
+@app.get("/llm/scheduler/stats")
+async def llm_scheduler_stats():
+    """Queue depth per priority class, shed calls by reason and remaining quota."""
+    return gateway.scheduler.stats()
+
+@app.get("/llm/tiers/stats")
+async def llm_tier_stats():
+    """Model tier per call site, hedges sent / won and per-model latency and win rate."""
+    return gateway.tiers.stats()
+
+@app.get("/event-log/stats")
+async def event_log_stats():
+    """Consultation events recorded, dropped, written and still buffered."""
+    return event_log.stats()
+
+@app.get("/knowledge-base/stats")
+async def knowledge_base_stats():
+    """Sizes of the shared symptom / disease knowledge base and its reload count."""
+    return knowledge_base.stats()
+
+@app.post("/knowledge-base/reload")
+async def reload_knowledge_base():
+    """Re-reads dataset.csv, Training.csv and MasterData without a restart."""
+    try:
+        kb = await asyncio.to_thread(knowledge_base.reload_knowledge_base)
+    except (OSError, ValueError) as e:
+        logging.error(f"Knowledge base reload failed: {e}")
+        raise HTTPException(status_code=500, detail="Knowledge base reload failed")
+    return kb.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition: HTTP, stage latency histograms, tokens, caches."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    """
+    200 once the required warm-up steps are done, 503 (with progress) before
+    that or while one is failing. Each step's state is in `steps`; failed
+    optional steps are listed in `degraded` and retried in the background.
+    """
+    status = warmup.snapshot()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @app.get("/")
 def home():
     return {"message": "Welcome to AI Health Chatbot"}
@@ -0,0 +1,223 @@
+# metrics.py (Prometheus-style counters, histograms and spans served on /metrics)
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; covers local lookups (sub-ms) up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Call site of the model call in progress, so backends can label token counts
+current_site = ContextVar("llm_site", default="default")
+# Token usage of the model call in progress, reconciled by the scheduler
+call_usage = ContextVar("llm_call_usage", default=None)
+
+
+def _escape(value) -> str:
+    """Label value escaped per the exposition format: backslash, double quote and newline."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, value in list(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for key, entry in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + ('+Inf',))} {entry[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {round(entry[-2], 6)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {entry[-1]}"
+
+
+# ----------------------------
+# Registry
+# ----------------------------
+_metrics = []
+_collectors = []
+
+
+def register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(collect):
+    """`collect()` returns exposition lines, built at scrape time (no hot-path cost)."""
+    _collectors.append(collect)
+    return collect
+
+
+def stats_collector(name: str, documentation: str, stats, dimensions=None):
+    """
+    Exposes every numeric leaf of a component's stats() dict as a gauge, keyed
+    by its dotted path. `dimensions` maps a stats key whose children are named
+    things (call sites, models) to a label, so names containing dots stay
+    unambiguous: with {"sites": "site"},
+    llm_cache{key="sites.misses",site="chatbot.fused"} 3.
+    """
+    dimensions = dimensions or {}
+
+    def flatten(prefix, value, labels):
+        if isinstance(value, bool):
+            yield prefix, labels, int(value)
+        elif isinstance(value, (int, float)):
+            yield prefix, labels, value
+        elif isinstance(value, dict):
+            for key, child in value.items():
+                path = f"{prefix}.{key}" if prefix else str(key)
+                label = dimensions.get(key)
+                if label is not None and isinstance(child, dict):
+                    for item, grandchild in child.items():
+                        yield from flatten(path, grandchild, labels + ((label, item),))
+                else:
+                    yield from flatten(path, child, labels)
+
+    def collect():
+        yield f"# HELP {name} {documentation}"
+        yield f"# TYPE {name} gauge"
+        for key, labels, value in flatten("", stats(), ()):
+            names, values = zip(("key", key), *labels)
+            yield f"{name}{_labels(names, values)} {value}"
+
+    return register_collector(collect)
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+http_requests = register(Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+http_latency = register(Histogram("http_request_duration_seconds", "HTTP request latency, including streamed bodies.", ("method", "route")))
+http_in_flight = register(Gauge("http_requests_in_flight", "HTTP requests being served."))
+stage_latency = register(Histogram("stage_duration_seconds", "Latency of instrumented stages (model calls, prediction, parsing, lookups).", ("stage",)))
+stage_errors = register(Counter("stage_errors_total", "Exceptions raised inside instrumented stages, by class.", ("stage", "error")))
+llm_tokens = register(Counter("llm_tokens_total", "Model tokens by model, call site and kind (prompt / completion).", ("model", "site", "kind")))
+
+
+@contextmanager
+def span(stage: str):
+    """Times a block into stage_duration_seconds and counts its exceptions by class."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        stage_errors.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        stage_latency.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_tokens(model: str, prompt_tokens, completion_tokens):
+    usage = call_usage.get()
+    if usage is not None:
+        usage.append((prompt_tokens or 0) + (completion_tokens or 0))
+    site = current_site.get()
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, model=model, site=site, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, model=model, site=site, kind="completion")
+
+
+# ----------------------------
+# Middleware
+# ----------------------------
+class MetricsMiddleware:
+    """Pure ASGI middleware (no per-request task or body buffering)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            route = scope.get("route")
+            # Route template keeps label cardinality bounded
+            path = getattr(route, "path", None) or "unmatched"
+            http_latency.observe(time.perf_counter() - start, method=scope["method"], route=path)
+            http_requests.inc(method=scope["method"], route=path, status=status)
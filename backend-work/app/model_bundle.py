@@ -0,0 +1,413 @@
+"""
+Precomputed disease-model bundle.
+
+Diagnoses come from a naive-Bayes engine over the binary symptom matrix:
+one (diseases x symptoms) weight matrix and a bias vector, so a prediction
+is a single mat-vec plus a temperature-calibrated softmax. The original
+decision tree is kept in the bundle for comparison (tree_proba). Both, the
+label classes and the symptom column index are written once by an offline
+build step (descriptions, precautions and severities live in
+app.knowledge_base):
+
+    python -m app.model_bundle build
+    python -m app.model_bundle verify
+
+Each array is stored as an uncompressed .npy file so workers can open it with
+mmap_mode="r": loading takes milliseconds and forked uvicorn workers share
+the same read-only pages. A manifest records the bundle version, a SHA-256
+per file and the checksum of Training.csv; when the bundle is missing,
+corrupt or built from a different Training.csv, load_model() retrains in
+process and rewrites it. The bundle directory is a symlink to the latest
+build, so concurrent writers (one per worker) each swap in a complete build.
+
+Loading runs in warm-up's worker thread. Request handlers call get_model(),
+which never blocks: until the model is ready it starts a background load
+and raises ModelNotReady (503).
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app import config, metrics
+from app.symptom_matcher import compact
+
+BUNDLE_VERSION = 4
+TRAINING_CSV_PATH = os.path.join(config.DATA_DIR, "Training.csv")
+
+ARRAYS = (
+    "children_left", "children_right", "feature", "threshold", "value",
+    "nb_weights", "nb_bias", "nb_temperature", "classes", "columns",
+)
+# Replaced builds older than this are deleted by the next write_bundle()
+STALE_BUILD_SECONDS = 600
+
+# Searched at build time on partial symptom sets sampled from Training.csv.
+# A small weight on absent symptoms copes with patients naming only a few.
+NB_ABSENCE_WEIGHTS = (0.03, 0.05, 0.1, 0.2, 0.3)
+NB_TEMPERATURES = np.round(np.linspace(0.2, 5.0, 49), 2)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ----------------------------
+# Runtime model
+# ----------------------------
+class DiseaseModel:
+    """Naive-Bayes engine (and the legacy tree) on (memory-mapped) numpy arrays."""
+
+    def __init__(self, arrays: dict):
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.nb_weights = arrays["nb_weights"]
+        self.nb_bias = arrays["nb_bias"]
+        self.nb_temperature = float(arrays["nb_temperature"][0])
+        self.classes = arrays["classes"]
+        self.columns = [str(column) for column in arrays["columns"]]
+        self.column_index = {}
+        for index, column in enumerate(self.columns):
+            self.column_index.setdefault(column, index)
+        # Also accept display names such as "skin rash" or "spotting urination"
+        self._lookup = {}
+        for column, index in self.column_index.items():
+            self._lookup.setdefault(compact(column), index)
+
+    def index_of(self, symptom: str):
+        """Column index for a column or display name, or None."""
+        index = self.column_index.get(symptom)
+        return index if index is not None else self._lookup.get(compact(symptom))
+
+    def encode(self, symptoms) -> np.ndarray:
+        """One 0/1 row over the symptom columns."""
+        return self.encode_batch([symptoms])[0]
+
+    def encode_batch(self, symptom_sets) -> np.ndarray:
+        """0/1 matrix with one row per symptom set; unknown names are ignored."""
+        rows, columns = [], []
+        for row, symptoms in enumerate(symptom_sets):
+            for symptom in symptoms:
+                index = self.index_of(symptom)
+                if index is not None:
+                    rows.append(row)
+                    columns.append(index)
+        X = np.zeros((len(symptom_sets), len(self.columns)), dtype=np.float32)
+        X[rows, columns] = 1
+        return X
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Calibrated class probabilities for each row of X."""
+        return _softmax((np.atleast_2d(X) @ self.nb_weights.T + self.nb_bias) / self.nb_temperature)
+
+    def tree_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class distribution of the decision-tree leaf reached by each row of X."""
+        X = np.atleast_2d(X)
+        rows = np.arange(len(X))
+        node = np.zeros(len(X), dtype=np.int64)
+        active = self.children_left[node] != -1
+        while active.any():
+            current = node[active]
+            go_left = X[rows[active], self.feature[current]] <= self.threshold[current]
+            node[active] = np.where(go_left, self.children_left[current], self.children_right[current])
+            active = self.children_left[node] != -1
+        return self.value[node]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes[self.predict_proba(X).argmax(axis=1)]
+
+    def top_k(self, X: np.ndarray, k: int = 3):
+        """[(disease, probability), ...] per row, most likely first."""
+        proba = self.predict_proba(X)
+        k = max(1, min(k, proba.shape[1]))
+        best = np.argsort(-proba, axis=1, kind="stable")[:, :k]
+        return [
+            [(str(self.classes[c]), float(proba[r, c])) for c in best[r] if proba[r, c] > 0]
+            for r in range(len(proba))
+        ]
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=1, keepdims=True)
+    np.exp(scores, out=scores)
+    return scores / scores.sum(axis=1, keepdims=True)
+
+
+# ----------------------------
+# Build
+# ----------------------------
+def read_symptom_matrix(path: str = TRAINING_CSV_PATH):
+    """
+    (columns, X, prognosis) from a CSV in the Training.csv layout. A column
+    repeated in the header (Training.csv has fluid_overload twice, with the
+    data in the second) is merged into one.
+    """
+    import pandas as pd
+
+    with open(path, newline="") as file:
+        header = next(csv.reader(file))
+    frame = pd.read_csv(path, header=None, skiprows=1)
+    columns = list(dict.fromkeys(column for column in header if column != "prognosis"))
+    index = {column: i for i, column in enumerate(columns)}
+    X = np.zeros((len(frame), len(columns)), dtype=np.float32)
+    for position, column in enumerate(header):
+        if column != "prognosis":
+            np.maximum(X[:, index[column]], frame[position].to_numpy(dtype=np.float32), out=X[:, index[column]])
+    return columns, X, frame[header.index("prognosis")].astype(str).to_numpy()
+
+
+def train_arrays() -> dict:
+    """Fits the naive-Bayes engine and the DecisionTreeClassifier on Training.csv, as arrays."""
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.tree import DecisionTreeClassifier
+
+    cols, X, prognosis = read_symptom_matrix(TRAINING_CSV_PATH)
+    le = LabelEncoder()
+    y = le.fit_transform(prognosis)
+    x_train, _, y_train, _ = train_test_split(X, y, test_size=0.3, random_state=42)
+    clf = DecisionTreeClassifier(random_state=42)
+    clf.fit(x_train, y_train)
+
+    tree = clf.tree_
+    value = tree.value[:, 0, :].astype(np.float32)
+    value /= value.sum(axis=1, keepdims=True)
+    return {
+        **fit_naive_bayes(X, y, len(le.classes_)),
+        "children_left": tree.children_left.astype(np.int32),
+        "children_right": tree.children_right.astype(np.int32),
+        "feature": np.maximum(tree.feature, 0).astype(np.int32),
+        "threshold": tree.threshold.astype(np.float32),
+        "value": value,
+        "classes": np.asarray(le.classes_, dtype=str),
+        "columns": np.asarray(cols, dtype=str),
+    }
+
+
+def partial_rows(X: np.ndarray, y: np.ndarray, size: int, repeats: int = 1, seed: int = 42):
+    """Rows reduced to `size` random present symptoms: what patients usually report."""
+    rng = np.random.default_rng(seed)
+    rows, labels = [], []
+    for x, label in zip(X, y):
+        present = np.flatnonzero(x)
+        for _ in range(repeats):
+            row = np.zeros_like(x)
+            row[rng.choice(present, size=min(size, len(present)), replace=False)] = 1
+            rows.append(row)
+            labels.append(label)
+    return np.asarray(rows), np.asarray(labels)
+
+
+def fit_naive_bayes(X: np.ndarray, y: np.ndarray, n_classes: int) -> dict:
+    """
+    Bernoulli naive Bayes (Laplace smoothed) folded into one weight matrix:
+    score = X @ W.T + b, with absent symptoms down-weighted. The absence
+    weight and softmax temperature minimise log loss on partial symptom sets.
+    """
+    counts = np.stack([X[y == c].sum(axis=0) for c in range(n_classes)])
+    totals = np.bincount(y, minlength=n_classes)
+    p = (counts + 1) / (totals[:, None] + 2)
+    log_present, log_absent = np.log(p), np.log1p(-p)
+    log_prior = np.log(totals / totals.sum())
+
+    X_tune, y_tune = partial_rows(X[::5], y[::5], size=3, repeats=2)
+    best = None
+    for alpha in NB_ABSENCE_WEIGHTS:
+        weights = log_present - alpha * log_absent
+        scores = X_tune @ weights.T + log_prior + alpha * log_absent.sum(axis=1)
+        for temperature in NB_TEMPERATURES:
+            proba = _softmax(scores / temperature)
+            loss = -np.log(proba[np.arange(len(y_tune)), y_tune] + 1e-12).mean()
+            if best is None or loss < best[0]:
+                best = (loss, alpha, temperature)
+
+    _, alpha, temperature = best
+    return {
+        "nb_weights": (log_present - alpha * log_absent).astype(np.float32),
+        "nb_bias": (log_prior + alpha * log_absent.sum(axis=1)).astype(np.float32),
+        "nb_temperature": np.asarray([temperature], dtype=np.float32),
+    }
+
+
+def write_bundle(arrays: dict, bundle_dir: str = config.MODEL_BUNDLE_DIR):
+    """
+    Writes the bundle to a fresh directory and points the `bundle_dir`
+    symlink at it with one atomic rename; readers see the old build or the
+    new one, never a mix. The build it replaced is kept for readers that
+    resolved it just before the swap; builds older than STALE_BUILD_SECONDS
+    are removed.
+    """
+    bundle_dir = os.path.abspath(bundle_dir)
+    parent = os.path.dirname(bundle_dir)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(bundle_dir)}-")
+
+    files = {}
+    for name in ARRAYS:
+        path = os.path.join(staging, f"{name}.npy")
+        np.save(path, arrays[name], allow_pickle=False)
+        files[f"{name}.npy"] = _sha256(path)
+
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "built_at": int(time.time()),
+        "training_csv_sha256": _sha256(TRAINING_CSV_PATH),
+        "files": files,
+    }
+    with open(os.path.join(staging, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    previous = os.path.realpath(bundle_dir) if os.path.islink(bundle_dir) else None
+    if os.path.isdir(bundle_dir) and previous is None:
+        # A bundle written before the symlink layout: moved aside once
+        previous = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(bundle_dir)}-")
+        os.replace(bundle_dir, previous)
+    link = f"{staging}.link"
+    os.symlink(os.path.basename(staging), link)
+    os.replace(link, bundle_dir)
+
+    # Builds still being written by other workers are recent, so only old ones go
+    keep = {staging, previous}
+    cutoff = time.time() - STALE_BUILD_SECONDS
+    for old in glob.glob(os.path.join(parent, f".{os.path.basename(bundle_dir)}-*")):
+        if old not in keep and os.path.isdir(old) and not os.path.islink(old) and os.path.getmtime(old) < cutoff:
+            shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def build(bundle_dir: str = config.MODEL_BUNDLE_DIR):
+    return write_bundle(train_arrays(), bundle_dir)
+
+
+# ----------------------------
+# Load
+# ----------------------------
+class StaleBundle(Exception):
+    pass
+
+
+def load_bundle(bundle_dir: str = config.MODEL_BUNDLE_DIR, verify: bool = True) -> DiseaseModel:
+    """Opens a built bundle, raising StaleBundle when it can't be trusted."""
+    # Resolved once, so a concurrent rebuild can't mix two builds' files
+    bundle_dir = os.path.realpath(bundle_dir)
+    manifest_path = os.path.join(bundle_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise StaleBundle(f"No bundle at {bundle_dir}")
+
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+
+    if manifest.get("version") != BUNDLE_VERSION:
+        raise StaleBundle(f"Bundle version {manifest.get('version')} != {BUNDLE_VERSION}")
+    if verify:
+        if manifest.get("training_csv_sha256") != _sha256(TRAINING_CSV_PATH):
+            raise StaleBundle("Training.csv changed since the bundle was built")
+        for name, checksum in manifest["files"].items():
+            path = os.path.join(bundle_dir, name)
+            if not os.path.exists(path) or _sha256(path) != checksum:
+                raise StaleBundle(f"Checksum mismatch for {name}")
+
+    arrays = {name: np.load(os.path.join(bundle_dir, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+    return DiseaseModel(arrays)
+
+
+class ModelNotReady(Exception):
+    """The model is still loading or training; handlers answer 503."""
+
+    retry_after = 5
+
+
+_model = None
+_model_lock = threading.Lock()
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def load_model() -> DiseaseModel:
+    """
+    Loads the bundle, retraining (and rewriting it) when missing or stale.
+    Blocks for the whole training run: call it from a worker thread
+    (warm-up, the background loader) or offline tools, never the event loop.
+    """
+    global _model
+    if _model is not None:
+        return _model
+
+    with _model_lock:
+        if _model is None:
+            with metrics.span("model.load"):
+                _model = _load_or_train()
+    return _model
+
+
+def get_model() -> DiseaseModel:
+    """The loaded model; until it is ready, starts loading it in the background and raises ModelNotReady."""
+    if _model is not None:
+        return _model
+    _start_loader()
+    raise ModelNotReady("Disease model is loading, try again shortly")
+
+
+def _start_loader():
+    global _loader
+    with _loader_lock:
+        if _loader is None or not _loader.is_alive():
+            _loader = threading.Thread(target=_load_in_background, name="model-loader", daemon=True)
+            _loader.start()
+
+
+def _load_in_background():
+    try:
+        load_model()
+    except Exception as e:
+        # The next get_model() starts another attempt
+        logging.error(f"Loading the disease model failed: {e}")
+
+
+def _load_or_train() -> DiseaseModel:
+    try:
+        return load_bundle()
+    except (StaleBundle, OSError, ValueError, KeyError) as e:
+        logging.warning(f"Model bundle unusable ({e}); retraining")
+    arrays = train_arrays()
+    try:
+        write_bundle(arrays)
+    except OSError as write_error:
+        logging.warning(f"Could not write model bundle: {write_error}")
+    return DiseaseModel(arrays)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or verify the disease-model bundle.")
+    parser.add_argument("command", choices=["build", "verify"])
+    parser.add_argument("--dir", default=config.MODEL_BUNDLE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        manifest = build(args.dir)
+        print(f"Built bundle v{manifest['version']} at {args.dir}")
+    else:
+        start = time.perf_counter()
+        model = load_bundle(args.dir)
+        print(f"OK: {len(model.columns)} symptoms, {len(model.classes)} diseases, "
+              f"loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# model_tiers.py (per call-site model tiers and hedged model calls)
+"""
+Each call site has a primary model and, optionally, a fallback tier
+(LLM_MODEL_TIERS, matched on the longest site prefix). Without a fallback
+the primary is called as is. When the primary has not answered by its
+observed p95, a hedged duplicate goes to the fallback and whichever answers
+first wins; the other call is cancelled. A primary that fails with a
+retryable error (5xx, connection failure) is retried on the fallback.
+
+Hedges and failovers share one budget: every call earns LLM_HEDGE_BUDGET of
+an extra call, banked up to HEDGE_BURST, so a primary that slows down or
+fails for everyone can't double the load on the models.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from app import config, metrics
+from app.llm_scheduler import ModelOverloaded
+
+# Site prefix -> (primary, fallback). An empty primary keeps the model the
+# caller asked for; an empty fallback turns hedging off for the site. No site
+# hedges until LLM_MODEL_TIERS gives it a fallback (ai_integration.image
+# needs a vision model there).
+DEFAULT_TIERS = {
+    "": ("", ""),
+    "catalog": ("", ""),  # offline builds, latency doesn't matter
+}
+
+LATENCY_WINDOW = 256  # recent successful calls per model behind the p95
+MIN_SAMPLES = 20  # no hedging until the primary's p95 is known
+HEDGE_BURST = 10
+
+tier_latency = metrics.register(metrics.Histogram(
+    "llm_tier_latency_seconds", "Latency of successful model calls, by model and role (primary / hedge / failover).", ("model", "role")
+))
+hedges = metrics.register(metrics.Counter(
+    "llm_hedges_total", "Hedged model calls, by outcome (won / lost / denied / failover).", ("outcome",)
+))
+
+
+def parse_tiers(spec: str) -> dict:
+    """"site=primary>fallback,..." -> {site: (primary, fallback)}; either model may be empty."""
+    tiers = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        site, _, models = entry.partition("=")
+        primary, _, fallback = models.partition(">")
+        tiers[site.strip()] = (primary.strip(), fallback.strip())
+    return tiers
+
+
+def retryable(error: Exception) -> bool:
+    """Whether another model may answer where this one failed (not a 4xx, timeout or shed call)."""
+    if isinstance(error, (ModelOverloaded, asyncio.TimeoutError, ValueError, TypeError)):
+        return False
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code >= 500 if isinstance(code, int) else True
+
+
+def _retrieve(task):
+    if not task.cancelled():
+        task.exception()  # a cancelled leg may still end in an error nobody awaits
+
+
+class TierStats:
+    """Latency window and call / win counts of one model."""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = self.errors = self.wins = self.hedge_calls = self.hedge_wins = self.cancelled = 0
+        self._p95 = None
+        self._stale = 0
+
+    def observe(self, seconds: float):
+        self.latencies.append(seconds)
+        self._stale += 1
+
+    def percentile(self, q: float):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def p95(self):
+        """Seconds, or None before MIN_SAMPLES; re-sorted every 16 new samples."""
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        if self._p95 is None or self._stale >= 16:
+            self._p95, self._stale = self.percentile(0.95), 0
+        return self._p95
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(0.50), self.percentile(0.95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wins": self.wins,
+            "win_rate": round(self.wins / self.calls, 3) if self.calls else None,
+            "hedge_calls": self.hedge_calls,
+            "hedge_wins": self.hedge_wins,
+            "cancelled": self.cancelled,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class ModelTiers:
+    """Resolves a call site's tiers and runs its calls, hedging the slow ones."""
+
+    def __init__(self, tiers: dict = None, budget: float = None, min_delay_ms: float = None):
+        self.tiers = {**DEFAULT_TIERS, **(tiers if tiers is not None else parse_tiers(config.LLM_MODEL_TIERS))}
+        self.budget = budget if budget is not None else config.LLM_HEDGE_BUDGET
+        self.min_delay = (min_delay_ms if min_delay_ms is not None else config.LLM_HEDGE_MIN_DELAY_MS) / 1000
+        self.stats_by_model = {}
+        self.credit = 1.0
+        self.hedged = self.denied = self.failovers = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, site: str, model: str):
+        """(primary, fallback or None) for a call site; `model` is the caller's choice."""
+        prefix = max((prefix for prefix in self.tiers if site.startswith(prefix)), key=len)
+        primary, fallback = self.tiers[prefix]
+        primary = primary or model
+        return primary, (fallback if fallback and fallback != primary else None)
+
+    def _stats(self, model: str) -> TierStats:
+        stats = self.stats_by_model.get(model)
+        if stats is None:
+            stats = self.stats_by_model.setdefault(model, TierStats())
+        return stats
+
+    def hedge_delay(self, model: str):
+        """Seconds to wait on the primary before hedging, None while its p95 is unknown."""
+        p95 = self._stats(model).p95
+        return None if p95 is None else max(self.min_delay, p95)
+
+    def _spend(self, kind: str = "hedge") -> bool:
+        """Takes one extra call (hedge or failover) from the shared budget."""
+        with self._lock:
+            if self.credit < 1:
+                self.denied += 1
+                return False
+            self.credit -= 1
+            if kind == "hedge":
+                self.hedged += 1
+            else:
+                self.failovers += 1
+            return True
+
+    async def _timed(self, model: str, role: str, call):
+        stats = self._stats(model)
+        stats.calls += 1
+        if role == "hedge":
+            stats.hedge_calls += 1
+        start = time.perf_counter()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError:
+            stats.cancelled += 1
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        elapsed = time.perf_counter() - start
+        stats.observe(elapsed)
+        tier_latency.observe(elapsed, model=model, role=role)
+        return result
+
+    def _won(self, model: str, role: str):
+        stats = self._stats(model)
+        stats.wins += 1
+        if role == "hedge":
+            stats.hedge_wins += 1
+
+    async def run(self, site: str, model: str, call):
+        """`call(model)` on the site's primary, hedged or failed over to its fallback."""
+        primary, fallback = self.resolve(site, model)
+        with self._lock:
+            self.credit = min(HEDGE_BURST, self.credit + self.budget)
+
+        delay = self.hedge_delay(primary) if fallback else None
+        if fallback is None:
+            result = await self._timed(primary, "primary", call)
+            self._won(primary, "primary")
+            return result
+
+        first = asyncio.ensure_future(self._timed(primary, "primary", call))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                error = first.exception()
+                if error is None:
+                    self._won(primary, "primary")
+                    return first.result()
+                if not retryable(error) or not self._spend("failover"):
+                    raise error
+                # The primary failed outright: the fallback answers instead
+                hedges.inc(outcome="failover")
+                logging.warning(f"{primary} failed for {site}, retrying on {fallback}: {error}")
+                result = await self._timed(fallback, "failover", call)
+                self._won(fallback, "failover")
+                return result
+
+            if not self._spend():
+                hedges.inc(outcome="denied")
+                result = await first
+                self._won(primary, "primary")
+                return result
+            return await self._race(first, primary, fallback, call)
+        finally:
+            if not first.done():
+                first.cancel()
+                first.add_done_callback(_retrieve)
+
+    async def _race(self, first, primary: str, fallback: str, call):
+        """First successful answer of the primary and its hedge; the loser is cancelled."""
+        second = asyncio.ensure_future(self._timed(fallback, "hedge", call))
+        legs = {first: (primary, "primary"), second: (fallback, "hedge")}
+        pending, errors = set(legs), []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Both legs can finish together: every error is retrieved, then a success wins
+                errors.extend(task.exception() for task in done if task.exception() is not None)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    model, role = legs[winner]
+                    self._won(model, role)
+                    hedges.inc(outcome="won" if role == "hedge" else "lost")
+                    return winner.result()
+            raise errors[0]
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_retrieve)
+
+    def stats(self) -> dict:
+        return {
+            "hedged": self.hedged,
+            "denied": self.denied,
+            "failovers": self.failovers,
+            "budget": self.budget,
+            "tiers": {site or "*": {"primary": primary or "(caller)", "fallback": fallback or None} for site, (primary, fallback) in self.tiers.items()},
+            "models": {model: stats.snapshot() for model, stats in self.stats_by_model.items()},
+        }
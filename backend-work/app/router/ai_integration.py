@@ -1,22 +1,17 @@
-import os
-import base64
-from dotenv import load_dotenv
 from fastapi import APIRouter, HTTPException, UploadFile, File
 from pydantic import BaseModel
-from google import genai
+import logging
+from app import image_intake
+from app.json_extract import JSONExtractionError, parse_model
+from app.schema import Diagnosis
+from app.llm import gateway
+from app.llm_scheduler import ModelOverloaded
+from app.streaming import JSONFieldTracker, sse, sse_response, stream_model_json
 
 # Initialize FastAPI Router
 router = APIRouter()
 
-# Load environment variables
-load_dotenv()
-
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY is not set in environment variables")
-
-# Create Gemini client (NEW SDK)
-client = genai.Client(api_key=GEMINI_API_KEY)
+MODEL = "gemini-2.5-flash"
 
 
 # ----------------------------
@@ -29,13 +24,11 @@ class SymptomRequest(BaseModel):
 # ----------------------------
 # Symptom-Based Prediction
 # ----------------------------
-@router.post("/predict/symptoms")
-async def predict_disease_from_symptoms(request: SymptomRequest):
-
-    prompt = f"""
+def symptoms_prompt(symptoms: str) -> str:
+    return f"""
     You are a medical assistant.
 
-    Detect the language of this text: {request.symptoms}
+    Detect the language of this text: {symptoms}
 
 Then respond in the same language.
     Return ONLY valid JSON in this exact format:
@@ -53,26 +46,49 @@ Then respond in the same language.
     ONLY return JSON.
     """
 
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-        )
 
-        raw_text = response.text.strip()
+def parse_reply(response_text: str):
+    # First JSON object in the reply, repaired and checked against the diagnosis shape
+    return parse_model(response_text, Diagnosis).model_dump()
 
-        # Clean markdown if Gemini adds it
-        cleaned = (
-            raw_text.replace("```json", "")
-            .replace("```", "")
-            .strip()
-        )
 
-        import json
-        parsed = json.loads(cleaned)
+async def symptom_events(symptoms: str):
+    """SSE frames for /predict/symptoms?stream=true."""
+    tracker = JSONFieldTracker()
+    prompt = symptoms_prompt(symptoms)
+    try:
+        chunks = gateway.stream(prompt, model=MODEL, site="ai_integration.symptoms")
+        async for frame in stream_model_json(tracker, chunks):
+            yield frame
+        try:
+            result = parse_model(tracker.text, Diagnosis).model_dump()
+        except JSONExtractionError:
+            await gateway.evict(prompt, MODEL)
+            raise
+        yield sse("done", result)
+    except ModelOverloaded as e:
+        yield sse("error", {"detail": str(e), "status": e.status_code, "retry_after": e.retry_after})
+    except Exception as e:
+        logging.error(f"Error in symptoms stream: {e}")
+        yield sse("error", {"detail": f"Error: {str(e)}"})
 
-        return parsed
 
+@router.post("/predict/symptoms")
+async def predict_disease_from_symptoms(request: SymptomRequest, stream: bool = False):
+    if stream:
+        return sse_response(symptom_events(request.symptoms), "/predict/symptoms")
+
+    try:
+        prompt = symptoms_prompt(request.symptoms)
+        response_text = await gateway.generate(prompt, model=MODEL, site="ai_integration.symptoms")
+        try:
+            return parse_reply(response_text)
+        except JSONExtractionError:
+            await gateway.evict(prompt, MODEL)
+            raise
+
+    except ModelOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -86,20 +102,40 @@ async def predict_disease_from_image(file: UploadFile = File(...)):
     Predicts disease or injury based on an uploaded image using Gemini AI.
     """
     try:
-        image_data = await file.read()
-
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
+        upload = await image_intake.read_upload(file)
+    except image_intake.ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    async def identify():
+        image_data, mime_type = await image_intake.prepare(upload)
+        return await gateway.generate(
+            model=MODEL,
+            site="ai_integration.image",
+            cache=False,
             contents=[
                 "Identify any medical condition, disease, or injury in this image.",
                 {
-                    "mime_type": file.content_type,
+                    "mime_type": mime_type,
                     "data": image_data,
                 },
             ],
         )
 
-        return {"predicted_disease": response.text}
-
+    try:
+        response_text = await image_intake.result_cache.get_or_call(upload.sha256, identify, site="ai_integration.image")
+        return {"predicted_disease": response_text}
+
+    except image_intake.ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except image_intake.InvalidImage as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+    except ModelOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+
+@router.get("/predict/image/stats")
+async def image_cache_stats():
+    """Dedupe hit rate of /predict/image by upload content hash."""
+    return image_intake.result_cache.stats()
@@ -1,141 +1,516 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from google import genai
-import os
+from pydantic import BaseModel, ValidationError
+from typing import Optional
+from app import config
+from app.llm import gateway
+from app.llm_scheduler import ModelOverloaded, priority
+from app import language, metrics, triage
+from app.catalog import get_catalog
+from app.language import prompt_name
+from app.event_log import event_log
+from app.extraction_batcher import extraction_batcher
+from app.knowledge_base import get_knowledge_base
+from app.json_extract import JSONExtractionError, extract_json, validate
+from app.schema import Diagnosis, FusedChatResult
+from app.symptom_matcher import get_matcher, display_name
+from app.timing import StageTimer, StageStats
+from app.streaming import JSONFieldTracker, sse, sse_response, stream_model_json
 import logging
-import json
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY is not set in environment variables")
-
-# Create Gemini client (NEW SDK WAY)
-client = genai.Client(api_key=GEMINI_API_KEY)
+MODEL = "gemini-2.0-flash"
 
 # Create router instance
 router = APIRouter()
 
+# Latency breakdown per pipeline mode, served on /chat/stats
+pipeline_stats = StageStats()
+
+FUSED_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
 class ChatRequest(BaseModel):
     user_input: str
     user_id: str
+    mode: Optional[str] = None  # "fused" | "staged", defaults to CHAT_PIPELINE_MODE
 
 
-def get_gemini_response(prompt: str, response_format: str = "text"):
-    """Fetches response from Gemini API using new SDK."""
+async def get_gemini_response(prompt: str, response_format: str = "text", generation_config=None, site: str = "chatbot", schema=None):
+    """Fetches response from Gemini through the shared async gateway."""
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-        )
-
-        text_response = response.text
+        text_response = await gateway.generate(prompt, model=MODEL, generation_config=generation_config, site=site)
 
         if response_format == "json":
-            cleaned = (
-                text_response.replace("```json", "")
-                .replace("```", "")
-                .strip()
-            )
-            return json.loads(cleaned)
+            parsed = parse_json_reply(text_response, schema)
+            if parsed is None:
+                await gateway.evict(prompt, MODEL, generation_config)
+            return parsed
 
         return text_response
 
+    except ModelOverloaded:
+        raise
     except Exception as e:
         logging.error(f"Gemini API error: {e}")
         return None
 
 
-def detect_language(user_input: str):
+def parse_json_reply(text: str, schema=None):
+    """First JSON value in a reply (validated against `schema` if given), or None."""
+    try:
+        value = extract_json(text)
+        return validate(value, schema).model_dump() if schema else value
+    except JSONExtractionError as e:
+        logging.error(f"Failed to parse Gemini JSON: {e}")
+        return None
+
+
+async def detect_language(user_input: str):
+    """Local detector first; the LLM is asked only for low-confidence input."""
+    return await language.resolve_language(user_input, detect_language_with_llm)
+
+
+async def detect_language_with_llm(user_input: str):
     try:
         prompt = f"""
         Identify the language of the following text and return only the language name.
         Text: "{user_input}"
         """
-        response = get_gemini_response(prompt)
+        response = await get_gemini_response(prompt, site="chatbot.detect_language")
         return response.strip() if response else "English"
+    except ModelOverloaded:
+        raise
     except Exception as e:
         logging.error(f"Error detecting language: {e}")
         return "English"
 
 
-def extract_symptoms(user_input: str):
-    try:
-        prompt = f"""
-        You are a professional doctor. A patient says: '{user_input}'.
-        Extract and return a JSON list of symptoms mentioned.
-        If no symptoms are found, return [].
-        """
+async def extract_symptoms(user_input: str):
+    """Local matcher first; Gemini is asked only when the matcher can't resolve the input."""
+    result = get_matcher().match(user_input)
+    if result.resolved:
+        return [display_name(symptom) for symptom in result.symptoms]
 
-        response = get_gemini_response(prompt, response_format="json")
-        return response if isinstance(response, list) else []
+    try:
+        # Micro-batched with concurrent extraction prompts from the other routers
+        return await extraction_batcher.extract(user_input, MODEL)
 
+    except ModelOverloaded:
+        raise
     except Exception as e:
         logging.error(f"Error extracting symptoms: {e}")
         return []
 
 
-def generate_diagnosis(symptoms: list, language: str = "English"):
+def diagnosis_prompt(symptoms: list, language: str = "English"):
+    symptom_names = ", ".join(symptoms)
+    language = prompt_name(language)
+
+    return f"""
+    You are a professional doctor analyzing symptoms: {symptom_names}.
+    Provide the response in {language} with the following JSON format:
+
+    {{
+        "disease": "Most likely disease name",
+        "description": "Brief explanation in {language} (max 100 words)",
+        "severity": 1-5,
+        "precautions": ["List", "of", "3-5", "recommendations"],
+        "urgency": "emergency | urgent | routine"
+    }}
+    """
+
+
+def local_diagnosis(symptoms: list, language: str = "English"):
+    """
+    Diagnosis from the local engine, or None when it is not confident or the
+    answer would need translating. Description and precautions come from the
+    master data; severity and urgency from the local triage, on one scale with
+    the emergency fast path.
+    """
+    if language != "English" or not symptoms:
+        return None
+
+    from app.model_bundle import ModelNotReady, get_model
+
+    try:
+        model = get_model()
+    except ModelNotReady:
+        return None  # the LLM answers while the model loads
+    with metrics.span("model.predict"):
+        ranking = model.top_k(model.encode(symptoms), k=3)[0]
+    disease, probability = ranking[0]
+    if probability < config.DIAGNOSIS_CONFIDENCE:
+        return None
+
+    kb = get_knowledge_base()
+    assessment = triage.assess(symptoms, record=False)
+    return {
+        "disease": disease,
+        "description": kb.description(disease),
+        "severity": assessment.severity,
+        "precautions": list(kb.precautions_of(disease)),
+        "urgency": assessment.urgency,
+        "confidence": round(probability, 4),
+        "alternatives": [{"disease": name, "probability": round(p, 4)} for name, p in ranking[1:]],
+    }
+
+
+def local_analysis(user_input: str):
+    """(language, symptoms, diagnosis) without any model call, or None if any step is unsure."""
+    detection = language.detect(user_input)
+    if detection.language != "English" or detection.confidence < config.LANGDETECT_MIN_CONFIDENCE:
+        return None
+
+    result = get_matcher().match(user_input)
+    if not result.resolved or not result.symptoms:
+        return None
+
+    symptoms = [display_name(symptom) for symptom in result.symptoms]
+    diagnosis = local_diagnosis(symptoms)
+    return ("English", symptoms, diagnosis) if diagnosis else None
+
+
+async def generate_diagnosis(symptoms: list, language: str = "English"):
     try:
-        symptom_names = ", ".join(symptoms)
+        diagnosis = local_diagnosis(symptoms, language)
+        if diagnosis:
+            return diagnosis
 
-        prompt = f"""
-        You are a professional doctor analyzing symptoms: {symptom_names}.
-        Provide the response in {language} with the following JSON format:
+        prompt = diagnosis_prompt(symptoms, language)
+
+        return await get_gemini_response(prompt, response_format="json", site="chatbot.generate_diagnosis", schema=Diagnosis)
 
-        {{
+    except ModelOverloaded:
+        raise
+    except Exception as e:
+        logging.error(f"Error generating diagnosis: {e}")
+        return None
+
+
+def fused_prompt(user_input: str):
+    """Fused prompt, plus the language when the local detector is confident (else None)."""
+    detection = language.detect(user_input)
+    known_language = detection.language if detection.confidence >= config.LANGDETECT_MIN_CONFIDENCE else None
+    language_hint = f"The patient writes in {prompt_name(known_language)}." if known_language else ""
+
+    prompt = f"""
+    You are a professional doctor. A patient says: '{user_input}'. {language_hint}
+    Identify the language of the patient's text, extract the symptoms mentioned
+    and diagnose them. Write the diagnosis in the patient's language.
+    Return ONLY valid JSON in this exact format:
+
+    {{
+        "language": "Language name, e.g. English or Hindi",
+        "symptoms": ["symptom1", "symptom2"],
+        "diagnosis": {{
             "disease": "Most likely disease name",
-            "description": "Brief explanation in {language} (max 100 words)",
+            "description": "Brief explanation (max 100 words)",
             "severity": 1-5,
             "precautions": ["List", "of", "3-5", "recommendations"],
             "urgency": "emergency | urgent | routine"
         }}
-        """
+    }}
 
-        return get_gemini_response(prompt, response_format="json")
+    If no symptoms are found, return "symptoms": [] and "diagnosis": null.
+    """
+    return prompt, known_language
 
-    except Exception as e:
-        logging.error(f"Error generating diagnosis: {e}")
-        return None
 
+def validate_fused(response, known_language: str = None):
+    """FusedChatResult for a parsed reply, or None when it fails the schema."""
+    if response is None:
+        return None
 
-@router.post("/chat/")
-async def chat_endpoint(request: ChatRequest):
     try:
-        user_input = request.user_input.strip()
+        result = FusedChatResult.model_validate(response)
+    except ValidationError as e:
+        logging.warning(f"Fused reply failed schema validation: {e}")
+        return None
+
+    if result.symptoms and result.diagnosis is None:
+        logging.warning("Fused reply has symptoms but no diagnosis")
+        return None
+
+    if known_language:
+        result.language = known_language
+    return result
+
+
+async def fused_analysis(user_input: str):
+    """Asks for language, symptoms and diagnosis in one structured call.
 
-        # Detect language
-        detected_language = detect_language(user_input)
-        logging.info(f"Detected Language: {detected_language}")
+    Returns None when the reply does not match FusedChatResult, so the caller
+    can fall back to the staged pipeline.
+    """
+    prompt, known_language = fused_prompt(user_input)
+    response = await get_gemini_response(
+        prompt,
+        response_format="json",
+        generation_config=FUSED_GENERATION_CONFIG,
+        site="chatbot.fused",
+    )
+    result = validate_fused(response, known_language)
+    if result is None and response is not None:
+        await gateway.evict(prompt, MODEL, FUSED_GENERATION_CONFIG)
+    return result
 
-        # Extract symptoms
-        symptoms = extract_symptoms(user_input)
 
-        if not symptoms:
-            return {
-                "message": "I couldn't detect symptoms. Please describe them clearly."
-            }
+async def staged_analysis(user_input: str, timer: StageTimer):
+    """Original three-call pipeline: language, symptoms, then diagnosis."""
+    with timer.stage("detect_language"):
+        detected_language = await detect_language(user_input)
+    logging.info(f"Detected Language: {detected_language}")
 
-        # Generate diagnosis
-        diagnosis = generate_diagnosis(symptoms, language=detected_language)
+    with timer.stage("extract_symptoms"):
+        symptoms = await extract_symptoms(user_input)
 
-        if not diagnosis:
-            return {
-                "message": f"Sorry, I couldn't determine a diagnosis at this moment. (Response in {detected_language})"
-            }
+    if not symptoms:
+        return detected_language, [], None
+
+    with timer.stage("generate_diagnosis"):
+        diagnosis = await generate_diagnosis(symptoms, language=detected_language)
+
+    return detected_language, symptoms, diagnosis
+
+
+async def run_pipeline(user_input: str, mode: str, timer: StageTimer):
+    """(mode, language, symptoms, diagnosis) from the local engine, the fused call or the staged pipeline."""
+    if mode == "fused":
+        with timer.stage("local"):
+            local = local_analysis(user_input)
+        if local is not None:
+            return ("local", *local)
+
+        with timer.stage("fused"):
+            result = await fused_analysis(user_input)
+        if result is not None:
+            diagnosis = result.diagnosis.model_dump() if result.diagnosis else None
+            return mode, result.language, result.symptoms, diagnosis
+        mode = "fused_fallback"
+
+    return (mode, *await staged_analysis(user_input, timer))
+
+
+# ----------------------------
+# Triage fast path
+# ----------------------------
+def emergency_triage(user_input: str, timer: StageTimer):
+    """(language, Triage) when the matched symptoms are an emergency, else None."""
+    if not config.TRIAGE_ENABLED:
+        return None
+    with timer.stage("triage"):
+        assessment = triage.assess(get_matcher().match(user_input).symptoms)
+        if assessment.urgency != "emergency":
+            return None
+        detection = language.detect(user_input)
+        known_language = detection.language if detection.confidence >= config.LANGDETECT_MIN_CONFIDENCE else "English"
+    return known_language, assessment
+
+
+async def enrich(user_input: str, mode: str, assessment, user_id: str = None):
+    """The regular /chat/ response, computed after an emergency reply was sent."""
+    priority.set("emergency")  # this task's own context, so only its model calls
+    timer = StageTimer()
+    mode, detected_language, symptoms, diagnosis = await run_pipeline(user_input, mode, timer)
+    response = build_chat_response(mode, timer, detected_language, symptoms, diagnosis, assessment)
+    return log_consultation("chat.enrichment", user_id, user_input, symptoms, response)
+
+
+def emergency_response(user_input: str, mode: str, timer: StageTimer, detected_language: str, assessment, user_id: str = None):
+    """Immediate reply for an emergency; the LLM diagnosis is polled on /chat/enrichment/{id}."""
+    catalog = get_catalog()
+    message = catalog.render("triage.emergency", detected_language)
+    if message is None:
+        # No model call on the emergency path: English beats a slower answer
+        logging.warning(f"Catalog has no {detected_language!r} emergency message; answering in English")
+        message = catalog.source("triage.emergency")
+    enrichment_id = triage.enrichments.start(enrich(user_input, mode, assessment, user_id))
+
+    total_ms = timer.total_ms()
+    pipeline_stats.record("triage", timer.timings_ms, total_ms)
+    response = {
+        "message": message,
+        "urgency": "emergency",
+        "severity": assessment.severity,
+        "symptoms": [display_name(symptom) for symptom in assessment.symptoms],
+        "language": detected_language,
+        "triage": assessment.to_dict(),
+        "enrichment": {"id": enrichment_id, "status": "pending", "poll": f"/chat/enrichment/{enrichment_id}"},
+        "pipeline": {"mode": "triage", "timings_ms": timer.timings_ms, "total_ms": total_ms},
+    }
+    return log_consultation("chat", user_id, user_input, assessment.symptoms, response)
+
+
+def log_consultation(source: str, user_id, user_input: str, symptoms, response: dict):
+    """Queues the consultation on the event log (no I/O here) and returns `response`."""
+    pipeline = response.get("pipeline", {})
+    disease = response.get("disease")
+    event_log.record(
+        source,
+        user_id=user_id,
+        input=user_input,
+        language=response.get("language"),
+        symptoms=list(symptoms or []),
+        disease=disease,
+        # Local-engine answers carry a confidence: the label is the model's own
+        label_source=(None if not disease else "model" if response.get("confidence") is not None else "llm"),
+        urgency=response.get("urgency"),
+        severity=response.get("severity"),
+        confidence=response.get("confidence"),
+        mode=pipeline.get("mode"),
+        latency_ms=pipeline.get("total_ms"),
+        timings_ms=pipeline.get("timings_ms"),
+    )
+    return response
+
+
+def record_triage_agreement(symptoms, diagnosis, assessment=None):
+    """Compares the local urgency with an LLM diagnosis (local-engine answers are skipped)."""
+    if symptoms and diagnosis and "confidence" not in diagnosis:
+        local = assessment.urgency if assessment else triage.assess(symptoms).urgency
+        triage.agreement.record(local, diagnosis.get("urgency", "routine"))
+
+
+def build_chat_response(mode, timer: StageTimer, detected_language, symptoms, diagnosis, assessment=None):
+    total_ms = timer.total_ms()
+    pipeline_stats.record(mode, timer.timings_ms, total_ms)
+    logging.info(f"/chat/ {mode} timings: {timer.timings_ms} total={total_ms}ms")
+    pipeline = {"mode": mode, "timings_ms": timer.timings_ms, "total_ms": total_ms}
+    record_triage_agreement(symptoms, diagnosis, assessment)
+
+    if not symptoms:
+        return {
+            "message": "I couldn't detect symptoms. Please describe them clearly.",
+            "pipeline": pipeline,
+        }
 
+    if not diagnosis:
         return {
-            "disease": diagnosis.get("disease", "Unknown"),
-            "description": diagnosis.get("description", ""),
-            "severity": diagnosis.get("severity", 2),
-            "precautions": diagnosis.get("precautions", []),
-            "urgency": diagnosis.get("urgency", "routine"),
-            "language": detected_language,
+            "message": f"Sorry, I couldn't determine a diagnosis at this moment. (Response in {detected_language})",
+            "pipeline": pipeline,
         }
 
+    response = {
+        "disease": diagnosis.get("disease", "Unknown"),
+        "description": diagnosis.get("description", ""),
+        "severity": diagnosis.get("severity", 2),
+        "precautions": diagnosis.get("precautions", []),
+        "urgency": diagnosis.get("urgency", "routine"),
+        "language": detected_language,
+        "pipeline": pipeline,
+    }
+    if "confidence" in diagnosis:
+        response["confidence"] = diagnosis["confidence"]
+        response["alternatives"] = diagnosis["alternatives"]
+    return response
+
+
+async def chat_events(user_input: str, mode: str, user_id: str = None):
+    """SSE frames for /chat/?stream=true: fields as they parse, then the full response."""
+    try:
+        timer = StageTimer()
+
+        emergency = emergency_triage(user_input, timer)
+        if emergency is not None:
+            yield sse("done", emergency_response(user_input, mode, timer, *emergency, user_id=user_id))
+            return
+
+        result = None
+        if mode == "fused":
+            with timer.stage("local"):
+                local = local_analysis(user_input)
+            if local is not None:
+                response = build_chat_response("local", timer, *local)
+                yield sse("done", log_consultation("chat", user_id, user_input, local[1], response))
+                return
+
+            prompt, known_language = fused_prompt(user_input)
+            if known_language:
+                yield sse("field", {"name": "language", "value": known_language})
+            tracker = JSONFieldTracker()
+            with timer.stage("fused"):
+                chunks = gateway.stream(prompt, model=MODEL, generation_config=FUSED_GENERATION_CONFIG, site="chatbot.fused")
+                async for frame in stream_model_json(tracker, chunks):
+                    yield frame
+            result = validate_fused(tracker.result(), known_language)
+            if result is None:
+                await gateway.evict(prompt, MODEL, FUSED_GENERATION_CONFIG)
+                mode = "fused_fallback"
+
+        if result is not None:
+            detected_language = result.language
+            symptoms = result.symptoms
+            diagnosis = result.diagnosis.model_dump() if result.diagnosis else None
+        else:
+            with timer.stage("detect_language"):
+                detected_language = await detect_language(user_input)
+            yield sse("field", {"name": "language", "value": detected_language})
+            with timer.stage("extract_symptoms"):
+                symptoms = await extract_symptoms(user_input)
+            yield sse("field", {"name": "symptoms", "value": symptoms})
+
+            diagnosis = local_diagnosis(symptoms, detected_language)
+            if symptoms and diagnosis is None:
+                tracker = JSONFieldTracker()
+                with timer.stage("generate_diagnosis"):
+                    prompt = diagnosis_prompt(symptoms, detected_language)
+                    chunks = gateway.stream(prompt, model=MODEL, site="chatbot.generate_diagnosis")
+                    async for frame in stream_model_json(tracker, chunks):
+                        yield frame
+                diagnosis = tracker.result(Diagnosis)
+                if diagnosis is None:
+                    await gateway.evict(prompt, MODEL)
+
+        response = build_chat_response(mode, timer, detected_language, symptoms, diagnosis)
+        yield sse("done", log_consultation("chat", user_id, user_input, symptoms, response))
+
+    except ModelOverloaded as e:
+        yield sse("error", {"detail": str(e), "status": e.status_code, "retry_after": e.retry_after})
+    except Exception as e:
+        logging.error(f"Error in chat stream: {e}")
+        yield sse("error", {"detail": "An internal error occurred"})
+
+
+@router.post("/chat/")
+async def chat_endpoint(request: ChatRequest, stream: bool = False):
+    user_input = request.user_input.strip()
+    mode = request.mode or config.CHAT_PIPELINE_MODE
+
+    if stream:
+        return sse_response(chat_events(user_input, mode, request.user_id), "/chat/")
+
+    try:
+        timer = StageTimer()
+
+        emergency = emergency_triage(user_input, timer)
+        if emergency is not None:
+            return emergency_response(user_input, mode, timer, *emergency, user_id=request.user_id)
+
+        mode, detected_language, symptoms, diagnosis = await run_pipeline(user_input, mode, timer)
+        response = build_chat_response(mode, timer, detected_language, symptoms, diagnosis)
+        return log_consultation("chat", request.user_id, user_input, symptoms, response)
+
+    except ModelOverloaded:
+        raise
     except Exception as e:
         logging.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred")
+
+
+@router.get("/chat/stats")
+async def chat_pipeline_stats():
+    """Per-stage latency of the fused and staged pipelines."""
+    return pipeline_stats.snapshot()
+
+
+@router.get("/chat/enrichment/{enrichment_id}")
+async def chat_enrichment(enrichment_id: str):
+    """Full diagnosis for an emergency reply: "pending" until the LLM pipeline finishes."""
+    entry = triage.enrichments.get(enrichment_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired enrichment id")
+    return entry
+
+
+@router.get("/chat/triage/stats")
+async def chat_triage_stats():
+    """Agreement of the local triage with the LLM's urgency labels, and enrichment counts."""
+    return {"agreement": triage.agreement.snapshot(), "enrichment": triage.enrichments.stats()}
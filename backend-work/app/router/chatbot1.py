@@ -1,210 +1,231 @@
-SYMPTOMS_LIST = {
-    "itching", "skin rash", "nodal skin eruptions", "continuous sneezing", "shivering",
-    "chills", "joint pain", "stomach pain", "acidity", "ulcers on tongue", "muscle wasting",
-    "vomiting", "burning micturition", "spotting urination", "fatigue", "weight gain",
-    "anxiety", "cold hands and feets", "mood swings", "weight loss", "restlessness",
-    "lethargy", "patches in throat", "irregular sugar level", "cough", "high fever",
-    "sunken eyes", "breathlessness", "sweating", "dehydration", "indigestion", "headache",
-    "yellowish skin", "dark urine", "nausea", "loss of appetite", "pain behind the eyes",
-    "back pain", "constipation", "abdominal pain", "diarrhoea", "mild fever", "yellow urine",
-    "yellowing of eyes", "acute liver failure", "fluid overload", "swelling of stomach",
-    "swelled lymph nodes", "malaise", "blurred and distorted vision", "phlegm",
-    "throat irritation", "redness of eyes", "sinus pressure", "runny nose", "congestion",
-    "chest pain", "weakness in limbs", "fast heart rate", "pain during bowel movements",
-    "pain in anal region", "bloody stool", "irritation in anus", "neck pain", "dizziness",
-    "cramps", "bruising", "obesity", "swollen legs", "swollen blood vessels",
-    "puffy face and eyes", "enlarged thyroid", "brittle nails", "swollen extremities",
-    "excessive hunger", "extra marital contacts", "drying and tingling lips", "slurred speech",
-    "knee pain", "hip joint pain", "muscle weakness", "stiff neck", "swelling joints",
-    "movement stiffness", "spinning movements", "loss of balance", "unsteadiness",
-    "weakness of one body side", "loss of smell", "bladder discomfort", "foul smell of urine",
-    "continuous feel of urine", "passage of gases", "internal itching", "toxic look (typhos)",
-    "depression", "irritability", "muscle pain", "altered sensorium", "red spots over body",
-    "belly pain", "abnormal menstruation", "dischromic patches", "watering from eyes",
-    "increased appetite", "polyuria", "family history", "mucoid sputum", "rusty sputum",
-    "lack of concentration", "visual disturbances", "receiving blood transfusion",
-    "receiving unsterile injections", "coma", "stomach bleeding", "distention of abdomen",
-    "history of alcohol consumption", "fluid overload", "blood in sputum",
-    "prominent veins on calf", "palpitations", "painful walking", "pus filled pimples",
-    "blackheads", "scurring", "skin peeling", "silver like dusting", "small dents in nails",
-    "inflammatory nails", "blister", "red sore around nose", "yellow crust ooze"
-}
 from fastapi import APIRouter
 from pydantic import BaseModel
-import pandas as pd
 import numpy as np
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-import google.generativeai as genai
-import csv
-import os
+from app.llm import gateway
+from app.catalog import get_catalog
+from app.event_log import event_log
+from app import config, language, metrics
+from app.knowledge_base import get_knowledge_base
+from app.model_bundle import get_model
+from app.sessions import Session, build_session_store
+from app.speculation import Speculator
+from app.symptom_matcher import get_matcher
+from app.extraction_batcher import extraction_batcher
+from app.json_extract import JSONExtractionError
 import json
-import re
 import logging
+import re
+import time
 
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY is not set in environment variables")
-
-# Configure Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
-gemini_model = genai.GenerativeModel("gemini-1.5-flash")
+MODEL = "gemini-1.5-flash"
 
 # Create router instance
 router = APIRouter()
 
-# Load datasets
-TRAINING_CSV_PATH = "app/Data/Training.csv"
-testing = pd.read_csv(TRAINING_CSV_PATH)
-cols = testing.columns[:-1]
-y = testing['prognosis']
-le = LabelEncoder()
-y = le.fit_transform(y)
-clf = DecisionTreeClassifier()
-x_train, x_test, y_train, y_test = train_test_split(testing[cols], y, test_size=0.3, random_state=42)
-clf.fit(x_train, y_train)
-
-# Load Master Data
-description_dict = {}
-severity_dict = {}
-precaution_dict = {}
-
-def load_data():
-    global description_dict, severity_dict, precaution_dict
-    desc_path = "app/MasterData/symptom_Description.csv"
-    severity_path = "app/MasterData/symptom_severity.csv"
-    precaution_path = "app/MasterData/symptom_precaution.csv"
-    
-    if os.path.exists(desc_path):
-        with open(desc_path) as file:
-            reader = csv.reader(file)
-            description_dict = {row[0]: row[1] for row in reader if len(row) >= 2}
-    
-    if os.path.exists(severity_path):
-        with open(severity_path) as file:
-            reader = csv.reader(file)
-            severity_dict = {row[0]: int(row[1]) for row in reader if len(row) >= 2 and row[1].isdigit()}
-    
-    if os.path.exists(precaution_path):
-        with open(precaution_path) as file:
-            reader = csv.reader(file)
-            precaution_dict = {row[0]: row[1:] for row in reader if len(row) >= 2}
-
-load_data()
-
 class ChatRequest(BaseModel):
     user_input: str
     user_id: str  # Unique identifier for conversation tracking
 
-# In-memory session storage
-user_sessions = {}
+# LRU + TTL bounded session storage (memory or shared SQLite, see SESSION_BACKEND)
+user_sessions = build_session_store()
+metrics.stats_collector("chatbot1_sessions", "chatbot1 session store size, hits, misses and evictions.", user_sessions.stats)
+# Diagnoses started while the user is asked to confirm their symptoms
+speculator = Speculator()
+metrics.stats_collector("chatbot1_speculation", "chatbot1 diagnoses precomputed during confirmation: used, wasted, time saved.", speculator.stats)
+# Symptom -> catalog key of its follow-up question (see MasterData/message_catalog.json)
 FOLLOW_UP_QUESTIONS = {
-    "fever": "Do you also have chills or sweating?",
-    "cough": "Is it a dry cough or productive with mucus?",
-    "headache": "Is your headache mild or severe?",
+    "high_fever": "followup.high_fever",
+    "cough": "followup.cough",
+    "headache": "followup.headache",
 }
 
-def detect_language_with_gemini(text):
+async def detect_language_with_gemini(text):
     prompt = f"Detect the language of the following text and return only the language name (e.g., English, Hindi, Spanish):\n\n{text}"
-    response = gemini_model.generate_content(prompt)
-    return response.text.strip()
-
-def translate_with_gemini(text, target_language):
-    prompt = f"Translate the following text to {target_language}:\n\n{text}"
-    response = gemini_model.generate_content(prompt)
-    return response.text.strip()
-
-def extract_symptoms(user_input: str):
-    prompt = f"""
-    Extract symptoms from the following patient complaint: "{user_input}"
-    - Only return symptoms present in this list: {list(cols)}
-    - Output should be a valid JSON list (e.g., ["fever", "cough"])
-    - If no symptoms match, return []
-    """
-    
-    response = gemini_model.generate_content(prompt)
-    
+    response_text = await gateway.generate(prompt, model=MODEL, site="chatbot1.detect_language")
+    return response_text.strip()
+
+async def translate_with_gemini(text, target_language):
+    prompt = f"Translate the following text to {language.prompt_name(target_language)}:\n\n{text}"
+    response_text = await gateway.generate(prompt, model=MODEL, site="chatbot1.translate")
+    return response_text.strip()
+
+async def localized_message(key, user_lang, **params):
+    """Fixed bot message from the pre-translated catalog; the LLM only translates uncompiled languages."""
+    catalog = get_catalog()
+    with metrics.span("catalog.render"):
+        message = catalog.render(key, user_lang, **params)
+    if message is not None:
+        return message
+    logging.warning(f"Catalog has no {user_lang!r} translation of {key!r}; translating with the LLM")
+    return await translate_with_gemini(catalog.source(key, **params), user_lang)
+
+async def localized_symptom_list(symptoms, user_lang):
+    """Symptom names for the confirmation; names the catalog lacks go through translation as one list."""
+    catalog = get_catalog()
+    missing = catalog.missing_symptom_names(symptoms, user_lang)
+    if missing:
+        logging.warning(f"Catalog has no {user_lang!r} names for {missing}; translating the symptom list with the LLM")
+        return await translate_with_gemini(catalog.symptom_list(symptoms, catalog.source_language), user_lang)
+    return catalog.symptom_list(symptoms, user_lang)
+
+async def extract_symptoms(user_input: str):
+    """Local matcher first; Gemini is asked only when the matcher can't resolve the input."""
+    matcher = get_matcher()
+    result = matcher.match(user_input)
+    if result.resolved:
+        return result.symptoms
+
     try:
-        match = re.search(r"\[(.*?)\]", response.text, re.DOTALL)
-        if match:
-            symptoms = json.loads(f"[{match.group(1)}]")  
-            return [s.strip().lower() for s in symptoms if s.strip().lower() in cols]
-    except json.JSONDecodeError as e:
+        symptoms = await extraction_batcher.extract(user_input, MODEL)
+        columns = [matcher.canonical(s) for s in symptoms]
+        kb = get_knowledge_base()
+        return list(dict.fromkeys(c for c in columns if c and kb.column(c) == c))
+    except JSONExtractionError as e:
         logging.error(f"Failed to parse Gemini response: {e}")
     
     return []
 
 def predict_disease(symptoms):
-    input_vector = np.zeros(len(cols))
-    for symptom in symptoms:
-        if symptom in cols:
-            input_vector[list(cols).index(symptom)] = 1
-    prediction = clf.predict(input_vector.reshape(1, -1))
-    disease = le.inverse_transform(prediction)[0]
+    model = get_model()
+    with metrics.span("model.predict"):
+        disease = str(model.predict(model.encode(symptoms))[0])
     
+    kb = get_knowledge_base()
+    with metrics.span("master_data.lookup"):
+        return {
+            "disease": disease,
+            "description": kb.description(disease, "No description available"),
+            "precautions": list(kb.precautions_of(disease)),
+            "symptom_severity": {symptom: kb.severity_of(symptom) or "Unknown" for symptom in symptoms},
+        }
+
+async def diagnosis_response(symptoms, user_lang):
+    """Final reply: local prediction plus the diagnosis text in the user's language."""
+    result = predict_disease(symptoms)
+
+    diagnosis_text = f"""
+    Disease: {result['disease']}
+    Description: {result['description']}
+    Precautions: {', '.join(result['precautions'])}
+    Symptom Severity: {result['symptom_severity']}
+    """
     return {
-        "disease": disease,
-        "description": description_dict.get(disease, "No description available"),
-        "precautions": precaution_dict.get(disease, []),
-        "symptom_severity": {symptom: severity_dict.get(symptom, "Unknown") for symptom in symptoms},
+        "disease": result["disease"],
+        "description": result["description"],
+        "precautions": result["precautions"],
+        "symptom_severity": result["symptom_severity"],
+        "message": await translate_with_gemini(diagnosis_text, user_lang)
     }
 
+def confirms(user_input):
+    """True when "yes" is one of the words, not just inside one ("my eyes hurt")."""
+    return "yes" in re.findall(r"\w+", user_input.lower())
+
+def diagnosis_fingerprint(symptoms, user_lang):
+    return json.dumps([sorted(symptoms), user_lang])
+
+def precompute_diagnosis(user_id, session, user_lang):
+    """Starts the diagnosis for the symptoms being confirmed; a changed set restarts it."""
+    if not config.SPECULATIVE_DIAGNOSIS:
+        return
+    fingerprint = diagnosis_fingerprint(session.symptoms, user_lang)
+
+    async def store(response, elapsed):
+        # Kept with the session too, so a "yes" served by another worker can use it;
+        # peek() so this internal read stays out of the hit / miss stats
+        current = await user_sessions.peek(user_id)
+        if current is not None and diagnosis_fingerprint(current.symptoms, user_lang) == fingerprint:
+            current.precomputed = {"fingerprint": fingerprint, "response": response, "elapsed": elapsed}
+            await user_sessions.put(user_id, current)
+
+    speculator.start(user_id, fingerprint, diagnosis_response(list(session.symptoms), user_lang), on_done=store)
+
+async def confirmed_diagnosis(user_id, session, user_lang):
+    """The precomputed diagnosis when its inputs still match, else computed now."""
+    fingerprint = diagnosis_fingerprint(session.symptoms, user_lang)
+    response = await speculator.take(user_id, fingerprint)
+    if response is not None:
+        return response
+
+    stored = session.precomputed
+    if stored and stored.get("fingerprint") == fingerprint:
+        speculator.stored_hit(stored.get("elapsed") or 0.0)
+        return stored["response"]
+
+    speculator.miss()
+    return await diagnosis_response(session.symptoms, user_lang)
+
 @router.post("/chat/")
-def chat_with_bot(request: ChatRequest):
+async def chat_with_bot(request: ChatRequest):
+    start = time.perf_counter()
     user_id = request.user_id
     user_input = request.user_input
     
-    # Detect user's language
-    user_lang = detect_language_with_gemini(user_input)
-    
-    if user_id not in user_sessions:
-        user_sessions[user_id] = {"symptoms": [], "asked_followup": False, "confirmation_stage": False}
-
-    session = user_sessions[user_id]
-    symptoms = extract_symptoms(user_input)
+    session = await user_sessions.get(user_id) or Session()
+
+    # Detect user's language locally; short replies like "yes" keep the session's language
+    detection = language.detect(user_input)
+    if detection.confidence >= config.LANGDETECT_MIN_CONFIDENCE:
+        user_lang = detection.language
+    elif session.language:
+        user_lang = session.language
+    else:
+        user_lang = await detect_language_with_gemini(user_input)
+    session.language = user_lang
+    symptoms = await extract_symptoms(user_input)
 
     # **Step 1: If no symptoms are detected, ask user to describe further**
-    if not symptoms and not session["symptoms"]:
-        message = "I couldn't detect any symptoms. Can you describe your health problem in more detail?"
-        return {"message": translate_with_gemini(message, user_lang)}
+    if not symptoms and not session.symptoms:
+        await user_sessions.put(user_id, session)
+        return {"message": await localized_message("no_symptoms", user_lang)}
 
-    session["symptoms"].extend(symptoms)
-    session["symptoms"] = list(set(session["symptoms"]))  # Remove duplicates
+    session.symptoms.extend(symptoms)
+    session.symptoms = list(set(session.symptoms))  # Remove duplicates
 
     # **Step 2: If detected symptoms are less than 2, ask a follow-up question**
-    if len(session["symptoms"]) < 2 and not session["asked_followup"]:
-        symptom_to_ask = session["symptoms"][0] if session["symptoms"] else np.random.choice(list(FOLLOW_UP_QUESTIONS.keys()))
-        session["asked_followup"] = True
-        return {"message": translate_with_gemini(FOLLOW_UP_QUESTIONS.get(symptom_to_ask, "Can you describe your symptoms in more detail?"), user_lang)}
+    if len(session.symptoms) < 2 and not session.asked_followup:
+        symptom_to_ask = session.symptoms[0] if session.symptoms else np.random.choice(list(FOLLOW_UP_QUESTIONS.keys()))
+        session.asked_followup = True
+        await user_sessions.put(user_id, session)
+        return {"message": await localized_message(FOLLOW_UP_QUESTIONS.get(symptom_to_ask, "followup.default"), user_lang)}
 
     # **Step 3: Ask for confirmation before final diagnosis**
-    if not session["confirmation_stage"]:
-        session["confirmation_stage"] = True
-        confirmation_text = f"I detected these symptoms: {', '.join(session['symptoms'])}. Can you confirm? Reply with 'yes' to proceed or add more symptoms."
-        return {"message": translate_with_gemini(confirmation_text, user_lang)}
+    if not session.confirmation_stage:
+        session.confirmation_stage = True
+        await user_sessions.put(user_id, session)
+        precompute_diagnosis(user_id, session, user_lang)
+        symptom_names = await localized_symptom_list(session.symptoms, user_lang)
+        return {"message": await localized_message("confirm", user_lang, symptoms=symptom_names)}
 
     # **Step 4: If user confirms, proceed with disease prediction**
-    if "yes" in user_input.lower():
-        result = predict_disease(session["symptoms"])
-        del user_sessions[user_id]  # Clear session after diagnosis
-        
-        diagnosis_text = f"""
-        Disease: {result['disease']}
-        Description: {result['description']}
-        Precautions: {', '.join(result['precautions'])}
-        Symptom Severity: {result['symptom_severity']}
-        """
-        return {
-            "disease": result["disease"],
-            "description": result["description"],
-            "precautions": result["precautions"],
-            "symptom_severity": result["symptom_severity"],
-            "message": translate_with_gemini(diagnosis_text, user_lang)
-        }
+    if confirms(user_input):
+        response = await confirmed_diagnosis(user_id, session, user_lang)
+        await user_sessions.delete(user_id)  # Clear session after diagnosis
+        event_log.record(
+            "chatbot1",
+            user_id=user_id,
+            input=user_input,
+            language=user_lang,
+            symptoms=list(session.symptoms),
+            disease=response["disease"],
+            label_source="model",
+            latency_ms=round((time.perf_counter() - start) * 1000, 2),
+        )
+        return response
 
     # **Step 5: If user adds more symptoms instead of confirming**
-    return {"message": translate_with_gemini("Please list any additional symptoms, or reply with 'yes' to proceed with diagnosis.", user_lang)}
+    await user_sessions.put(user_id, session)
+    precompute_diagnosis(user_id, session, user_lang)  # no-op unless the symptoms changed
+    return {"message": await localized_message("add_more", user_lang)}
+
+
+@router.get("/chat/sessions/stats")
+async def session_stats():
+    """Hit / miss / eviction counters of the session store."""
+    return user_sessions.stats()
+
+
+@router.get("/chat/speculation/stats")
+async def speculation_stats():
+    """Diagnoses precomputed during confirmation: hits, misses, wasted vs. saved time."""
+    return speculator.stats()
@@ -1,70 +1,26 @@
+import time
+import uuid
 from fastapi import APIRouter, HTTPException
-import os
-import re
-import json
-import requests
-from dotenv import load_dotenv
-from google import genai
+from app import config
+from app.http_client import CircuitOpen, UpstreamError, predict_client
+from app.knowledge_base import get_knowledge_base
+from app.event_log import event_log
+from app.extraction_batcher import extraction_batcher
+from app.json_extract import JSONExtractionError
+from app.llm_scheduler import ModelOverloaded
+from app.model_bundle import ModelNotReady
+from app.symptom_matcher import get_matcher, display_name
+from app.router.prediction import predict_batch
 
 router = APIRouter()
 
-# ----------------------------
-# Symptom Master List
-# ----------------------------
-SYMPTOMS_LIST = {
-    "itching", "skin rash", "nodal skin eruptions", "continuous sneezing", "shivering",
-    "chills", "joint pain", "stomach pain", "acidity", "ulcers on tongue",
-    "vomiting", "burning micturition", "spotting urination", "fatigue",
-    "weight gain", "anxiety", "cold hands and feets", "mood swings",
-    "weight loss", "restlessness", "lethargy", "patches in throat",
-    "irregular sugar level", "cough", "high fever", "sunken eyes",
-    "breathlessness", "sweating", "dehydration", "indigestion",
-    "headache", "yellowish skin", "dark urine", "nausea",
-    "loss of appetite", "back pain", "constipation", "abdominal pain",
-    "diarrhoea", "mild fever", "yellow urine", "yellowing of eyes",
-    "swelled lymph nodes", "malaise", "blurred and distorted vision",
-    "phlegm", "throat irritation", "redness of eyes", "sinus pressure",
-    "runny nose", "congestion", "chest pain", "weakness in limbs",
-    "fast heart rate", "neck pain", "dizziness", "cramps",
-    "bruising", "obesity", "swollen legs", "puffy face and eyes",
-    "muscle weakness", "stiff neck", "swelling joints",
-    "movement stiffness", "loss of balance", "unsteadiness",
-    "weakness of one body side", "loss of smell", "depression",
-    "irritability", "muscle pain", "altered sensorium",
-    "red spots over body", "belly pain", "abnormal menstruation",
-    "watering from eyes", "increased appetite", "polyuria",
-    "coma", "stomach bleeding", "distention of abdomen",
-    "palpitations", "painful walking", "pus filled pimples",
-    "blackheads", "skin peeling", "blister"
-}
-
 # ----------------------------
 # Load Environment
 # ----------------------------
-load_dotenv()
-
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-PREDICT_API_URL = os.getenv("PREDICT_API_URL", "http://localhost:10000/predict")
-
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY is not set in environment variables")
+# Unset: predict in process with app.router.prediction instead of over HTTP
+PREDICT_API_URL = config.PREDICT_API_URL
 
-# Create Gemini client (NEW SDK)
-client = genai.Client(api_key=GEMINI_API_KEY)
-
-
-# ----------------------------
-# Helper Function
-# ----------------------------
-def extract_json_from_text(text: str):
-    """Extracts JSON list from model response."""
-    match = re.search(r"\[(.*?)\]", text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(f"[{match.group(1)}]")
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail="Failed to parse extracted symptoms")
-    return []
+MODEL = "gemini-2.0-flash"
 
 
 # ----------------------------
@@ -75,51 +31,74 @@ async def process_symptoms(data: dict):
     """
     Extract symptoms using Gemini and forward to ML prediction API.
     """
+    start = time.perf_counter()
     user_query = data.get("query")
 
     if not user_query:
         raise HTTPException(status_code=400, detail="Query is required")
 
-    extract_prompt = f"""
-    Extract symptoms from the given text and return them as a Python list.
-    If no symptoms are found, return [].
-    Text: "{user_query}"
-    Output format: ["symptom1", "symptom2"]
-    """
+    # Local matcher handles most complaints without a model call
+    local_match = get_matcher().match(user_query)
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=extract_prompt,
-        )
-
-        if not response or not response.text.strip():
-            raise HTTPException(status_code=500, detail="Gemini API returned empty response")
-
-        print("🔹 Gemini Response:", response.text)
-
-        extracted_symptoms = extract_json_from_text(response.text.lower())
-
-        if not isinstance(extracted_symptoms, list):
-            raise HTTPException(status_code=500, detail="Unexpected Gemini format")
-
+        if local_match.resolved:
+            extracted_symptoms = [display_name(symptom) for symptom in local_match.symptoms]
+        else:
+            # Micro-batched with concurrent extraction prompts from the other routers
+            try:
+                extracted_symptoms = await extraction_batcher.extract(user_query, MODEL)
+            except JSONExtractionError:
+                raise HTTPException(status_code=500, detail="Failed to parse extracted symptoms")
+
+            extracted_symptoms = [
+                display_name(get_matcher().canonical(symptom.lower()) or symptom.lower())
+                for symptom in extracted_symptoms
+            ]
+
+        # Keep only symptoms the prediction model knows about
+        vocabulary = get_knowledge_base().vocabulary
         matched_symptoms = [
             symptom for symptom in extracted_symptoms
-            if symptom in SYMPTOMS_LIST
+            if symptom in vocabulary
         ]
 
-        # Forward to ML model API
-        predict_response = requests.post(
-            PREDICT_API_URL,
-            json={"symptoms": matched_symptoms},
+        if not PREDICT_API_URL:
+            result = predict_batch([matched_symptoms])[0]
+        else:
+            # Forward to ML model API (pooled, with retries and a circuit breaker);
+            # the key lets timed-out attempts be retried without a second prediction
+            predict_response = await predict_client.post_json(
+                PREDICT_API_URL,
+                {"symptoms": matched_symptoms},
+                idempotency_key=str(uuid.uuid4()),
+            )
+
+            if predict_response.status_code != 200:
+                raise HTTPException(status_code=500, detail="Prediction API failed")
+
+            result = predict_response.json()
+
+        event_log.record(
+            "disease_prediction",
+            input=user_query,
+            symptoms=matched_symptoms,
+            disease=result.get("disease") if isinstance(result, dict) else None,
+            label_source="model",
+            latency_ms=round((time.perf_counter() - start) * 1000, 2),
         )
+        return result
 
-        if predict_response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Prediction API failed")
-
-        return predict_response.json()
-
-    except HTTPException:
+    except (HTTPException, ModelOverloaded, ModelNotReady):
         raise
+    except CircuitOpen:
+        raise HTTPException(status_code=503, detail="Prediction API unavailable, try again later")
+    except UpstreamError:
+        raise HTTPException(status_code=500, detail="Prediction API failed")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/disease-prediction/upstream/stats")
+async def upstream_stats():
+    """Pool usage, retries, breaker state and latency of the PREDICT_API_URL forward."""
+    return predict_client.stats()
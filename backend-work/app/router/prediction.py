@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from typing import List
+from app import metrics
+from app.knowledge_base import get_knowledge_base
+
+router = APIRouter()
+
+MAX_BATCH_SIZE = 1000
+
+
+# ----------------------------
+# Pydantic Models
+# ----------------------------
+class PredictRequest(BaseModel):
+    symptoms: List[str]
+    top_k: int = Field(3, ge=1, le=10)
+
+
+class BatchPredictRequest(BaseModel):
+    items: List[List[str]]  # one symptom set per item
+    top_k: int = Field(3, ge=1, le=10)
+
+
+# ----------------------------
+# Helper Function
+# ----------------------------
+def predict_batch(symptom_sets: List[List[str]], top_k: int = 3) -> List[dict]:
+    """Encodes every symptom set into one matrix and runs a single tree pass."""
+    # Imported on first use: numpy and the bundle stay off the startup path
+    from app.model_bundle import get_model
+
+    model = get_model()
+    with metrics.span("model.predict"):
+        X = model.encode_batch(symptom_sets)
+        rankings = model.top_k(X, top_k)
+
+    kb = get_knowledge_base()
+    with metrics.span("master_data.lookup"):
+        return [_result(model, kb, symptoms, ranking) for symptoms, ranking in zip(symptom_sets, rankings)]
+
+
+def _result(model, kb, symptoms: List[str], ranking) -> dict:
+    disease = ranking[0][0]
+    return {
+        "disease": disease,
+        "description": kb.description(disease, "No description available"),
+        "precautions": list(kb.precautions_of(disease)),
+        "predictions": [{"disease": name, "probability": round(p, 4)} for name, p in ranking],
+        "unknown_symptoms": [s for s in symptoms if model.index_of(s) is None],
+    }
+
+
+# ----------------------------
+# Endpoints
+# ----------------------------
+@router.post("/predict")
+async def predict(request: PredictRequest):
+    """Top-k diseases for one symptom set."""
+    return predict_batch([request.symptoms], request.top_k)[0]
+
+
+@router.post("/predict/batch")
+async def predict_many(request: BatchPredictRequest):
+    """Top-k diseases for many symptom sets in one vectorized pass."""
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} items per batch")
+    if not request.items:
+        return {"results": []}
+    return {"results": predict_batch(request.items, request.top_k)}
@@ -0,0 +1,56 @@
+# schema.py (structured shapes returned by the model)
+import re
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, RootModel, field_validator
+
+
+class Diagnosis(BaseModel):
+    disease: str
+    description: str = ""
+    severity: int = Field(2, ge=1, le=5)
+    precautions: List[str] = []
+    urgency: Literal["emergency", "urgent", "routine"] = "routine"
+
+    # Lenient on the shapes models commonly drift into, so a reply is
+    # repaired here instead of costing a retry
+    @field_validator("severity", mode="before")
+    @classmethod
+    def _severity(cls, value):
+        if isinstance(value, str):
+            match = re.search(r"\d+", value)
+            value = int(match.group(0)) if match else 2
+        if isinstance(value, (int, float)):
+            return min(5, max(1, int(round(value))))
+        return value
+
+    @field_validator("precautions", mode="before")
+    @classmethod
+    def _precautions(cls, value):
+        if isinstance(value, str):
+            return [item.strip(" -•*") for item in re.split(r"[\n;]|,\s", value) if item.strip(" -•*")]
+        return value
+
+    @field_validator("urgency", mode="before")
+    @classmethod
+    def _urgency(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
+
+
+class SymptomList(RootModel[List[str]]):
+    """Symptom names extracted from a complaint."""
+
+    @field_validator("root", mode="before")
+    @classmethod
+    def _names(cls, value):
+        if isinstance(value, dict):
+            value = value.get("symptoms", [])
+        if isinstance(value, list):
+            return [str(item).strip() for item in value if isinstance(item, (str, int, float)) and str(item).strip()]
+        return value
+
+
+class FusedChatResult(BaseModel):
+    """Language, symptoms and diagnosis returned by one fused prompt."""
+    language: str
+    symptoms: List[str]
+    diagnosis: Optional[Diagnosis] = None
@@ -0,0 +1,252 @@
+# sessions.py (conversation state for chatbot1)
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app import config
+
+
+class Session:
+    """State of one user's symptom-collection conversation."""
+
+    __slots__ = ("symptoms", "asked_followup", "confirmation_stage", "language", "precomputed", "updated_at")
+
+    def __init__(self, symptoms=None, asked_followup=False, confirmation_stage=False, language=None, precomputed=None, updated_at=None):
+        self.symptoms = symptoms if symptoms is not None else []
+        self.asked_followup = asked_followup
+        self.confirmation_stage = confirmation_stage
+        self.language = language
+        # Diagnosis computed while the user was asked to confirm: {"fingerprint", "response", "elapsed"}
+        self.precomputed = precomputed
+        self.updated_at = updated_at if updated_at is not None else time.time()
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    def size_bytes(self) -> int:
+        """Approximate footprint, used for the memory cap."""
+        size = 120 + sum(len(symptom) + 50 for symptom in self.symptoms)
+        if self.precomputed:
+            size += len(json.dumps(self.precomputed))
+        return size
+
+
+# ----------------------------
+# Stores
+# ----------------------------
+class SessionStore:
+    """
+    LRU + TTL bounded session storage. Call put() after mutating a session.
+    get() counts a hit or miss; peek() is the same read for internal use.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, user_id: str) -> Optional[Session]:
+        session = await self.peek(user_id)
+        if session is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return session
+
+    async def peek(self, user_id: str) -> Optional[Session]:
+        raise NotImplementedError
+
+    async def put(self, user_id: str, session: Session):
+        raise NotImplementedError
+
+    async def delete(self, user_id: str):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store; least recently used sessions go first when over a cap."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, max_bytes: int):
+        super().__init__(ttl_seconds, max_entries)
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()  # user_id -> (session, size charged at put time)
+        self._bytes = 0
+
+    async def peek(self, user_id: str) -> Optional[Session]:
+        entry = self._sessions.get(user_id)
+        if entry is None:
+            return None
+        session = entry[0]
+        if time.time() - session.updated_at > self.ttl_seconds:
+            self._remove(user_id)
+            self.expirations += 1
+            return None
+        self._sessions.move_to_end(user_id)
+        return session
+
+    async def put(self, user_id: str, session: Session):
+        if user_id in self._sessions:
+            self._remove(user_id)
+        session.updated_at = time.time()
+        size = session.size_bytes()
+        self._sessions[user_id] = (session, size)
+        self._bytes += size
+        while len(self._sessions) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._sessions))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def delete(self, user_id: str):
+        if user_id in self._sessions:
+            self._remove(user_id)
+
+    def _remove(self, user_id: str):
+        self._bytes -= self._sessions.pop(user_id)[1]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "bytes": self._bytes}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store in a shared SQLite file (WAL), visible to every uvicorn worker.
+    Queries run in a worker thread. Triggers keep the row count in a side
+    table, so the size cap is checked without a COUNT(*). Expired rows are
+    deleted every `purge_every` puts; get() already treats them as missing.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, purge_every: int = 256):
+        super().__init__(ttl_seconds, max_entries)
+        self.purge_every = purge_every
+        self._puts = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("BEGIN IMMEDIATE")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions(updated_at)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS session_count (id INTEGER PRIMARY KEY CHECK (id = 0), n INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO session_count (id, n) SELECT 0, COUNT(*) FROM sessions")
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS sessions_insert AFTER INSERT ON sessions"
+            " BEGIN UPDATE session_count SET n = n + 1; END"
+        )
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS sessions_delete AFTER DELETE ON sessions"
+            " BEGIN UPDATE session_count SET n = n - 1; END"
+        )
+        self._db.execute("COMMIT")
+
+    async def peek(self, user_id: str) -> Optional[Session]:
+        return await asyncio.to_thread(self._peek, user_id)
+
+    async def put(self, user_id: str, session: Session):
+        session.updated_at = time.time()
+        self._puts += 1
+        purge = self._puts % self.purge_every == 0
+        await asyncio.to_thread(self._put, user_id, json.dumps(session.to_dict()), session.updated_at, purge)
+
+    async def delete(self, user_id: str):
+        await asyncio.to_thread(self._delete, user_id)
+
+    def _peek(self, user_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, updated_at FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > self.ttl_seconds:
+                self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+                self.expirations += 1
+                return None
+            return Session.from_dict(json.loads(row[0]))
+
+    def _put(self, user_id: str, data: str, updated_at: float, purge: bool):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # An upsert, not INSERT OR REPLACE: REPLACE deletes without firing the count trigger
+                self._db.execute(
+                    "INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    (user_id, data, updated_at),
+                )
+                if purge:
+                    self.expirations += self._db.execute(
+                        "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,)
+                    ).rowcount
+                overflow = self._count() - self.max_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM sessions WHERE user_id IN"
+                        " (SELECT user_id FROM sessions ORDER BY updated_at LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.evictions += overflow
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _delete(self, user_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT n FROM session_count").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+
+def build_session_store(backend: str = None) -> SessionStore:
+    """Creates the store selected by SESSION_BACKEND."""
+    backend = backend or config.SESSION_BACKEND
+    if backend == "memory":
+        return MemorySessionStore(
+            ttl_seconds=config.SESSION_TTL_SECONDS,
+            max_entries=config.SESSION_MAX_ENTRIES,
+            max_bytes=config.SESSION_MAX_BYTES,
+        )
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            config.SESSION_DB_PATH,
+            ttl_seconds=config.SESSION_TTL_SECONDS,
+            max_entries=config.SESSION_MAX_ENTRIES,
+        )
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
@@ -0,0 +1,158 @@
+# speculation.py (answers computed ahead of the request that asks for them)
+"""
+chatbot1 knows the symptom set once it asks for confirmation, so the
+diagnosis and its translation start right then, while the user reads the
+prompt. A "yes" then takes the finished result (or waits out the rest of a
+running one) instead of paying for the whole computation.
+
+Each precompute is tied to a fingerprint of its inputs. If the inputs change
+(the user adds symptoms) it is cancelled and started again. A result nobody
+takes counts as wasted work. Only the event loop touches this.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from app import config, metrics
+
+outcomes = metrics.register(metrics.Counter(
+    "speculation_total", "Speculative precomputes by outcome (hit / partial / miss / invalidated / expired / failed).", ("outcome",)
+))
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "task", "started", "elapsed")
+
+    def __init__(self, fingerprint: str, task):
+        self.fingerprint = fingerprint
+        self.task = task
+        self.started = time.monotonic()
+        self.elapsed = None  # seconds the computation took, once done
+
+
+class Speculator:
+    """Background computations keyed by user, at most `max_pending` at a time."""
+
+    def __init__(self, max_pending: int = None, ttl_seconds: float = None):
+        self.max_pending = max_pending if max_pending is not None else config.SPECULATION_MAX_PENDING
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.SESSION_TTL_SECONDS
+        self._entries = OrderedDict()  # key -> _Entry
+        self.started = self.hits = self.partial_hits = self.misses = 0
+        self.invalidated = self.expired = self.failed = 0
+        self.saved_seconds = self.wasted_seconds = 0.0
+
+    def start(self, key: str, fingerprint: str, coro, on_done=None):
+        """
+        Runs `coro` in the background for `key`, replacing any precompute with
+        other inputs. `await on_done(result, seconds)` runs when it finishes.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.fingerprint == fingerprint:
+            coro.close()
+            return
+        self.discard(key, "invalidated")
+        self._evict()
+
+        async def run():
+            start = time.monotonic()
+            result = await coro
+            entry.elapsed = time.monotonic() - start
+            if on_done is not None:
+                await on_done(result, entry.elapsed)
+            return result
+
+        entry = _Entry(fingerprint, None)
+        entry.task = asyncio.create_task(run())
+        entry.task.add_done_callback(self._log_failure)
+        self._entries[key] = entry
+        self.started += 1
+
+    def _log_failure(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+            outcomes.inc(outcome="failed")
+            logging.error(f"Speculative precompute failed: {task.exception()}")
+
+    async def take(self, key: str, fingerprint: str):
+        """
+        The precomputed result for these inputs, waiting if it is still
+        running; None when there is none (or it failed or was cancelled).
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.fingerprint != fingerprint:
+            if entry is not None:
+                self._waste(entry, "invalidated")
+            return None
+
+        waited = time.monotonic()
+        ready = entry.task.done()
+        try:
+            result = await entry.task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise  # the request itself is being cancelled
+            return None  # the precompute was cancelled: the caller computes it itself
+        except Exception:
+            return None
+        if ready:
+            self.hits += 1
+            self.saved_seconds += entry.elapsed
+            outcomes.inc(outcome="hit")
+        else:
+            self.partial_hits += 1
+            self.saved_seconds += waited - entry.started
+            outcomes.inc(outcome="partial")
+        return result
+
+    def miss(self):
+        """The request computed its answer itself."""
+        self.misses += 1
+        outcomes.inc(outcome="miss")
+
+    def stored_hit(self, seconds: float):
+        """Answered from a result another worker stored with the session."""
+        self.hits += 1
+        self.saved_seconds += seconds
+        outcomes.inc(outcome="hit")
+
+    def discard(self, key: str, reason: str = "invalidated"):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._waste(entry, reason)
+
+    def _waste(self, entry: _Entry, reason: str):
+        if not entry.task.done():
+            entry.task.cancel()
+            self.wasted_seconds += time.monotonic() - entry.started
+        elif entry.elapsed is not None:
+            self.wasted_seconds += entry.elapsed
+        if reason == "expired":
+            self.expired += 1
+        else:
+            self.invalidated += 1
+        outcomes.inc(outcome=reason)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if len(self._entries) < self.max_pending and now - entry.started < self.ttl_seconds:
+                break
+            self.discard(key, "expired")
+
+    def stats(self) -> dict:
+        used = self.hits + self.partial_hits
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "expired": self.expired,
+            "failed": self.failed,
+            "pending": len(self._entries),
+            "hit_rate": round(used / (used + self.misses), 3) if used + self.misses else None,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "wasted_seconds": round(self.wasted_seconds, 3),
+        }
@@ -0,0 +1,215 @@
+# streaming.py (Server-Sent Events helpers for streaming endpoints)
+import json
+import logging
+import re
+import time
+
+from fastapi.responses import StreamingResponse
+
+from app import metrics
+from app.json_extract import JSONExtractionError, JSONStreamParser, validate
+from app.timing import StageStats
+
+# Time-to-first-byte and total latency per streaming endpoint, served on /stream/stats
+stream_stats = StageStats()
+
+_STRING_END = re.compile(r'["\\]')
+_TOKEN = re.compile(r"[^,}\]\s]*")
+_SPACE = re.compile(r"\s*")
+
+
+def sse(event: str, data) -> str:
+    """One SSE frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# ----------------------------
+# Partial JSON
+# ----------------------------
+class _Frame:
+    """An object or array still open in the stream."""
+
+    __slots__ = ("value", "path", "emit", "key", "expect")
+
+    def __init__(self, value, path: str, emit: bool):
+        self.value = value
+        self.path = path
+        self.emit = emit  # members are reported as fields (not inside arrays)
+        self.key = None
+        self.expect = "key" if isinstance(value, dict) else "value"
+
+
+class JSONFieldTracker:
+    """
+    Feeds streamed text and reports each JSON field once it has fully arrived.
+    Parsing resumes where the previous chunk stopped, with the open objects
+    and arrays kept on a stack, so every character is read once.
+    """
+
+    def __init__(self):
+        self.parser = JSONStreamParser()
+        self._pos = 0  # next character to parse
+        self._scan = None  # where the search for the end of an unfinished string resumes
+        self._frames = []
+        self._started = self._stopped = False
+        self._sent = set()
+
+    @property
+    def text(self) -> str:
+        return self.parser.text
+
+    def result(self, schema=None):
+        """The whole reply (repaired, validated against `schema` if given), or None."""
+        try:
+            value = self.parser.close()
+            return validate(value, schema).model_dump() if schema else value
+        except JSONExtractionError as e:
+            logging.error(f"Failed to parse streamed JSON: {e}")
+            return None
+
+    def feed(self, chunk: str):
+        if self.parser.done:
+            return []  # the value is complete; anything after it is trailing prose
+        self.parser.feed(chunk)
+        fresh = []
+        try:
+            while not self._stopped and self._advance(fresh):
+                pass
+        except json.JSONDecodeError:
+            self._stopped = True  # not strict JSON; the final result() still repairs it
+        return fresh
+
+    def _advance(self, fresh: list) -> bool:
+        """Parses one token; False when the text runs out (or stops being strict JSON)."""
+        text = self.text
+        if not self._started:
+            start = text.find("{", self._pos)
+            if start < 0:
+                self._pos = len(text)
+                return False
+            self._frames.append(_Frame({}, "", True))
+            self._started = True
+            self._pos = start + 1
+            return True
+        if not self._frames:
+            self._stopped = True  # the top-level object is complete
+            return False
+
+        i = _SPACE.match(text, self._pos).end()
+        self._pos = i
+        if i >= len(text):
+            return False
+        frame, char = self._frames[-1], text[i]
+        closer = "}" if isinstance(frame.value, dict) else "]"
+
+        if char == closer and frame.expect in ("comma", "key" if closer == "}" else "value"):
+            self._frames.pop()
+            self._pos = i + 1
+            if self._frames:
+                self._add(self._frames[-1], frame.value, fresh)
+            return True
+        if frame.expect == "comma" and char == ",":
+            frame.expect = "key" if closer == "}" else "value"
+        elif frame.expect == "colon" and char == ":":
+            frame.expect = "value"
+        elif frame.expect == "key" and char == '"':
+            end = self._string_end(i)
+            if end is None:
+                return False
+            frame.key = json.loads(text[i:end], strict=False)
+            frame.expect = "colon"
+            self._pos = end
+            return True
+        elif frame.expect == "value" and char in "{[":
+            path = self._path(frame)
+            self._frames.append(_Frame({} if char == "{" else [], path, frame.emit and closer == "}"))
+        elif frame.expect == "value" and char == '"':
+            end = self._string_end(i)
+            if end is None:
+                return False
+            self._add(frame, json.loads(text[i:end], strict=False), fresh)
+            self._pos = end
+            return True
+        elif frame.expect == "value":
+            end = _TOKEN.match(text, i).end()
+            if end >= len(text):
+                return False  # a number at the very end of the buffer may still be growing
+            self._add(frame, json.loads(text[i:end]), fresh)
+            self._pos = end
+            return True
+        else:
+            self._stopped = True
+            return False
+        self._pos = i + 1
+        return True
+
+    def _string_end(self, i: int):
+        """End of the string literal opening at text[i], or None while it is still arriving."""
+        text = self.text
+        j = self._scan if self._scan is not None else i + 1
+        while True:
+            match = _STRING_END.search(text, j)
+            if match is None:
+                self._scan = len(text)
+                return None
+            j = match.start()
+            if text[j] == "\\":
+                if j + 1 == len(text):
+                    self._scan = j
+                    return None
+                j += 2
+                continue
+            self._scan = None
+            return j + 1
+
+    @staticmethod
+    def _path(frame: _Frame) -> str:
+        if isinstance(frame.value, list):
+            return f"{frame.path}.{len(frame.value)}"
+        return f"{frame.path}.{frame.key}" if frame.path else str(frame.key)
+
+    def _add(self, frame: _Frame, value, fresh: list):
+        """Stores a completed value in its container, reporting it if it is a new field."""
+        path = self._path(frame)
+        if isinstance(frame.value, list):
+            frame.value.append(value)
+        else:
+            frame.value[frame.key] = value
+            if frame.emit and path not in self._sent:
+                self._sent.add(path)
+                fresh.append((path, value))
+        frame.expect = "comma"
+
+
+async def stream_model_json(tracker: JSONFieldTracker, chunks):
+    """Turns model chunks into `delta` and `field` SSE frames."""
+    async for chunk in chunks:
+        yield sse("delta", {"text": chunk})
+        for path, value in tracker.feed(chunk):
+            yield sse("field", {"name": path, "value": value})
+
+
+# ----------------------------
+# Response
+# ----------------------------
+def sse_response(events, endpoint: str) -> StreamingResponse:
+    """Wraps an async generator of SSE frames, recording TTFB and total latency."""
+    async def timed():
+        start = time.perf_counter()
+        ttfb_ms = None
+        try:
+            async for frame in events:
+                if ttfb_ms is None:
+                    ttfb_ms = round((time.perf_counter() - start) * 1000, 2)
+                yield frame
+        finally:
+            total_ms = round((time.perf_counter() - start) * 1000, 2)
+            ttfb_ms = ttfb_ms if ttfb_ms is not None else total_ms
+            stream_stats.record(endpoint, {"ttfb": ttfb_ms}, total_ms)
+            metrics.stage_latency.observe(ttfb_ms / 1000, stage=f"sse.ttfb.{endpoint}")
+
+    return StreamingResponse(
+        timed(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
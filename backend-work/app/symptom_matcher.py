@@ -0,0 +1,253 @@
+# symptom_matcher.py (local symptom extraction over the Training.csv vocabulary)
+import re
+from functools import lru_cache
+from typing import List, NamedTuple
+
+from app import metrics
+
+# ----------------------------
+# Synonyms
+# ----------------------------
+# Lay, misspelt-by-convention and romanised Hindi phrasings -> Training.csv column
+SYNONYMS = {
+    "fever": "high_fever", "temperature": "high_fever", "feverish": "high_fever",
+    "bukhar": "high_fever", "tez bukhar": "high_fever",
+    "slight fever": "mild_fever", "low fever": "mild_fever", "low grade fever": "mild_fever",
+    "halka bukhar": "mild_fever",
+    "head ache": "headache", "head pain": "headache", "sar dard": "headache",
+    "sir dard": "headache", "sar mein dard": "headache", "sir mein dard": "headache",
+    "itch": "itching", "itchy": "itching", "khujli": "itching",
+    "rash": "skin_rash", "rashes": "skin_rash", "daane": "skin_rash",
+    "sneezing": "continuous_sneezing", "sneeze": "continuous_sneezing", "chheenk": "continuous_sneezing",
+    "shiver": "shivering", "shivers": "shivering", "kaanpna": "shivering",
+    "chill": "chills", "thand lagna": "chills",
+    "joints hurt": "joint_pain", "joint ache": "joint_pain", "jodon mein dard": "joint_pain",
+    "stomach ache": "stomach_pain", "stomachache": "stomach_pain", "tummy ache": "stomach_pain",
+    "stomach hurts": "stomach_pain", "pet dard": "stomach_pain", "pet mein dard": "stomach_pain",
+    "heartburn": "acidity", "acid reflux": "acidity",
+    "mouth ulcers": "ulcers_on_tongue", "mouth ulcer": "ulcers_on_tongue",
+    "vomit": "vomiting", "vomited": "vomiting", "throwing up": "vomiting", "throw up": "vomiting",
+    "ulti": "vomiting",
+    "burning urination": "burning_micturition", "burning while urinating": "burning_micturition",
+    "burning when i pee": "burning_micturition", "peshab mein jalan": "burning_micturition",
+    "tired": "fatigue", "tiredness": "fatigue", "exhausted": "fatigue", "exhaustion": "fatigue",
+    "thakaan": "fatigue", "thakan": "fatigue",
+    "gaining weight": "weight_gain", "losing weight": "weight_loss",
+    "anxious": "anxiety", "restless": "restlessness", "lethargic": "lethargy",
+    "coughing": "cough", "khansi": "cough", "khaansi": "cough",
+    "sunken eye": "sunken_eyes",
+    "short of breath": "breathlessness", "shortness of breath": "breathlessness",
+    "difficulty breathing": "breathlessness", "breathing problem": "breathlessness",
+    "cant breathe": "breathlessness", "cannot breathe": "breathlessness", "unable to breathe": "breathlessness",
+    "trouble breathing": "breathlessness", "saans lene mein takleef": "breathlessness",
+    "sweat": "sweating", "sweaty": "sweating", "pasina": "sweating",
+    "dehydrated": "dehydration",
+    "yellow skin": "yellowish_skin",
+    "nauseous": "nausea", "nauseated": "nausea", "queasy": "nausea", "feel sick": "nausea",
+    "no appetite": "loss_of_appetite", "not hungry": "loss_of_appetite",
+    "lost my appetite": "loss_of_appetite", "lost appetite": "loss_of_appetite",
+    "bhook nahi": "loss_of_appetite", "bhookh nahi": "loss_of_appetite",
+    "backache": "back_pain", "back ache": "back_pain", "kamar dard": "back_pain",
+    "kamar mein dard": "back_pain",
+    "constipated": "constipation", "kabz": "constipation",
+    "loose motion": "diarrhoea", "loose motions": "diarrhoea", "loose stools": "diarrhoea",
+    "diarrhea": "diarrhoea", "dast": "diarrhoea",
+    "yellow eyes": "yellowing_of_eyes", "eyes are yellow": "yellowing_of_eyes",
+    "swollen lymph nodes": "swelled_lymph_nodes", "swollen glands": "swelled_lymph_nodes",
+    "blurred vision": "blurred_and_distorted_vision", "blurry vision": "blurred_and_distorted_vision",
+    "mucus": "phlegm",
+    "sore throat": "throat_irritation", "throat pain": "throat_irritation",
+    "gala kharab": "throat_irritation", "gale mein dard": "throat_irritation",
+    "red eyes": "redness_of_eyes", "sinus": "sinus_pressure",
+    "running nose": "runny_nose", "naak beh rahi": "runny_nose", "nose is running": "runny_nose",
+    "blocked nose": "congestion", "stuffy nose": "congestion", "nasal congestion": "congestion",
+    "chest ache": "chest_pain", "pain in chest": "chest_pain", "pain in my chest": "chest_pain", "seene mein dard": "chest_pain", "chhati mein dard": "chest_pain",
+    "heart racing": "fast_heart_rate", "racing heart": "fast_heart_rate",
+    "rapid heartbeat": "fast_heart_rate",
+    "blood in stool": "bloody_stool", "blood in stools": "bloody_stool",
+    "dizzy": "dizziness", "lightheaded": "dizziness", "light headed": "dizziness",
+    "chakkar": "dizziness",
+    "cramp": "cramps", "bruise": "bruising", "bruises": "bruising",
+    "overweight": "obesity", "swollen feet": "swollen_legs",
+    "puffy face": "puffy_face_and_eyes", "puffy eyes": "puffy_face_and_eyes",
+    "slurring": "slurred_speech", "knee ache": "knee_pain",
+    "weak muscles": "muscle_weakness", "stiffness in neck": "stiff_neck",
+    "swollen joints": "swelling_joints", "stiff joints": "movement_stiffness",
+    "vertigo": "spinning_movements", "room spinning": "spinning_movements",
+    "cant smell": "loss_of_smell", "frequent urination": "polyuria",
+    "gas": "passage_of_gases", "flatulence": "passage_of_gases",
+    "depressed": "depression", "irritable": "irritability",
+    "body ache": "muscle_pain", "body pain": "muscle_pain", "muscle ache": "muscle_pain",
+    "badan dard": "muscle_pain",
+    "confusion": "altered_sensorium", "confused": "altered_sensorium",
+    "belly ache": "belly_pain", "irregular periods": "abnormal_menstruation",
+    "watery eyes": "watering_from_eyes", "eyes watering": "watering_from_eyes",
+    "always hungry": "excessive_hunger",
+    "unconscious": "coma", "bloated": "distention_of_abdomen", "bloating": "distention_of_abdomen",
+    "coughing blood": "blood_in_sputum", "palpitation": "palpitations",
+    "pimples": "pus_filled_pimples", "acne": "pus_filled_pimples",
+    "peeling skin": "skin_peeling", "blisters": "blister",
+    # Devanagari
+    "बुखार": "high_fever", "तेज़ बुखार": "high_fever", "सिरदर्द": "headache", "सिर दर्द": "headache",
+    "सिर में दर्द": "headache", "खांसी": "cough", "खाँसी": "cough", "पेट दर्द": "stomach_pain",
+    "पेट में दर्द": "stomach_pain", "उल्टी": "vomiting", "दस्त": "diarrhoea", "थकान": "fatigue",
+    "खुजली": "itching", "चक्कर": "dizziness", "सीने में दर्द": "chest_pain",
+    "सांस फूलना": "breathlessness", "जी मिचलाना": "nausea", "कमर दर्द": "back_pain",
+    "जोड़ों में दर्द": "joint_pain", "पसीना": "sweating", "ठंड लगना": "chills",
+}
+
+# Words that never start a symptom on their own and are not worth an LLM call
+STOPWORDS = {
+    "i", "me", "my", "a", "an", "the", "and", "or", "have", "has", "had", "am", "is",
+    "are", "was", "been", "since", "for", "from", "with", "to", "of", "in", "on", "at",
+    "it", "this", "that", "also", "very", "some", "days", "day", "yesterday", "today",
+    "yes", "no", "ok", "okay", "haan", "nahi", "hai", "hain", "mujhe", "mere", "meri",
+    "please", "help", "doctor", "feel", "feeling", "getting", "got", "bit", "little",
+    "thanks", "thank", "you", "hello", "hi", "what", "should", "do",
+    "ive", "im", "having", "suffering", "been", "past", "last", "week", "weeks", "night",
+    "since", "two", "three", "few", "lot", "really", "now", "but", "too", "all", "mild",
+    "severe", "bad", "badly", "constant", "sometimes", "lately", "morning", "evening",
+    "like", "there", "when", "while", "after", "before", "up", "get", "gets", "time", "times",
+    "can", "think", "patient", "meals", "aur", "ho", "raha", "rahi", "rahe", "bhi",
+    # Where a matched symptom is, not another symptom
+    "arm", "arms", "hand", "hands", "knee", "knees", "elbow", "elbows", "face", "body",
+}
+
+NEGATIONS = {"no", "not", "without", "nahi", "never", "denies", "dont"}
+
+# Keeps Indic vowel signs and viramas, which \w alone would strip
+_NON_WORD = re.compile(r"[^\w\s\u0600-\u06FF\u0900-\u0DFF]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercases and turns underscores/punctuation into single spaces."""
+    text = _NON_WORD.sub(" ", text.lower().replace("'", "").replace("_", " "))
+    return " ".join(text.split())
+
+
+def compact(text: str) -> str:
+    return normalize(text).replace(" ", "")
+
+
+def display_name(column: str) -> str:
+    """'spotting_ urination' -> 'spotting urination'."""
+    return normalize(column)
+
+
+# ----------------------------
+# Matcher
+# ----------------------------
+class MatchResult(NamedTuple):
+    symptoms: List[str]  # Training.csv column names, in order of appearance
+    resolved: bool       # False when the text may hold symptoms the matcher missed
+
+
+class SymptomMatcher:
+    """
+    Token trie over normalized symptom names and synonyms, scanned with
+    longest-match, plus edit-distance correction of misspelt tokens.
+    """
+
+    def __init__(self, columns, aliases: dict):
+        self.columns = list(dict.fromkeys(columns))
+        self._trie = {}
+        self._by_phrase = {}
+        for phrase, column in aliases.items():
+            self._add(phrase, column)
+        for column in self.columns:
+            self._add(display_name(column), column)
+
+        self._vocabulary = {token for phrase in self._by_phrase for token in phrase.split()}
+        self._deletes = {}
+        for token in self._vocabulary:
+            if len(token) >= 4:
+                for variant in self._edits(token):
+                    self._deletes.setdefault(variant, set()).add(token)
+
+    def _add(self, phrase: str, column: str):
+        phrase = normalize(phrase)
+        if not phrase or phrase in self._by_phrase:
+            return
+        self._by_phrase[phrase] = column
+        node = self._trie
+        for token in phrase.split():
+            node = node.setdefault(token, {})
+        node[None] = column
+
+    @staticmethod
+    def _edits(token: str):
+        """The token and all its single-character deletions."""
+        return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+    def _correct(self, token: str) -> str:
+        """Maps a misspelt token to a vocabulary token one edit away (SymSpell style)."""
+        if token in self._vocabulary or token in STOPWORDS or len(token) < 4:
+            return token
+        candidates = set()
+        for variant in self._edits(token):
+            candidates.update(self._deletes.get(variant, ()))
+        if len(candidates) == 1:
+            return candidates.pop()
+        return token
+
+    def match(self, text: str) -> MatchResult:
+        with metrics.span("symptom_matcher.match"):
+            return self._match(text)
+
+    def _match(self, text: str) -> MatchResult:
+        tokens = [self._correct(token) for token in normalize(text).split()]
+        found = []
+        consumed = [False] * len(tokens)
+
+        i = 0
+        while i < len(tokens):
+            node, end, column = self._trie, None, None
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if None in node:
+                    end, column = j, node[None]
+
+            if column is None:
+                i += 1
+                continue
+
+            negated = any(token in NEGATIONS for token in tokens[max(0, i - 3):i])
+            if not negated and column not in found:
+                found.append(column)
+            for k in range(i, end + 1):
+                consumed[k] = True
+            i = end + 1
+
+        leftover = [
+            token for token, used in zip(tokens, consumed)
+            if not used and token not in STOPWORDS and token not in NEGATIONS and len(token) > 2
+        ]
+        # Any content word left over may be a symptom the matcher doesn't know
+        return MatchResult(found, resolved=not leftover)
+
+    def canonical(self, name: str):
+        """Maps a free-form symptom name (e.g. from the LLM) to a column, or None."""
+        phrase = normalize(name)
+        if phrase in self._by_phrase:
+            return self._by_phrase[phrase]
+        symptoms = self.match(name).symptoms
+        return symptoms[0] if len(symptoms) == 1 else None
+
+
+def load_columns():
+    from app.knowledge_base import get_knowledge_base
+
+    return list(get_knowledge_base().symptoms)
+
+
+@lru_cache(maxsize=1)
+def get_matcher() -> SymptomMatcher:
+    """Builds the matcher once per process (and again after a knowledge-base reload)."""
+    from app.knowledge_base import get_knowledge_base
+
+    kb = get_knowledge_base()
+    with metrics.span("symptom_matcher.load"):
+        # Synonyms plus the MasterData spellings of Training.csv columns
+        return SymptomMatcher(list(kb.symptoms), {**SYNONYMS, **kb.aliases})
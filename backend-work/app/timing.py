@@ -0,0 +1,51 @@
+# timing.py (per-stage latency breakdown)
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Collects wall-clock milliseconds per named stage of one request."""
+
+    def __init__(self):
+        self.timings_ms = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings_ms[name] = round(self.timings_ms.get(name, 0.0) + elapsed, 2)
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 2)
+
+
+class StageStats:
+    """Running count / mean / max per stage, grouped by pipeline mode."""
+
+    def __init__(self):
+        self._stats = {}
+
+    def record(self, mode: str, timings_ms: dict, total_ms: float):
+        stages = self._stats.setdefault(mode, {})
+        for name, value in {**timings_ms, "total": total_ms}.items():
+            entry = stages.setdefault(name, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["sum_ms"] += value
+            entry["max_ms"] = max(entry["max_ms"], value)
+
+    def snapshot(self) -> dict:
+        return {
+            mode: {
+                name: {
+                    "count": entry["count"],
+                    "mean_ms": round(entry["sum_ms"] / entry["count"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                }
+                for name, entry in stages.items()
+            }
+            for mode, stages in self._stats.items()
+        }
@@ -0,0 +1,188 @@
+# triage.py (local urgency scoring from Symptom_severity.csv weights)
+"""
+Urgency is decided in process from the matched symptoms, before any model
+call: red-flag symptoms are an emergency on their own, otherwise the sum of
+their severity weights is compared with TRIAGE_URGENT_SCORE and
+TRIAGE_EMERGENCY_SCORE. Emergencies are answered at once and the usual LLM
+diagnosis runs in the background (Enrichments), to be polled later.
+
+Every LLM diagnosis is also compared with the local label (AgreementStats),
+so the scorer's agreement with the model is visible on GET /chat/triage/stats.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, NamedTuple
+
+from app import config, metrics
+from app.knowledge_base import get_knowledge_base
+
+URGENCY_LEVELS = ("routine", "urgent", "emergency")
+
+# Need emergency care whatever their severity weight (breathlessness is only a 4)
+RED_FLAGS = frozenset({
+    "chest_pain", "coma", "breathlessness", "altered_sensorium", "stomach_bleeding",
+    "slurred_speech", "weakness_of_one_body_side", "acute_liver_failure", "blood_in_sputum",
+})
+
+assessments = metrics.register(metrics.Counter(
+    "triage_total", "Local triage decisions, by urgency.", ("urgency",)
+))
+
+
+class Triage(NamedTuple):
+    urgency: str
+    score: int              # sum of the symptoms' severity weights
+    red_flags: List[str]    # Training.csv columns
+    symptoms: List[str]     # Training.csv columns
+
+    @property
+    def severity(self) -> int:
+        """The same 1-5 scale the LLM diagnosis uses."""
+        if self.urgency == "emergency":
+            return 5
+        return min(4, max(1, round(self.score / 6)))
+
+    def to_dict(self) -> dict:
+        return {
+            "urgency": self.urgency,
+            "score": self.score,
+            "severity": self.severity,
+            "red_flags": self.red_flags,
+        }
+
+
+def assess(symptoms, record: bool = True) -> Triage:
+    """
+    Urgency for symptom names in any spelling the knowledge base knows;
+    `record=False` leaves it out of triage_total (a re-assessment).
+    """
+    kb = get_knowledge_base()
+    columns = list(dict.fromkeys(column for column in map(kb.column, symptoms) if column))
+    score = sum(kb.severity_of(column) or 0 for column in columns)
+    red_flags = [column for column in columns if column in RED_FLAGS]
+
+    if red_flags or score >= config.TRIAGE_EMERGENCY_SCORE:
+        urgency = "emergency"
+    elif score >= config.TRIAGE_URGENT_SCORE:
+        urgency = "urgent"
+    else:
+        urgency = "routine"
+    if record:
+        assessments.inc(urgency=urgency)
+    return Triage(urgency, score, red_flags, columns)
+
+
+# ----------------------------
+# Agreement with the LLM
+# ----------------------------
+class AgreementStats:
+    """Confusion counts of the local urgency vs the urgency the LLM returned."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, local: str, llm: str):
+        if llm not in URGENCY_LEVELS:
+            return
+        with self._lock:
+            self._counts[(local, llm)] = self._counts.get((local, llm), 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        compared = sum(counts.values())
+        agreed = sum(n for (local, llm), n in counts.items() if local == llm)
+        llm_emergencies = sum(n for (_, llm), n in counts.items() if llm == "emergency")
+        caught = counts.get(("emergency", "emergency"), 0)
+        local_emergencies = sum(n for (local, _), n in counts.items() if local == "emergency")
+        return {
+            "compared": compared,
+            "agreement": round(agreed / compared, 3) if compared else None,
+            # Share of the LLM's emergencies the fast path also flagged, and vice versa
+            "emergency_recall": round(caught / llm_emergencies, 3) if llm_emergencies else None,
+            "emergency_precision": round(caught / local_emergencies, 3) if local_emergencies else None,
+            "confusion": {
+                local: {llm: counts.get((local, llm), 0) for llm in URGENCY_LEVELS}
+                for local in URGENCY_LEVELS
+            },
+        }
+
+
+agreement = AgreementStats()
+
+
+# ----------------------------
+# Background enrichment
+# ----------------------------
+class Enrichments:
+    """
+    LLM results that finish after a triaged reply was sent, kept for polling.
+    Bounded by count and age; only touched from the event loop.
+    """
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.TRIAGE_RESULT_TTL_SECONDS
+        self.max_entries = max_entries if max_entries is not None else config.TRIAGE_MAX_RESULTS
+        self._entries = OrderedDict()
+        self._tasks = set()
+        self.started = self.completed = self.failed = self.expired = 0
+
+    def start(self, coro) -> str:
+        """Runs `coro` in the background; returns the id to poll."""
+        enrichment_id = uuid.uuid4().hex
+        self._evict()
+        self._entries[enrichment_id] = {"status": "pending", "created": time.monotonic(), "result": None}
+        task = asyncio.create_task(self._run(enrichment_id, coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.started += 1
+        return enrichment_id
+
+    async def _run(self, enrichment_id: str, coro):
+        start = time.monotonic()
+        try:
+            result, status = await coro, "done"
+            self.completed += 1
+        except Exception as e:
+            logging.error(f"Background enrichment failed: {e}")
+            result, status = None, "failed"
+            self.failed += 1
+        entry = self._entries.get(enrichment_id)
+        if entry is not None:
+            entry.update(status=status, result=result, elapsed_ms=round((time.monotonic() - start) * 1000, 2))
+
+    def get(self, enrichment_id: str):
+        """{"status", "result", ...} for a known, unexpired id, else None."""
+        self._evict()
+        entry = self._entries.get(enrichment_id)
+        if entry is None:
+            return None
+        return {key: value for key, value in entry.items() if key != "created"}
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            enrichment_id, entry = next(iter(self._entries.items()))
+            if len(self._entries) < self.max_entries and now - entry["created"] < self.ttl_seconds:
+                break
+            del self._entries[enrichment_id]
+            self.expired += 1
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "expired": self.expired,
+            "running": len(self._tasks),
+            "stored": len(self._entries),
+        }
+
+
+enrichments = Enrichments()
+metrics.stats_collector("triage_enrichment", "Background LLM enrichments of triaged replies.", enrichments.stats)
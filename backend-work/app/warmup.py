@@ -0,0 +1,150 @@
+# warmup.py (background loading of models and SDKs, reported on /ready)
+import asyncio
+import logging
+import time
+
+from app import config
+
+
+def _llm_backend():
+    from app.llm import gateway
+
+    return gateway.backend  # imports and configures the model SDK
+
+
+def _disease_model():
+    from app.model_bundle import load_model
+
+    return load_model()
+
+
+def _knowledge_base():
+    from app.knowledge_base import get_knowledge_base
+
+    return get_knowledge_base()
+
+
+def _symptom_matcher():
+    from app.symptom_matcher import get_matcher
+
+    return get_matcher()
+
+
+def _message_catalog():
+    from app.catalog import get_catalog
+
+    return get_catalog()
+
+
+def _image_codec():
+    from PIL import Image
+
+    return Image.init()
+
+
+def _http_pool():
+    from app.http_client import predict_client
+
+    predict_client.start()
+
+
+# Ordered by what the first requests need most: (name, step, required).
+# /ready waits for the required steps; an optional one that fails (e.g. no
+# GEMINI_API_KEY) leaves the service ready but degraded, and is retried.
+STEPS = [
+    ("llm_backend", _llm_backend, False),
+    ("knowledge_base", _knowledge_base, True),
+    ("symptom_matcher", _symptom_matcher, True),
+    ("disease_model", _disease_model, True),
+    ("message_catalog", _message_catalog, False),
+    ("http_pool", _http_pool, False),
+    ("image_codec", _image_codec, False),
+]
+
+
+class Warmup:
+    """
+    Runs the warm-up steps in a worker thread and records how long each took.
+    Failed steps are retried with exponential backoff until they succeed.
+    """
+
+    def __init__(self, steps=None):
+        self.steps = steps if steps is not None else STEPS
+        self.state = "pending"
+        self.timings_ms = {}
+        self.errors = {}
+        self.step_states = {name: {"state": "pending", "required": required, "attempts": 0} for name, _, required in self.steps}
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "done" and not any(
+            step["required"] and step["state"] == "failed" for step in self.step_states.values()
+        )
+
+    @property
+    def degraded(self) -> list:
+        return [name for name, step in self.step_states.items() if not step["required"] and step["state"] == "failed"]
+
+    async def run(self, retry: bool = False):
+        """Tries every step once; with `retry`, then keeps retrying the failed ones."""
+        self.state = "running"
+        self.started_at = time.perf_counter()
+        failed = [(name, step) for name, step, _ in self.steps if not await self._attempt(name, step)]
+        self.finished_at = time.perf_counter()
+        self.state = "done"
+        logging.info(f"Warm-up finished: {self.timings_ms}")
+        if retry:
+            await self.retry(failed)
+
+    async def retry(self, failed=None):
+        """Re-runs failed steps with exponential backoff until they all succeed."""
+        if failed is None:
+            failed = [(name, step) for name, step, _ in self.steps if self.step_states[name]["state"] == "failed"]
+        delay = config.WARMUP_RETRY_SECONDS
+        while failed:
+            for name, _ in failed:
+                self.step_states[name]["retry_in_s"] = delay
+            await asyncio.sleep(delay)
+            failed = [(name, step) for name, step in failed if not await self._attempt(name, step)]
+            delay = min(delay * 2, config.WARMUP_RETRY_MAX_SECONDS)
+
+    async def _attempt(self, name: str, step) -> bool:
+        state = self.step_states[name]
+        state["state"] = "running"
+        state["attempts"] += 1
+        state.pop("retry_in_s", None)
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(step)
+        except Exception as e:
+            self.errors[name] = state["error"] = f"{type(e).__name__}: {e}"
+            state["state"] = "failed"
+            log = logging.error if state["required"] else logging.warning
+            log(f"Warm-up step {name} failed (attempt {state['attempts']}): {e}")
+            return False
+        finally:
+            self.timings_ms[name] = state["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        self.errors.pop(name, None)
+        state.pop("error", None)
+        state["state"] = "ok"
+        return True
+
+    def skip(self):
+        """Lazy mode: nothing is preloaded, everything loads on first use."""
+        self.state = "done"
+
+    def snapshot(self) -> dict:
+        total_ms = None
+        if self.started_at is not None and self.finished_at is not None:
+            total_ms = round((self.finished_at - self.started_at) * 1000, 2)
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "degraded": self.degraded,
+            "steps": self.step_states,
+            "timings_ms": self.timings_ms,
+            "total_ms": total_ms,
+            "errors": self.errors,
+        }
@@ -0,0 +1,15 @@
+import pytest
+
+from app.router.chatbot1 import confirms
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("yes", True),
+    ("Yes, that's right", True),
+    ("YES!", True),
+    ("my eyes are red", False),
+    ("since yesterday", False),
+    ("no", False),
+])
+def test_confirms_matches_whole_word(text, expected):
+    assert confirms(text) is expected
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import time
+
+from app import config
+from app.event_log import EventLog, NDJSONSink, SQLiteSink, protect_input
+
+
+def test_input_is_hashed_with_the_key(monkeypatch):
+    monkeypatch.setattr(config, "EVENT_LOG_HASH_KEY", "k1")
+    hashed = protect_input("I have fever", "hash")
+    assert hashed.startswith("hmac-sha256:") and "fever" not in hashed
+    assert protect_input("I have fever", "hash") == hashed
+    monkeypatch.setattr(config, "EVENT_LOG_HASH_KEY", "k2")
+    assert protect_input("I have fever", "hash") != hashed
+
+
+def test_input_redaction_and_none():
+    text = "fever since monday, call me on +91 98765 43210 or a.b@example.com"
+    assert protect_input(text, "redact") == "fever since monday, call me on <number> or <email>"
+    assert protect_input(text, "none") is None
+    assert protect_input(text, "raw") == text
+
+
+def test_record_stores_the_protected_input(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EVENT_LOG_INPUT", "hash")
+    sink = SQLiteSink(str(tmp_path / "events.db"))
+    log = EventLog(sink=sink)
+    log.record("chat", input="I have fever", symptoms=["high_fever"])
+    asyncio.run(log.stop())
+    (event,) = list(sink.read())
+    assert event["input"] == protect_input("I have fever", "hash")
+
+
+def test_writer_purges_events_past_retention(tmp_path):
+    sink = SQLiteSink(str(tmp_path / "events.db"))
+    now = time.time()
+    sink.write([{"ts": now - 40 * 86400, "source": "chat"}, {"ts": now, "source": "chat"}])
+    log = EventLog(sink=sink, retention_days=30)
+    asyncio.run(log._purge())
+    assert [event["ts"] for event in sink.read()] == [now]
+    assert log.purged == 1
+
+
+def test_ndjson_purge_keeps_the_open_segment(tmp_path):
+    sink = NDJSONSink(str(tmp_path), segment_bytes=1)
+    sink.write([{"ts": 1, "source": "chat"}])
+    old = sink._file.name
+    sink.write([{"ts": 2, "source": "chat"}])  # rotates: the first segment is closed
+    os.utime(old, (0, 0))
+    assert sink.purge(time.time() - 60) == 1
+    assert [event["ts"] for event in sink.read()] == [2]
+    sink.close()
@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.http_client import UpstreamClient, UpstreamError
+
+
+def client_failing_with(error, calls):
+    def handler(request):
+        calls.append(request.headers.get("Idempotency-Key"))
+        if len(calls) == 1:
+            raise error("boom", request=request)
+        return httpx.Response(200, json={"disease": "Flu"})
+
+    return UpstreamClient("test", retries=2, backoff_ms=0, transport=httpx.MockTransport(handler))
+
+
+def post(client, **kwargs):
+    async def scenario():
+        try:
+            return await client.post_json("http://upstream/predict", {"symptoms": []}, **kwargs)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout])
+def test_failures_before_sending_are_retried(error):
+    calls = []
+    assert post(client_failing_with(error, calls)).status_code == 200
+    assert calls == [None, None]
+
+
+def test_read_timeout_is_not_retried_without_a_key():
+    calls = []
+    client = client_failing_with(httpx.ReadTimeout, calls)
+    with pytest.raises(UpstreamError):
+        post(client)
+    assert len(calls) == 1
+    assert client.counters["not_retried"] == 1
+
+
+def test_read_timeout_is_retried_with_the_same_key():
+    calls = []
+    assert post(client_failing_with(httpx.ReadTimeout, calls), idempotency_key="k1").status_code == 200
+    assert calls == ["k1", "k1"]
@@ -0,0 +1,112 @@
+import pytest
+
+from app.json_extract import JSONExtractionError, JSONStreamParser, extract_json
+
+
+def parse_split(text: str, at: int, expect: str = None):
+    parser = JSONStreamParser(expect)
+    parser.feed(text[:at])
+    parser.feed(text[at:])
+    return parser.close()
+
+
+def every_split(text: str, expect: str = None):
+    """The value parsed from `text` fed as two chunks, for every split point."""
+    values = [parse_split(text, at, expect) for at in range(len(text) + 1)]
+    assert all(value == values[0] for value in values), values
+    return values[0]
+
+
+# ----------------------------
+# Chunk boundaries
+# ----------------------------
+def test_escape_split_across_chunks():
+    text = 'Answer: {"a": "say \\"hi\\" \\\\ done", "b": 1}'
+    assert every_split(text) == {"a": 'say "hi" \\ done', "b": 1}
+
+
+def test_escaped_quote_at_chunk_end_does_not_close_string():
+    parser = JSONStreamParser()
+    assert not parser.feed('{"a": "x\\')
+    assert not parser.feed('"}')  # still inside the string
+    assert parser.feed('"}')
+    assert parser.close() == {"a": 'x"}'}
+
+
+def test_unicode_escape_split_across_chunks():
+    text = '{"name": "\\u0916\\u093e\\u0901\\u0938\\u0940", "emoji": "\\ud83e\\udd12"}'
+    assert every_split(text) == {"name": "खाँसी", "emoji": "\U0001f912"}
+
+
+def test_raw_unicode_split_across_chunks():
+    assert every_split('{"symptoms": ["बुखार", "খাঁসি", "காய்ச்சல்"]}') == {"symptoms": ["बुखार", "খাঁসি", "காய்ச்சல்"]}
+
+
+def test_one_character_chunks():
+    text = 'Here you go: [{"a": [1, [2, [3]]]}, {"b": "]}"}] trailing'
+    parser = JSONStreamParser()
+    for char in text:
+        parser.feed(char)
+    assert parser.close() == [{"a": [1, [2, [3]]]}, {"b": "]}"}]
+
+
+# ----------------------------
+# Structure
+# ----------------------------
+def test_nested_arrays():
+    text = '```json\n[["fever", ["high", "low"]], [], [[[]]]]\n```'
+    assert every_split(text) == [["fever", ["high", "low"]], [], [[[]]]]
+
+
+def test_brackets_inside_strings_are_ignored():
+    assert every_split('{"note": "use [x] or {y}", "list": ["a]", "{b"]}') == {"note": "use [x] or {y}", "list": ["a]", "{b"]}
+
+
+def test_expect_skips_other_openers():
+    assert extract_json('Options [1] and then {"a": [1]}', expect="object") == {"a": [1]}
+
+
+def test_non_json_brackets_before_value():
+    assert every_split('See [below] for details: {"disease": "Flu"}') == {"disease": "Flu"}
+
+
+def test_apostrophe_in_prose_and_strings():
+    text = "It's likely this: {'disease': 'Flu', 'note': \"it's mild\"}"
+    assert every_split(text) == {"disease": "Flu", "note": "it's mild"}
+
+
+# ----------------------------
+# Repair
+# ----------------------------
+@pytest.mark.parametrize("text, value", [
+    ("{'a': 'b', 'c': ['d', 'e']}", {"a": "b", "c": ["d", "e"]}),
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+    ('{disease: "Flu", severity_score: 3}', {"disease": "Flu", "severity_score": 3}),
+    ('{"ok": True, "missing": None, "bad": False}', {"ok": True, "missing": None, "bad": False}),
+    ("{“disease”: “Flu”}", {"disease": "Flu"}),
+    ('{"text": "True, None, key: value"}', {"text": "True, None, key: value"}),
+])
+def test_repairs(text, value):
+    parser = JSONStreamParser()
+    parser.feed(text)
+    assert parser.close() == value
+    assert parser.repaired == (text != '{"text": "True, None, key: value"}')
+
+
+@pytest.mark.parametrize("text, value", [
+    ('{"symptoms": ["fever", "cough"', {"symptoms": ["fever", "cough"]}),
+    ('{"a": "cut off mid', {"a": "cut off mid"}),
+    ('{"a": 1, "b": ', {"a": 1}),
+    ('{"a": 1, "b"', {"a": 1}),
+    ('[[1, 2], [3', [[1, 2], [3]]),
+])
+def test_truncated_values_are_closed(text, value):
+    parser = JSONStreamParser()
+    parser.feed(text)
+    assert parser.close() == value
+    assert parser.repaired
+
+
+def test_no_json_raises():
+    with pytest.raises(JSONExtractionError):
+        extract_json("Sorry, I can't help with that.")
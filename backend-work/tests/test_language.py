@@ -0,0 +1,25 @@
+import json
+import os
+
+from app import config, language
+from app.catalog import get_catalog
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "..", "app", "bench", "language_samples.jsonl")
+
+
+def test_labelled_samples():
+    with open(SAMPLES, encoding="utf-8") as file:
+        samples = [json.loads(line) for line in file if line.strip()]
+    detections = [(sample, language.detect(sample["text"])) for sample in samples]
+    confident = [(sample, d) for sample, d in detections if d.confidence >= config.LANGDETECT_MIN_CONFIDENCE]
+    # A confident answer skips the LLM, so it must be right; unsure ones escalate
+    assert [sample["text"] for sample, d in confident if d.language != sample["language"]] == []
+    assert len(confident) >= 0.9 * len(samples)
+
+
+def test_hinglish_is_named_for_prompts_but_keeps_its_catalog_key():
+    assert language.prompt_name("Hinglish") == "Hindi (Latin script)"
+    assert language.prompt_name("Tamil") == "Tamil"
+    catalog = get_catalog()
+    assert catalog.render("no_symptoms", "Hinglish") is not None
+    assert catalog.render("no_symptoms", "Hindi (Latin script)") == catalog.render("no_symptoms", "Hinglish")
@@ -0,0 +1,19 @@
+from app import metrics
+
+
+def test_label_values_are_escaped():
+    assert metrics._labels(("site",), ('a\\b"c\nd',)) == '{site="a\\\\b\\"c\\nd"}'
+
+
+def test_stats_collector_puts_named_children_in_labels():
+    stats = {"disk": False, "sites": {"chatbot1.translate": {"misses": 2}, "chatbot1": {"translate": {"misses": 5}}}}
+    collect = metrics.stats_collector("test_cache", "Test.", lambda: stats, dimensions={"sites": "site"})
+    try:
+        lines = list(collect())
+    finally:
+        metrics._collectors.remove(collect)
+    assert lines[2:] == [
+        'test_cache{key="disk"} 0',
+        'test_cache{key="sites.misses",site="chatbot1.translate"} 2',
+        'test_cache{key="sites.translate.misses",site="chatbot1"} 5',
+    ]
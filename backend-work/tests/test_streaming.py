@@ -0,0 +1,50 @@
+import json
+
+from app.streaming import JSONFieldTracker
+
+REPLY = "Sure, here it is:\n```json\n" + json.dumps({
+    "diagnosis": {"disease": "Common Cold", "confidence": 0.83, "tags": ["mild", {"x": 1}]},
+    "precautions": ["rest", "drink \"warm\" fluids", "आराम"],
+    "severity": 12,
+    "emergency": False,
+    "note": None,
+    "empty": {},
+}, indent=2, ensure_ascii=False) + "\n```\nHope that helps {"
+
+
+def fields(text: str, size: int):
+    tracker = JSONFieldTracker()
+    out = []
+    for i in range(0, len(text), size):
+        out += tracker.feed(text[i:i + size])
+    return out
+
+
+def test_fields_do_not_depend_on_chunking():
+    whole = fields(REPLY, len(REPLY))
+    assert [path for path, _ in whole] == [
+        "diagnosis.disease", "diagnosis.confidence", "diagnosis.tags", "diagnosis",
+        "precautions", "severity", "emergency", "note", "empty",
+    ]
+    for size in range(1, 16):
+        assert fields(REPLY, size) == whole
+
+
+def test_number_is_reported_only_once_complete():
+    tracker = JSONFieldTracker()
+    assert tracker.feed('{"severity": 1') == []
+    assert tracker.feed("2") == []
+    assert tracker.feed(", ") == [("severity", 12)]
+
+
+def test_string_with_split_escape():
+    tracker = JSONFieldTracker()
+    assert tracker.feed('{"a": "x\\') == []
+    assert tracker.feed('"y", ') == [("a", 'x"y')]
+
+
+def test_fields_stop_at_invalid_json_but_result_repairs():
+    tracker = JSONFieldTracker()
+    assert tracker.feed('{"a": 1, ') == [("a", 1)]
+    assert tracker.feed("b: 'two'}") == []
+    assert tracker.result() == {"a": 1, "b": "two"}
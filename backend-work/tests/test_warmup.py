@@ -0,0 +1,36 @@
+import asyncio
+
+from app import config
+from app.warmup import Warmup
+
+
+def test_optional_failure_is_degraded_and_required_failure_is_retried(monkeypatch):
+    monkeypatch.setattr(config, "WARMUP_RETRY_SECONDS", 0.01)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("not yet")
+
+    def no_key():
+        raise ValueError("GEMINI_API_KEY is not set")
+
+    async def scenario():
+        warmup = Warmup([("llm_backend", no_key, False), ("disease_model", flaky, True)])
+        task = asyncio.create_task(warmup.run(retry=True))
+        await asyncio.sleep(0)
+        while warmup.state != "done":
+            await asyncio.sleep(0.001)
+        assert not warmup.ready
+        while warmup.step_states["disease_model"]["state"] != "ok":
+            await asyncio.sleep(0.005)
+        task.cancel()
+        return warmup.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["ready"]
+    assert snapshot["degraded"] == ["llm_backend"]
+    assert snapshot["steps"]["disease_model"]["attempts"] == 3
+    assert snapshot["steps"]["llm_backend"]["error"].startswith("ValueError")
+    assert "disease_model" not in snapshot["errors"]